@@ -8,19 +8,33 @@ from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from src.models import db
+from src.models.schema import upgrade_schema
 from src.models.task import Task, Project, Label, Team
+from src.models.prayer_reminder import PrayerReminderPreference
+from src.models.task_occurrence import Occurrence, OccurrenceHorizon
+from src.models.revoked_token import RevokedToken
+from src.models.change_version import ChangeVersion
+from src.models.task_tombstone import TaskTombstone
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.tasks import tasks_bp
 from src.routes.calendar import calendar_bp
 from src.routes.ai import ai_bp
 from src.routes.prayer_times import prayer_bp
+from src.routes.sync import sync_bp
+from src.utils.reminder_scheduler import reminder_scheduler
+from src.utils import occurrence_index
+from src.utils.token_blocklist import token_blocklist
+from datetime import timedelta
 
 load_dotenv()
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string-change-in-production')
+# توكنات وصول قصيرة العمر تُجدَّد بتوكن refresh طويل العمر
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 30)))
 
 # تفعيل CORS
 CORS(app, origins="*")
@@ -28,6 +42,11 @@ CORS(app, origins="*")
 # تفعيل JWT
 jwt = JWTManager(app)
 
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    # مرشح Bloom في الذاكرة يجيب معظم الطلبات دون استعلام
+    return token_blocklist.is_revoked(jwt_payload['jti'])
+
 # تسجيل الـ blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -35,6 +54,7 @@ app.register_blueprint(tasks_bp, url_prefix='/api')
 app.register_blueprint(calendar_bp, url_prefix='/api')
 app.register_blueprint(ai_bp, url_prefix='/api')
 app.register_blueprint(prayer_bp, url_prefix='/api')
+app.register_blueprint(sync_bp, url_prefix='/api')
 
 # إعداد قاعدة البيانات
 db_url = os.getenv('DATABASE_URL')
@@ -53,9 +73,23 @@ db.init_app(app)
 with app.app_context():
     try:
         db.create_all()
+        upgrade_schema()
+        token_blocklist.load()
     except Exception as e:
         print(f"Database creation error (will continue): {e}")
 
+# تشغيل مُجدول تذكيرات الصلاة في عملية واحدة فقط (PRAYER_REMINDERS_ENABLED)؛
+# يحمّل التفضيلات ويستطلع تغييراتها التي تحفظها العمليات الأخرى
+if os.getenv('PRAYER_REMINDERS_ENABLED', '').lower() in ('1', 'true'):
+    reminder_scheduler.start(app)
+
+# مزامنة قائمة التوكنات المبطلة بين العمليات في الخلفية بدلاً من مسار الطلبات
+token_blocklist.start_refresh(app)
+
+# فهرس نسخ المهام المتكررة: تمديد الأفق المتدحرج في الخلفية (OCCURRENCE_INDEX_ENABLED)
+if occurrence_index.ENABLED:
+    occurrence_index.start_refresh(app)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -0,0 +1,9 @@
+from . import db
+
+
+class ChangeVersion(db.Model):
+    """عداد تغييرات مهام المستخدم؛ يزداد مع كل كتابة ويُشتق منه ETag"""
+    __tablename__ = 'change_versions'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
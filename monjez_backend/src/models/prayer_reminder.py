@@ -0,0 +1,40 @@
+from datetime import datetime
+from . import db
+
+
+class PrayerReminderPreference(db.Model):
+    __tablename__ = 'prayer_reminder_preferences'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    prayers = db.Column(db.String(100), nullable=False, default='fajr,dhuhr,asr,maghrib,isha')
+    reminder_minutes = db.Column(db.Integer, nullable=False, default=10)
+    city = db.Column(db.String(50), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    timezone = db.Column(db.String(50), default='Asia/Riyadh')
+    method = db.Column(db.String(50), default='umm_al_qura')
+    enabled = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # العلاقات
+    user = db.relationship('User', backref=db.backref('prayer_reminder_preference', uselist=False))
+    
+    @property
+    def prayer_list(self):
+        return [prayer for prayer in (self.prayers or '').split(',') if prayer]
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'prayers': self.prayer_list,
+            'reminder_minutes': self.reminder_minutes,
+            'city': self.city,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'timezone': self.timezone,
+            'method': self.method,
+            'enabled': self.enabled,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
@@ -0,0 +1,12 @@
+from datetime import datetime
+from . import db
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=True)
+    token_type = db.Column(db.String(10), nullable=False, default='access')  # access, refresh
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,36 @@
+from sqlalchemy import inspect, text
+from . import db
+
+# فهارس استُبدلت بأخرى باسم جديد فتُحذف من قواعد البيانات القائمة
+SUPERSEDED_INDEXES = ('ix_users_email_lower',)
+
+
+def upgrade_schema():
+    """ترقية مخطط قاعدة بيانات قائمة لتطابق النماذج (SQLite و Postgres)"""
+    engine = db.engine
+    inspector = inspect(engine)
+    
+    with engine.begin() as connection:
+        for name in SUPERSEDED_INDEXES:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        # db.create_all لا ينشئ الفهارس على الجداول الموجودة مسبقاً
+        existing_indexes = _index_names(engine, inspector, table.name)
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+
+
+def _index_names(engine, inspector, table_name):
+    """أسماء فهارس الجدول، بما فيها فهارس التعابير التي لا يعكسها SQLAlchemy في SQLite"""
+    names = {index['name'] for index in inspector.get_indexes(table_name)}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            names.update(connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                {'table': table_name}).scalars())
+    return names
@@ -31,6 +31,14 @@ class Team(db.Model):
     owner = db.relationship('User', backref='owned_teams')
     members = db.relationship('User', secondary=user_teams, backref='teams')
     
+    # عدد الأعضاء كاستعلام COUNT فرعي ضمن نفس SELECT بدلاً من تحميل كل الأعضاء
+    member_count = db.column_property(
+        db.select(db.func.count(user_teams.c.user_id))
+        .where(user_teams.c.team_id == id)
+        .correlate_except(user_teams)
+        .scalar_subquery()
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -39,7 +47,7 @@ class Team(db.Model):
             'owner_id': self.owner_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'member_count': len(self.members)
+            'member_count': self.member_count
         }
 
 class Project(db.Model):
@@ -100,6 +108,15 @@ class Label(db.Model):
 class Task(db.Model):
     __tablename__ = 'tasks'
     
+    # فهارس مركبة تطابق فلاتر قائمة المهام (المالك + الفلتر + الترتيب حسب due_at)
+    __table_args__ = (
+        db.Index('ix_tasks_owner_due', 'owner_id', 'due_at'),
+        db.Index('ix_tasks_owner_status_due', 'owner_id', 'status', 'due_at'),
+        db.Index('ix_tasks_owner_priority_due', 'owner_id', 'priority', 'due_at'),
+        db.Index('ix_tasks_owner_project_due', 'owner_id', 'project_id', 'due_at'),
+        db.Index('ix_tasks_owner_updated', 'owner_id', 'updated_at', 'id'),
+    )
+    
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = db.Column(db.String(36), db.ForeignKey('teams.id'), nullable=True)
     project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=True)
@@ -127,7 +144,38 @@ class Task(db.Model):
     parent_task = db.relationship('Task', remote_side=[id], backref='subtasks')
     labels = db.relationship('Label', secondary=task_labels, backref='tasks')
     
-    def to_dict(self):
+    # الحقول المسموح بطلبها عبر fields= في قوائم المهام
+    PROJECTABLE_FIELDS = (
+        'id', 'team_id', 'project_id', 'title', 'description', 'status', 'priority',
+        'owner_id', 'start_at', 'due_at', 'all_day', 'calendar_type', 'recurrence_rule',
+        'parent_task_id', 'created_by', 'created_at', 'updated_at', 'completed_at'
+    )
+    
+    # العلاقات المسموح بتضمينها عبر include=
+    INCLUDABLE_RELATIONS = ('labels', 'subtasks', 'project', 'team')
+    
+    def to_dict(self, fields=None, include=()):
+        if fields is not None:
+            # إسقاط جزئي: لا نلمس إلا الأعمدة المحمّلة لتجنب استعلامات إضافية
+            data = {}
+            for field in fields:
+                value = getattr(self, field)
+                data[field] = value.isoformat() if isinstance(value, datetime) else value
+        else:
+            data = self._column_dict()
+        
+        # العلاقات المطلوبة فقط (يُفترض تحميلها مسبقاً عبر include=)
+        if 'labels' in include:
+            data['labels'] = [label.to_dict() for label in self.labels]
+        if 'subtasks' in include:
+            data['subtasks'] = [subtask.to_dict() for subtask in self.subtasks]
+        if 'project' in include:
+            data['project'] = self.project.to_dict() if self.project else None
+        if 'team' in include:
+            data['team'] = self.team.to_dict() if self.team else None
+        return data
+    
+    def _column_dict(self):
         return {
             'id': self.id,
             'team_id': self.team_id,
@@ -0,0 +1,24 @@
+from . import db
+
+
+class Occurrence(db.Model):
+    """موعد نسخة من مهمة متكررة ضمن أفق محدد، لاستعلامات النطاق عبر فهرس واحد"""
+    __tablename__ = 'task_occurrences'
+
+    __table_args__ = (
+        db.Index('ix_task_occurrences_owner_occurs', 'owner_id', 'occurs_at'),
+        db.UniqueConstraint('task_id', 'occurs_at', name='uq_task_occurrences_task_occurs'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    task_id = db.Column(db.String(36), db.ForeignKey('tasks.id'), nullable=False)
+    owner_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    occurs_at = db.Column(db.DateTime, nullable=False)
+
+
+class OccurrenceHorizon(db.Model):
+    """نهاية الأفق المخزن فعلاً لكل المهام المتكررة (صف واحد)؛ covers() يعتمد عليه لا على الساعة"""
+    __tablename__ = 'task_occurrence_horizon'
+
+    id = db.Column(db.Integer, primary_key=True)
+    materialized_until = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from . import db
+
+
+class TaskTombstone(db.Model):
+    """أثر مهمة محذوفة ليعرف العملاء غير المتصلين بحذفها في المزامنة التزايدية"""
+    __tablename__ = 'task_tombstones'
+    
+    __table_args__ = (
+        db.Index('ix_task_tombstones_owner_deleted', 'owner_id', 'deleted_at'),
+    )
+    
+    task_id = db.Column(db.String(36), primary_key=True)
+    owner_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -1,12 +1,18 @@
 from datetime import datetime
 import uuid
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.utils.passwords import hash_password, needs_rehash, verify_password
 from . import db
 
 
 class User(db.Model):
     __tablename__ = 'users'
     
+    # البحث عن البريد بلا حساسية لحالة الأحرف عبر فهرس فريد على lower(email)،
+    # فلا يُسجل حسابان يختلف بريدهما في حالة الأحرف فقط
+    __table_args__ = (
+        db.Index('uq_users_email_lower', db.func.lower(db.text('email')), unique=True),
+    )
+    
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), unique=True, nullable=False)
@@ -16,11 +22,22 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @staticmethod
+    def normalize_email(email):
+        return (email or '').strip().lower()
+    
+    @classmethod
+    def find_by_email(cls, email):
+        return cls.query.filter(db.func.lower(cls.email) == cls.normalize_email(email)).first()
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -1,14 +1,141 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User
+from src.models.user import db
 from src.models.task import Task
 import openai
 import json
-from datetime import datetime, timedelta
-import re
+from datetime import datetime, timedelta, timezone
+from dateutil import parser
+from src.utils.ai_requests import AI_REQUEST_TIMEOUT, ai_jobs, context_hash, suggestion_cache
+from src.utils.text_parser import extract_tasks, normalize_title, should_escalate
+from src.routes.tasks import build_task_values
+from src.routes.calendar import invalidate_calendar_cache
+from src.models.prayer_reminder import PrayerReminderPreference
+from src.utils.prayer_calc import resolve_location
+from src.utils.smart_scheduler import build_schedule
+from src.utils.user_cache import user_timezone
+from src.utils.etags import bump_version
+from sqlalchemy import insert
+from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import ThreadPoolExecutor
+import os
+import uuid
+from zoneinfo import ZoneInfo
 
 ai_bp = Blueprint('ai', __name__)
 
+# حدود الاستيعاب الجماعي للنصوص
+MAX_INGEST_DOCUMENTS = 500
+MAX_INGEST_BYTES = 5 * 1024 * 1024
+
+# أقصى أفق للجدولة الذكية بالأيام
+MAX_SCHEDULE_HORIZON_DAYS = 90
+
+# مجمّع خيوط محدود لتحليل المستندات (واستدعاءات الذكاء الاصطناعي عند الحاجة)
+ingest_executor = ThreadPoolExecutor(max_workers=int(os.getenv('INGEST_WORKERS', 4)), thread_name_prefix='ingest')
+
+def build_suggestion_prompt(suggestion_type, tasks_context, context):
+    """بناء prompt الاقتراحات حسب نوعها"""
+    # إنشاء prompt للذكاء الاصطناعي
+    if suggestion_type == 'timing':
+        prompt = f"""
+        أنت مساعد ذكي لإدارة المهام. بناءً على المهام التالية للمستخدم:
+        {json.dumps(tasks_context, ensure_ascii=False)}
+        
+        اقترح أفضل الأوقات لتنفيذ المهام الجديدة مع تجنب التضارب. 
+        السياق الإضافي: {context}
+        
+        أجب بصيغة JSON مع الحقول التالية:
+        - suggested_times: قائمة بالأوقات المقترحة
+        - reasoning: سبب الاقتراح
+        - conflicts: أي تضارب محتمل
+        """
+    elif suggestion_type == 'subtasks':
+        prompt = f"""
+        أنت مساعد ذكي لإدارة المهام. المهمة المطلوب تقسيمها:
+        {context}
+        
+        اقترح تقسيم هذه المهمة إلى مهام فرعية أصغر وأكثر قابلية للإدارة.
+        
+        أجب بصيغة JSON مع الحقول التالية:
+        - subtasks: قائمة بالمهام الفرعية
+        - estimated_time: الوقت المقدر لكل مهمة فرعية
+        - priority_order: ترتيب الأولوية
+        """
+    elif suggestion_type == 'productivity':
+        prompt = f"""
+        أنت مساعد ذكي لتحليل الإنتاجية. بناءً على مهام المستخدم:
+        {json.dumps(tasks_context, ensure_ascii=False)}
+        
+        قدم تحليلاً للإنتاجية واقتراحات للتحسين.
+        
+        أجب بصيغة JSON مع الحقول التالية:
+        - productivity_score: نقاط الإنتاجية (1-10)
+        - insights: رؤى حول أنماط العمل
+        - recommendations: اقتراحات للتحسين
+        """
+    else:  # general
+        prompt = f"""
+        أنت مساعد ذكي لإدارة المهام. بناءً على السياق التالي:
+        المهام الحالية: {json.dumps(tasks_context, ensure_ascii=False)}
+        السياق الإضافي: {context}
+        
+        قدم اقتراحات عامة لتحسين إدارة المهام والإنتاجية.
+        
+        أجب بصيغة JSON مع الحقول التالية:
+        - suggestions: قائمة بالاقتراحات
+        - tips: نصائح سريعة
+        - next_actions: الإجراءات المقترحة التالية
+        """
+    
+    return prompt
+
+def fetch_suggestions(prompt):
+    """استدعاء OpenAI وتحويل الرد إلى JSON؛ يعيد (الاقتراحات، هل جاءت من النموذج)"""
+    # استدعاء OpenAI API
+    response = openai.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "أنت مساعد ذكي متخصص في إدارة المهام والإنتاجية. تجيب باللغة العربية وبصيغة JSON صحيحة."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1000,
+        temperature=0.7,
+        timeout=AI_REQUEST_TIMEOUT
+    )
+    
+    ai_response = response.choices[0].message.content
+    
+    # محاولة تحويل الاستجابة إلى JSON
+    try:
+        suggestions = json.loads(ai_response)
+    except json.JSONDecodeError:
+        # إذا فشل التحويل، إنشاء استجابة افتراضية
+        suggestions = {
+            "suggestions": ["تنظيم المهام حسب الأولوية", "تخصيص أوقات محددة للمهام المهمة"],
+            "tips": ["استخدم تقنية البومودورو", "خذ فترات راحة منتظمة"],
+            "message": "تم إنشاء اقتراحات افتراضية"
+        }
+        return suggestions, False
+    
+    return suggestions, True
+
+def generate_suggestions(suggestion_type, tasks_context, context):
+    """اقتراحات مخزنة مؤقتاً حسب (النوع، بصمة سياق المهام، السياق) مع دمج الطلبات المتطابقة المتزامنة"""
+    cache_key = (suggestion_type, context_hash(tasks_context), ' '.join(context.split()))
+    suggestions, _ = suggestion_cache.get_or_compute(
+        cache_key,
+        lambda: fetch_suggestions(build_suggestion_prompt(suggestion_type, tasks_context, context)),
+        cacheable=lambda result: result[1],
+        timeout=AI_REQUEST_TIMEOUT
+    )
+    
+    return {
+        'type': suggestion_type,
+        'suggestions': suggestions,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
 @ai_bp.route('/ai/suggestions', methods=['POST'])
 @jwt_required()
 def get_ai_suggestions():
@@ -21,7 +148,8 @@ def get_ai_suggestions():
         context = data.get('context', '')
         
         # الحصول على مهام المستخدم الحالية
-        user_tasks = Task.query.filter_by(owner_id=user_id).limit(10).all()
+        # ترتيب ثابت ليبقى سياق المهام (ومفتاح الذاكرة المؤقتة) مستقراً بين الطلبات
+        user_tasks = Task.query.filter_by(owner_id=user_id).order_by(Task.updated_at.desc(), Task.id).limit(10).all()
         tasks_context = []
         
         for task in user_tasks:
@@ -32,90 +160,42 @@ def get_ai_suggestions():
                 'due_date': task.due_at.isoformat() if task.due_at else None
             })
         
-        # إنشاء prompt للذكاء الاصطناعي
-        if suggestion_type == 'timing':
-            prompt = f"""
-            أنت مساعد ذكي لإدارة المهام. بناءً على المهام التالية للمستخدم:
-            {json.dumps(tasks_context, ensure_ascii=False)}
-            
-            اقترح أفضل الأوقات لتنفيذ المهام الجديدة مع تجنب التضارب. 
-            السياق الإضافي: {context}
-            
-            أجب بصيغة JSON مع الحقول التالية:
-            - suggested_times: قائمة بالأوقات المقترحة
-            - reasoning: سبب الاقتراح
-            - conflicts: أي تضارب محتمل
-            """
-        elif suggestion_type == 'subtasks':
-            prompt = f"""
-            أنت مساعد ذكي لإدارة المهام. المهمة المطلوب تقسيمها:
-            {context}
-            
-            اقترح تقسيم هذه المهمة إلى مهام فرعية أصغر وأكثر قابلية للإدارة.
-            
-            أجب بصيغة JSON مع الحقول التالية:
-            - subtasks: قائمة بالمهام الفرعية
-            - estimated_time: الوقت المقدر لكل مهمة فرعية
-            - priority_order: ترتيب الأولوية
-            """
-        elif suggestion_type == 'productivity':
-            prompt = f"""
-            أنت مساعد ذكي لتحليل الإنتاجية. بناءً على مهام المستخدم:
-            {json.dumps(tasks_context, ensure_ascii=False)}
-            
-            قدم تحليلاً للإنتاجية واقتراحات للتحسين.
-            
-            أجب بصيغة JSON مع الحقول التالية:
-            - productivity_score: نقاط الإنتاجية (1-10)
-            - insights: رؤى حول أنماط العمل
-            - recommendations: اقتراحات للتحسين
-            """
-        else:  # general
-            prompt = f"""
-            أنت مساعد ذكي لإدارة المهام. بناءً على السياق التالي:
-            المهام الحالية: {json.dumps(tasks_context, ensure_ascii=False)}
-            السياق الإضافي: {context}
-            
-            قدم اقتراحات عامة لتحسين إدارة المهام والإنتاجية.
-            
-            أجب بصيغة JSON مع الحقول التالية:
-            - suggestions: قائمة بالاقتراحات
-            - tips: نصائح سريعة
-            - next_actions: الإجراءات المقترحة التالية
-            """
+        # وضع غير متزامن: تُنفذ المهمة في الخلفية ويستعلم العميل عن نتيجتها لاحقاً
+        if data.get('async'):
+            job_id = ai_jobs.submit(user_id, generate_suggestions, suggestion_type, tasks_context, context)
+            return jsonify({
+                'job_id': job_id,
+                'status': 'pending',
+                'status_url': f'/api/ai/suggestions/jobs/{job_id}'
+            }), 202
         
-        # استدعاء OpenAI API
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "أنت مساعد ذكي متخصص في إدارة المهام والإنتاجية. تجيب باللغة العربية وبصيغة JSON صحيحة."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
+        return jsonify(generate_suggestions(suggestion_type, tasks_context, context)), 200
         
-        ai_response = response.choices[0].message.content
+    except (TimeoutError, openai.APITimeoutError):
+        return jsonify({'error': 'انتهت مهلة خدمة الذكاء الاصطناعي، حاول لاحقاً'}), 504
+    except Exception as e:
+        return jsonify({'error': f'خطأ في الحصول على الاقتراحات: {str(e)}'}), 500
+
+@ai_bp.route('/ai/suggestions/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_ai_suggestions_job(job_id):
+    """الاستعلام عن حالة ونتيجة مهمة اقتراحات غير متزامنة"""
+    try:
+        job = ai_jobs.get(job_id, get_jwt_identity())
         
-        # محاولة تحويل الاستجابة إلى JSON
-        try:
-            suggestions = json.loads(ai_response)
-        except json.JSONDecodeError:
-            # إذا فشل التحويل، إنشاء استجابة افتراضية
-            suggestions = {
-                "suggestions": ["تنظيم المهام حسب الأولوية", "تخصيص أوقات محددة للمهام المهمة"],
-                "tips": ["استخدم تقنية البومودورو", "خذ فترات راحة منتظمة"],
-                "message": "تم إنشاء اقتراحات افتراضية"
-            }
+        if job is None:
+            return jsonify({'error': 'المهمة غير موجودة'}), 404
         
-        return jsonify({
-            'type': suggestion_type,
-            'suggestions': suggestions,
-            'generated_at': datetime.utcnow().isoformat()
-        }), 200
+        return jsonify({'job_id': job_id, **job}), 200
         
     except Exception as e:
-        return jsonify({'error': f'خطأ في الحصول على الاقتراحات: {str(e)}'}), 500
+        return jsonify({'error': f'خطأ في الحصول على نتيجة المهمة: {str(e)}'}), 500
+
+@ai_bp.route('/ai/suggestions/cache-stats', methods=['GET'])
+@jwt_required()
+def get_ai_cache_stats():
+    """إحصاءات ذاكرة الاقتراحات المؤقتة"""
+    return jsonify({'suggestion_cache': suggestion_cache.stats()}), 200
 
 @ai_bp.route('/ai/parse-text', methods=['POST'])
 @jwt_required()
@@ -129,84 +209,212 @@ def parse_text_for_tasks():
         if not text:
             return jsonify({'error': 'النص مطلوب'}), 400
         
-        # استخدام regex بسيط لاستخراج المهام
-        # يمكن تحسين هذا باستخدام NLP أكثر تقدماً
-        task_patterns = [
-            r'(?:مهمة|task|todo|يجب|لازم|ضروري)\s*:?\s*(.+?)(?:\n|$)',
-            r'(?:اجتماع|meeting)\s+(.+?)(?:\s+في\s+(.+?))?(?:\n|$)',
-            r'(?:موعد|appointment)\s+(.+?)(?:\s+في\s+(.+?))?(?:\n|$)',
-        ]
-        
-        extracted_tasks = []
-        
-        for pattern in task_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                task_title = match.group(1).strip()
-                if len(task_title) > 3:  # تجنب المطابقات القصيرة جداً
-                    extracted_tasks.append({
-                        'title': task_title,
-                        'extracted_from': match.group(0),
-                        'confidence': 0.8
-                    })
-        
-        # استخدام OpenAI لتحليل أكثر دقة
-        try:
-            prompt = f"""
-            حلل النص التالي واستخرج المهام والمواعيد منه:
-            
-            "{text}"
-            
-            أجب بصيغة JSON مع قائمة من المهام، كل مهمة تحتوي على:
-            - title: عنوان المهمة
-            - description: وصف مختصر
-            - priority: الأولوية (low, med, high, urgent)
-            - due_date: التاريخ المستحق إن وجد (بصيغة ISO)
-            - category: فئة المهمة
-            """
-            
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "أنت مساعد ذكي لاستخراج المهام من النصوص. تجيب بصيغة JSON صحيحة."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=800,
-                temperature=0.3
-            )
-            
-            ai_response = response.choices[0].message.content
-            ai_tasks = json.loads(ai_response)
-            
-            if isinstance(ai_tasks, dict) and 'tasks' in ai_tasks:
-                ai_tasks = ai_tasks['tasks']
-            
-            # دمج النتائج
-            for ai_task in ai_tasks:
-                if isinstance(ai_task, dict) and 'title' in ai_task:
-                    extracted_tasks.append({
-                        'title': ai_task.get('title', ''),
-                        'description': ai_task.get('description', ''),
-                        'priority': ai_task.get('priority', 'med'),
-                        'due_date': ai_task.get('due_date'),
-                        'category': ai_task.get('category', 'عام'),
-                        'confidence': 0.9,
-                        'source': 'ai'
-                    })
-                    
-        except Exception as ai_error:
-            print(f"AI parsing error: {ai_error}")
+        ai_mode = data.get('ai', 'auto')  # auto, always, never
+        
+        # استخراج محلي سريع (أنماط مُجمّعة مسبقاً + تواريخ عربية وإنجليزية) بتوقيت المستخدم
+        now = datetime.now(ZoneInfo(user_timezone(user_id))).replace(tzinfo=None)
+        extracted_tasks, local_confidence = extract_tasks(text, now)
+        escalated = should_escalate(extracted_tasks, local_confidence, ai_mode)
+        
+        # استخدام OpenAI لتحليل أكثر دقة فقط عند انخفاض الثقة المحلية
+        if escalated:
+            extracted_tasks.extend(parse_text_with_ai(text, extracted_tasks))
         
         return jsonify({
             'original_text': text,
             'extracted_tasks': extracted_tasks,
             'count': len(extracted_tasks),
+            'local_confidence': local_confidence,
+            'escalated': escalated,
             'processed_at': datetime.utcnow().isoformat()
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'خطأ في تحليل النص: {str(e)}'}), 500
 
+def parse_text_with_ai(text, local_tasks):
+    """استخراج المهام عبر OpenAI مع تجاهل ما استخرجه المحلل المحلي مسبقاً"""
+    known_titles = {task['title'].casefold() for task in local_tasks}
+    extracted_tasks = []
+    
+    try:
+        prompt = f"""
+        حلل النص التالي واستخرج المهام والمواعيد منه:
+        
+        "{text}"
+        
+        أجب بصيغة JSON مع قائمة من المهام، كل مهمة تحتوي على:
+        - title: عنوان المهمة
+        - description: وصف مختصر
+        - priority: الأولوية (low, med, high, urgent)
+        - due_date: التاريخ المستحق إن وجد (بصيغة ISO)
+        - category: فئة المهمة
+        """
+        
+        response = openai.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "أنت مساعد ذكي لاستخراج المهام من النصوص. تجيب بصيغة JSON صحيحة."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=800,
+            temperature=0.3
+        )
+        
+        ai_response = response.choices[0].message.content
+        ai_tasks = json.loads(ai_response)
+        
+        if isinstance(ai_tasks, dict) and 'tasks' in ai_tasks:
+            ai_tasks = ai_tasks['tasks']
+        
+        # دمج النتائج
+        for ai_task in ai_tasks:
+            if isinstance(ai_task, dict) and 'title' in ai_task \
+                and ai_task['title'].casefold() not in known_titles:
+                extracted_tasks.append({
+                    'title': ai_task.get('title', ''),
+                    'description': ai_task.get('description', ''),
+                    'priority': ai_task.get('priority', 'med'),
+                    'due_date': ai_task.get('due_date'),
+                    'category': ai_task.get('category', 'عام'),
+                    'confidence': 0.9,
+                    'source': 'ai'
+                })
+                
+    except Exception as ai_error:
+        print(f"AI parsing error: {ai_error}")
+    
+    return extracted_tasks
+
+def read_ingest_documents():
+    """قراءة المستندات من JSON (documents) أو من ملفات multipart (files)
+
+    الجسم يُقرأ عبر مجرى محدود بـ request.max_content_length؛ werkzeug يقطع الطلب المجزأ عند الحد
+    دون خطأ، فمحاولة قراءة بايت إضافي بعده ترفع RequestEntityTooLarge قبل تحليل جسم مقطوع.
+    """
+    request.get_data(cache=True, parse_form_data=True)
+    request.stream.read(1)
+    
+    documents = []
+    if request.files:
+        for upload in request.files.getlist('files'):
+            documents.append({'id': upload.filename, 'text': upload.read().decode('utf-8', errors='replace')})
+    else:
+        data = request.get_json() or {}
+        for index, document in enumerate(data.get('documents') or []):
+            if isinstance(document, dict):
+                documents.append({'id': document.get('id', index), 'text': document.get('text') or ''})
+            else:
+                documents.append({'id': index, 'text': str(document)})
+    return documents
+
+def extract_document(document, now, ai_mode):
+    """تحليل مستند واحد محلياً مع اللجوء للذكاء الاصطناعي حسب السياسة"""
+    tasks, confidence = extract_tasks(document['text'], now)
+    if should_escalate(tasks, confidence, ai_mode):
+        tasks.extend(parse_text_with_ai(document['text'], tasks))
+    return document['id'], tasks
+
+def safe_extract_document(document, now, ai_mode):
+    """تحليل مستند دون إيقاف البث عند فشله: (المعرّف، المهام، رسالة الخطأ)"""
+    try:
+        document_id, tasks = extract_document(document, now, ai_mode)
+        return document_id, tasks, None
+    except Exception as e:
+        return document['id'], [], str(e)
+
+def local_due_to_utc(due_date, tz):
+    """موعد المحلل محلي بدون منطقة زمنية؛ due_at يُخزَّن UTC بدون منطقة"""
+    if not due_date:
+        return None
+    value = parser.parse(due_date)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz)
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+
+@ai_bp.route('/ai/ingest', methods=['POST'])
+@jwt_required()
+def ingest_documents():
+    """استيعاب مستندات متعددة: تحليل متوازٍ محدود، إزالة التكرار، وإنشاء المهام في معاملة واحدة"""
+    try:
+        user_id = get_jwt_identity()
+        ai_mode = request.args.get('ai', 'never')  # never, auto, always
+        
+        # الحد يُطبق أثناء قراءة الجسم (يشمل الطلبات المجزأة بلا Content-Length) فلا يُخزن أكثر منه
+        request.max_content_length = MAX_INGEST_BYTES
+        try:
+            documents = read_ingest_documents()
+        except RequestEntityTooLarge:
+            return jsonify({'error': 'حجم الطلب يتجاوز الحد المسموح'}), 413
+        if not documents:
+            return jsonify({'error': 'المستندات مطلوبة'}), 400
+        if len(documents) > MAX_INGEST_DOCUMENTS:
+            return jsonify({'error': f'الحد الأقصى هو {MAX_INGEST_DOCUMENTS} مستند في الطلب'}), 400
+        
+        tz = ZoneInfo(user_timezone(user_id))
+        now = datetime.now(tz).replace(tzinfo=None)
+        
+        # مفاتيح المهام الموجودة (عنوان موحد + تاريخ الاستحقاق) بتحميل عمودين فقط
+        seen = {
+            (normalize_title(title), due_at.date() if due_at else None)
+            for title, due_at in db.session.query(Task.title, Task.due_at).filter(Task.owner_id == user_id).yield_per(1000)
+        }
+        
+        def generate():
+            rows = []
+            duplicates = 0
+            # executor.map يحافظ على ترتيب المستندات ويبث النتائج فور جاهزيتها
+            results = ingest_executor.map(lambda document: safe_extract_document(document, now, ai_mode), documents)
+            for document_id, tasks, error in results:
+                if error:
+                    yield json.dumps({'document': document_id, 'error': error}, ensure_ascii=False) + '\n'
+                    continue
+                created = 0
+                for task in tasks:
+                    try:
+                        values = build_task_values(user_id, {'title': task['title'][:255],
+                                                             'due_at': local_due_to_utc(task.get('due_date'), tz),
+                                                             'description': task.get('description')})
+                    except (ValueError, OverflowError):
+                        values = build_task_values(user_id, {'title': task['title'][:255]})
+                    key = (normalize_title(values['title']), values['due_at'].date() if values['due_at'] else None)
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                    values.update(id=str(uuid.uuid4()), created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+                                  completed_at=None, team_id=None)
+                    rows.append(values)
+                    created += 1
+                yield json.dumps({'document': document_id, 'extracted': len(tasks), 'new': created}, ensure_ascii=False) + '\n'
+            
+            try:
+                if rows:
+                    db.session.execute(insert(Task), rows)
+                    bump_version(user_id)
+                db.session.commit()
+                invalidate_calendar_cache(user_id, *[row['due_at'] for row in rows])
+                yield json.dumps({'status': 'done', 'created': len(rows), 'duplicates': duplicates,
+                                  'documents': len(documents), 'task_ids': [row['id'] for row in rows]}) + '\n'
+            except Exception as e:
+                db.session.rollback()
+                yield json.dumps({'status': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        return jsonify({'error': f'خطأ في استيعاب المستندات: {str(e)}'}), 500
+
+def get_schedule_location(user_id, preferences):
+    """موقع الجدولة: من التفضيلات، ثم تفضيلات تذكير الصلاة المحفوظة، ثم المدينة الافتراضية"""
+    if any(preferences.get(key) is not None for key in ('city', 'lat', 'lng')):
+        return resolve_location(preferences.get('city'), preferences.get('lat'), preferences.get('lng'),
+                                preferences.get('timezone'))
+    saved = PrayerReminderPreference.query.get(user_id)
+    if saved:
+        return resolve_location(saved.city, saved.latitude, saved.longitude, saved.timezone)
+    return resolve_location(None, None, None, user_timezone(user_id))
+
 @ai_bp.route('/ai/smart-schedule', methods=['POST'])
 @jwt_required()
 def smart_schedule():
@@ -227,38 +435,69 @@ def smart_schedule():
         if not tasks:
             return jsonify({'error': 'لم يتم العثور على مهام'}), 404
         
-        # تحليل المهام وإنشاء جدولة ذكية
-        schedule_suggestions = []
+        try:
+            location = get_schedule_location(user_id, preferences)
+            horizon_days = min(max(int(preferences.get('horizon_days', 14)), 1), MAX_SCHEDULE_HORIZON_DAYS)
+            durations = {task_id: int(minutes) for task_id, minutes in (preferences.get('durations') or {}).items()}
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
         
-        for task in tasks:
-            # حساب الوقت المقترح بناءً على الأولوية والمدة المقدرة
-            base_time = datetime.now()
-            
-            if task.priority == 'urgent':
-                suggested_time = base_time + timedelta(hours=1)
-            elif task.priority == 'high':
-                suggested_time = base_time + timedelta(hours=4)
-            elif task.priority == 'med':
-                suggested_time = base_time + timedelta(days=1)
-            else:  # low
-                suggested_time = base_time + timedelta(days=3)
-            
-            # تجنب عطلة نهاية الأسبوع للمهام العملية
-            if suggested_time.weekday() >= 5:  # السبت والأحد
-                suggested_time += timedelta(days=2)
+        now = datetime.utcnow()
+        # المهام القائمة ذات البداية والنهاية تمثل فترات مشغولة
+        busy_blocks = db.session.query(Task.start_at, Task.due_at).filter(
+            Task.owner_id == user_id,
+            Task.id.notin_([task.id for task in tasks]),
+            Task.status.notin_(['done', 'archived']),
+            Task.start_at.isnot(None),
+            Task.due_at > now,
+            Task.start_at < now + timedelta(days=horizon_days + 1)
+        ).all()
+        
+        try:
+            placements = build_schedule(
+                tasks, busy_blocks, location, now,
+                method=preferences.get('method'),
+                horizon_days=horizon_days,
+                work_start=preferences.get('work_start', '08:00'),
+                work_end=preferences.get('work_end', '17:00'),
+                include_weekend=bool(preferences.get('include_weekend', False)),
+                prayer_minutes=int(preferences.get('prayer_minutes', 20)),
+                durations=durations,
+                default_duration=int(preferences.get('default_duration', 60))
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        schedule_suggestions = []
+        for placement in placements:
+            task = placement['task']
+            if placement['start'] is None:
+                reasoning = 'لا توجد فترة حرة كافية ضمن أفق الجدولة'
+                confidence = 0.0
+            elif task.due_at and placement['end'] > task.due_at:
+                reasoning = f'أقرب فترة حرة تتجاوز الموعد النهائي (الأولوية: {task.priority})'
+                confidence = 0.4
+            else:
+                reasoning = f'مجدولة في أول فترة حرة قبل الموعد النهائي بناءً على الأولوية: {task.priority}'
+                confidence = 0.9
             
             schedule_suggestions.append({
                 'task_id': task.id,
                 'task_title': task.title,
                 'current_due_date': task.due_at.isoformat() if task.due_at else None,
-                'suggested_time': suggested_time.isoformat(),
-                'reasoning': f'مجدولة بناءً على الأولوية: {task.priority}',
-                'confidence': 0.85
+                'suggested_time': placement['start'].isoformat() if placement['start'] else None,
+                'suggested_end': placement['end'].isoformat() if placement['end'] else None,
+                'duration_minutes': placement['duration_minutes'],
+                'meets_deadline': bool(placement['start'] and (not task.due_at or placement['end'] <= task.due_at)),
+                'reasoning': reasoning,
+                'confidence': confidence
             })
         
         return jsonify({
             'schedule_suggestions': schedule_suggestions,
             'preferences_applied': preferences,
+            'location': location.name,
+            'timezone': location.timezone,
             'generated_at': datetime.utcnow().isoformat()
         }), 200
         
@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token, jwt_required, get_jwt, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from sqlalchemy.exc import IntegrityError
 from src.models.user import db, User
-from datetime import timedelta
+from src.utils.passwords import verify_password
+from src.utils.user_cache import get_user_dict, profile_claims
+from src.utils.token_blocklist import token_blocklist
 
 auth_bp = Blueprint('auth', __name__)
 
+def issue_tokens(user):
+    """توكن وصول قصير العمر وتوكن تجديد (المدد من JWT_ACCESS/REFRESH_TOKEN_EXPIRES)"""
+    claims = profile_claims(user.to_dict())
+    return {
+        'access_token': create_access_token(identity=user.id, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=user.id, additional_claims=claims)
+    }
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -14,31 +27,32 @@ def register():
         if not data.get('name') or not data.get('email') or not data.get('password'):
             return jsonify({'error': 'الاسم والبريد الإلكتروني وكلمة المرور مطلوبة'}), 400
         
+        email = User.normalize_email(data['email'])
+        
         # التحقق من عدم وجود المستخدم مسبقاً
-        if User.query.filter_by(email=data['email']).first():
+        if User.find_by_email(email):
             return jsonify({'error': 'البريد الإلكتروني مستخدم مسبقاً'}), 400
         
         # إنشاء مستخدم جديد
         user = User(
             name=data['name'],
-            email=data['email'],
+            email=email,
             locale=data.get('locale', 'ar'),
             timezone=data.get('timezone', 'Asia/Riyadh')
         )
         user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
-        
-        # إنشاء JWT token
-        access_token = create_access_token(
-            identity=user.id,
-            expires_delta=timedelta(days=30)
-        )
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # تسجيلان متزامنان للبريد نفسه: الفهرس الفريد يرفض الثاني
+            db.session.rollback()
+            return jsonify({'error': 'البريد الإلكتروني مستخدم مسبقاً'}), 400
         
         return jsonify({
             'message': 'تم إنشاء الحساب بنجاح',
-            'access_token': access_token,
+            **issue_tokens(user),
             'user': user.to_dict()
         }), 201
         
@@ -54,23 +68,25 @@ def login():
         if not data.get('email') or not data.get('password'):
             return jsonify({'error': 'البريد الإلكتروني وكلمة المرور مطلوبان'}), 400
         
-        user = User.query.filter_by(email=data['email']).first()
+        user = User.find_by_email(User.normalize_email(data['email']))
         
-        if not user or not user.check_password(data['password']):
+        # التحقق يجري حتى لغير الموجودين لتوحيد زمن الاستجابة
+        if not verify_password(user.password_hash if user else None, data['password']):
             return jsonify({'error': 'البريد الإلكتروني أو كلمة المرور غير صحيحة'}), 401
         
-        access_token = create_access_token(
-            identity=user.id,
-            expires_delta=timedelta(days=30)
-        )
+        # إعادة التجزئة بشفافية عند تغيّر معاملات التجزئة
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
         
         return jsonify({
             'message': 'تم تسجيل الدخول بنجاح',
-            'access_token': access_token,
+            **issue_tokens(user),
             'user': user.to_dict()
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
@@ -78,12 +94,35 @@ def login():
 def get_current_user():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        
+        # الإجابة من مطالبات التوكن مباشرة إن وُجدت (fresh=1 يفرض القراءة من الخادم)
+        profile = get_jwt().get('profile')
+        if profile and request.args.get('fresh') not in ('1', 'true'):
+            return jsonify({'user': dict(profile, id=user_id), 'source': 'token'}), 200
+        
+        user = get_user_dict(user_id)
+        
+        if not user:
+            return jsonify({'error': 'المستخدم غير موجود'}), 404
+        
+        return jsonify({'user': user}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """إصدار توكن وصول جديد من توكن التجديد"""
+    try:
+        user_id = get_jwt_identity()
+        user = get_user_dict(user_id)
         
         if not user:
             return jsonify({'error': 'المستخدم غير موجود'}), 404
         
-        return jsonify({'user': user.to_dict()}), 200
+        access_token = create_access_token(identity=user_id, additional_claims=profile_claims(user))
+        return jsonify({'access_token': access_token}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -91,6 +130,26 @@ def get_current_user():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    # في JWT، تسجيل الخروج يتم من جانب العميل بحذف التوكن
-    return jsonify({'message': 'تم تسجيل الخروج بنجاح'}), 200
+    """إبطال توكن الوصول الحالي (وتوكن التجديد إن أُرسل في refresh_token)"""
+    try:
+        # التحقق من توكن التجديد قبل إبطال أي شيء
+        refresh_payload = None
+        data = request.get_json(silent=True) or {}
+        if data.get('refresh_token'):
+            try:
+                refresh_payload = decode_token(data['refresh_token'], allow_expired=True)
+            except (PyJWTError, JWTExtendedException):
+                return jsonify({'error': 'توكن التجديد غير صالح'}), 400
+            if refresh_payload.get('sub') != get_jwt_identity() or refresh_payload.get('type') != 'refresh':
+                return jsonify({'error': 'توكن التجديد غير صالح'}), 400
+        
+        token_blocklist.revoke(get_jwt())
+        if refresh_payload:
+            token_blocklist.revoke(refresh_payload)
+        
+        return jsonify({'message': 'تم تسجيل الخروج بنجاح'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
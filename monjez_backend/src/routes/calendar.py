@@ -1,12 +1,62 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models import db
 from src.models.task import Task
-from hijri_converter import Hijri, Gregorian
-from datetime import datetime, timedelta
+from src.utils.cache import LRUCache
+from src.models.task_occurrence import Occurrence
+from src.utils import occurrence_index
+from src.utils.recurrence import TaskOccurrence, expand_tasks
+from src.utils.etags import (IMMUTABLE_CACHE_CONTROL, current_version, is_not_modified, not_modified,
+                             user_etag, with_cache_control, with_etag)
+from src.utils.hijri_calendar import format_hijri, gregorian_to_hijri, hijri_to_gregorian, iter_days, parse_date
+from datetime import date, datetime, timedelta
 import calendar
 
 calendar_bp = Blueprint('calendar', __name__)
 
+# الحد الأقصى لعدد الأيام (تواريخ منفردة + أيام النطاقات) في طلب تحويل جماعي واحد
+MAX_CONVERT_BATCH = 5000
+
+# ذاكرة مؤقتة لاستجابات شبكة التقويم: المفتاح (user_id, view, cal, from, overlays, اليوم، إصدار التغييرات)
+# والقيمة (بداية النطاق، نهايته، الاستجابة). الإصدار في المفتاح يجعل كتابات العمليات الأخرى
+# تتجاوز المدخلات القديمة؛ الإبطال المحلي يحرر ذاكرتها مبكراً فقط
+GRID_CACHE = LRUCache(maxsize=2048, ttl=300)
+
+def invalidate_calendar_cache(user_id, *due_dates, recurring=False):
+    """إبطال شبكات المستخدم المخزنة التي يقع ضمن نطاقها أي من تواريخ الاستحقاق القديمة أو الجديدة
+
+    نسخ المهام المتكررة تظهر بعد تاريخ بدايتها، لذا تُبطل معها كل الشبكات اللاحقة لأقدم تاريخ.
+    """
+    due_dates = [due_at.replace(tzinfo=None) for due_at in due_dates if due_at is not None]
+    if not due_dates:
+        return 0
+    
+    if recurring:
+        series_start = min(due_dates)
+        return GRID_CACHE.invalidate(lambda key, value: key[0] == user_id and value[1] >= series_start)
+    
+    return GRID_CACHE.invalidate(lambda key, value: key[0] == user_id and any(
+        value[0] <= due_at <= value[1] for due_at in due_dates))
+
+def is_recurring():
+    """شرط SQL للمهام ذات قاعدة تكرار"""
+    return db.and_(Task.recurrence_rule.isnot(None), Task.recurrence_rule != '')
+
+def get_window_tasks(user_id, start_date, range_end):
+    """مهام النطاق: العادية باستحقاقها، والمتكررة موسعة إلى نسخها داخل النطاق"""
+    tasks = Task.query.filter(
+        Task.owner_id == user_id,
+        Task.due_at >= start_date,
+        Task.due_at <= range_end,
+        db.not_(is_recurring())
+    ).all()
+    # النسخ من الفهرس المادي إن كان يغطي النطاق، وإلا بالتوسيع عند الطلب
+    if occurrence_index.covers(range_end):
+        return tasks + occurrence_index.fetch_occurrences(user_id, start_date, range_end - timedelta(microseconds=1))
+    # السلاسل التي بدأت قبل نهاية النطاق فقط قد تملك نسخاً داخله
+    recurring = Task.query.filter(Task.owner_id == user_id, is_recurring(), Task.due_at < range_end).all()
+    return tasks + expand_tasks(recurring, start_date, range_end - timedelta(microseconds=1))
+
 @calendar_bp.route('/calendar/grid', methods=['GET'])
 @jwt_required()
 def get_calendar_grid():
@@ -18,10 +68,26 @@ def get_calendar_grid():
         cal_type = request.args.get('cal', 'gregorian')  # gregorian, hijri
         from_date = request.args.get('from')
         overlays = request.args.get('overlays', '').split(',')
+        compact = request.args.get('compact') in ('1', 'true')
+        heatmap = view == 'year' and request.args.get('mode') == 'heatmap'
         
         if not from_date:
             from_date = datetime.now().strftime('%Y-%m-%d')
         
+        # 304 قبل الذاكرة المؤقتة والاستعلام إن لم تتغير مهام المستخدم
+        today = datetime.now().date()
+        version = current_version(user_id)
+        etag = user_etag(user_id, from_date, today, version=version)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        
+        # is_today يعتمد على تاريخ اليوم، والإصدار مشترك بين العمليات، لذا يدخلان في المفتاح
+        cache_key = (user_id, view, cal_type, from_date, tuple(sorted(set(overlays))),
+                     compact, heatmap, today, version)
+        cached = GRID_CACHE.get(cache_key)
+        if cached is not None:
+            return with_etag(jsonify(cached[2]), etag), 200
+        
         # تحويل التاريخ
         base_date = datetime.strptime(from_date, '%Y-%m-%d')
         
@@ -43,12 +109,20 @@ def get_calendar_grid():
             start_date = base_date.replace(month=1, day=1)
             end_date = base_date.replace(month=12, day=31)
         
-        # الحصول على المهام في النطاق المحدد
-        tasks = Task.query.filter(
-            Task.owner_id == user_id,
-            Task.due_at >= start_date,
-            Task.due_at <= end_date + timedelta(days=1)
-        ).all()
+        range_end = end_date + timedelta(days=1)
+        
+        if heatmap:
+            response = build_heatmap(user_id, start_date, end_date, range_end, cal_type, from_date)
+            GRID_CACHE.set(cache_key, (start_date, range_end, response))
+            return with_etag(jsonify(response), etag), 200
+        
+        # الحصول على المهام في النطاق المحدد (مع نسخ المهام المتكررة)
+        tasks = get_window_tasks(user_id, start_date, range_end)
+        
+        if compact:
+            response = build_compact_grid(tasks, start_date, end_date, cal_type, view, from_date)
+            GRID_CACHE.set(cache_key, (start_date, range_end, response))
+            return with_etag(jsonify(response), etag), 200
         
         # تجميع المهام حسب التاريخ
         tasks_by_date = {}
@@ -69,11 +143,7 @@ def get_calendar_grid():
             # تحويل للهجري إذا كان مطلوباً
             hijri_date = None
             if cal_type == 'hijri':
-                try:
-                    hijri = Gregorian(current_date.year, current_date.month, current_date.day).to_hijri()
-                    hijri_date = f"{hijri.year}-{hijri.month:02d}-{hijri.day:02d}"
-                except:
-                    hijri_date = None
+                hijri_date = format_hijri(current_date.date())
             
             day_data = {
                 'date': date_key,
@@ -98,17 +168,148 @@ def get_calendar_grid():
             grid.append(day_data)
             current_date += timedelta(days=1)
         
-        return jsonify({
+        response = {
             'view': view,
             'calendar_type': cal_type,
             'from_date': from_date,
             'grid': grid,
             'total_tasks': len(tasks)
-        }), 200
+        }
+        GRID_CACHE.set(cache_key, (start_date, range_end, response))
+        
+        return with_etag(jsonify(response), etag), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_compact_grid(tasks, start_date, end_date, cal_type, view, from_date):
+    """شبكة مضغوطة: مصفوفات مفهرسة باليوم (عدد المهام ومعرفاتها وأوقاتها) مع جدول مهام غير مكرر
+
+    جدول المهام يحمل الحقول الثابتة فقط؛ نسخ المهمة المتكررة تتشارك مدخلها، ولكل خلية
+    مصفوفة times موازية لـ task_ids بأزواج [due_at, start_at] الخاصة بالنسخة.
+    """
+    day_count = (end_date - start_date).days + 1
+    task_ids = [[] for _ in range(day_count)]
+    times = [[] for _ in range(day_count)]
+    task_table = {}
+    
+    for task in tasks:
+        index = (task.due_at.date() - start_date.date()).days
+        if 0 <= index < day_count:
+            task_ids[index].append(task.id)
+            times[index].append([task.due_at.isoformat(), task.start_at.isoformat() if task.start_at else None])
+            if task.id not in task_table:
+                data = (task.task if isinstance(task, TaskOccurrence) else task).to_dict()
+                del data['due_at'], data['start_at']
+                task_table[task.id] = data
+    
+    today_index = (datetime.now().date() - start_date.date()).days
+    return {
+        'view': view,
+        'calendar_type': cal_type,
+        'from_date': from_date,
+        'compact': True,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'day_count': day_count,
+        'today_index': today_index if 0 <= today_index < day_count else None,
+        'counts': [len(ids) for ids in task_ids],
+        'task_ids': task_ids,
+        'times': times,
+        'hijri_dates': [format_hijri((start_date + timedelta(days=i)).date()) for i in range(day_count)]
+        if cal_type == 'hijri' else None,
+        'tasks': task_table,
+        'total_tasks': len(tasks)
+    }
+
+def build_heatmap(user_id, start_date, end_date, range_end, cal_type, from_date):
+    """خريطة حرارية للسنة: عدد المهام لكل يوم محسوب بـ GROUP BY دون تحميل صفوف المهام"""
+    due_day = db.func.date(Task.due_at)
+    rows = db.session.query(due_day, db.func.count(Task.id)).filter(
+        Task.owner_id == user_id,
+        Task.due_at >= start_date,
+        Task.due_at <= range_end,
+        db.not_(is_recurring())
+    ).group_by(due_day).all()
+    
+    # SQLite يعيد التاريخ كنص و Postgres ككائن date
+    counts_by_date = {str(day): count for day, count in rows}
+    
+    if occurrence_index.covers(range_end):
+        # نسخ المهام المتكررة من الفهرس المادي بنفس التجميع
+        occurs_day = db.func.date(Occurrence.occurs_at)
+        for day, count in db.session.query(occurs_day, db.func.count(Occurrence.id)).filter(
+                Occurrence.owner_id == user_id,
+                Occurrence.occurs_at >= start_date,
+                Occurrence.occurs_at < range_end
+        ).group_by(occurs_day):
+            counts_by_date[str(day)] = counts_by_date.get(str(day), 0) + count
+    else:
+        # نسخ المهام المتكررة تُعد في بايثون لأنها غير مخزنة
+        recurring = Task.query.filter(Task.owner_id == user_id, is_recurring(), Task.due_at < range_end).all()
+        for occurrence in expand_tasks(recurring, start_date, range_end - timedelta(microseconds=1)):
+            day = occurrence.due_at.strftime('%Y-%m-%d')
+            counts_by_date[day] = counts_by_date.get(day, 0) + 1
+    day_count = (end_date - start_date).days + 1
+    counts = [counts_by_date.get((start_date + timedelta(days=i)).strftime('%Y-%m-%d'), 0)
+              for i in range(day_count)]
+    
+    return {
+        'view': 'year',
+        'mode': 'heatmap',
+        'calendar_type': cal_type,
+        'from_date': from_date,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'day_count': day_count,
+        'counts': counts,
+        'max_count': max(counts) if counts else 0,
+        'total_tasks': sum(counts)
+    }
+
+def format_hijri_tuple(hijri):
+    """تنسيق (سنة، شهر، يوم) هجري كنص YYYY-MM-DD"""
+    return f"{hijri[0]}-{hijri[1]:02d}-{hijri[2]:02d}"
+
+def convert_single(date_str, from_type, to_type):
+    """تحويل تاريخ واحد عبر جدول البحث، مع ValueError للتواريخ غير الصالحة"""
+    if from_type == 'gregorian' and to_type == 'hijri':
+        # تحويل من ميلادي إلى هجري
+        hijri = gregorian_to_hijri(date(*parse_date(date_str)))
+        if hijri is None:
+            raise ValueError('التاريخ خارج النطاق المدعوم')
+        return format_hijri_tuple(hijri)
+    if from_type == 'hijri' and to_type == 'gregorian':
+        # تحويل من هجري إلى ميلادي
+        return hijri_to_gregorian(*parse_date(date_str)).isoformat()
+    return date_str  # نفس التاريخ إذا كان النوع متشابه
+
+def convert_range(start_str, end_str, from_type, to_type):
+    """تحويل كل أيام نطاق مغلق بالتقدم التسلسلي في جدول الأشهر"""
+    if from_type == 'hijri':
+        first, last = hijri_to_gregorian(*parse_date(start_str)), hijri_to_gregorian(*parse_date(end_str))
+    else:
+        first, last = date(*parse_date(start_str)), date(*parse_date(end_str))
+    
+    if last < first:
+        raise ValueError('نهاية النطاق قبل بدايته')
+    if (last - first).days + 1 > MAX_CONVERT_BATCH:
+        raise OverflowError
+    
+    conversions = []
+    for gregorian, hijri in iter_days(first, last):
+        gregorian_str, hijri_str = gregorian.isoformat(), format_hijri_tuple(hijri)
+        if from_type == 'hijri':
+            original, converted = hijri_str, (gregorian_str if to_type == 'gregorian' else hijri_str)
+        else:
+            original, converted = gregorian_str, (hijri_str if to_type == 'hijri' else gregorian_str)
+        conversions.append({'original_date': original, 'converted_date': converted})
+    return conversions
+
+@calendar_bp.route('/calendar/grid/cache-stats', methods=['GET'])
+@jwt_required()
+def get_calendar_cache_stats():
+    """إحصاءات ذاكرة شبكة التقويم المؤقتة (الإصابات، الإخفاقات، الحجم)"""
+    return jsonify({'grid_cache': GRID_CACHE.stats()}), 200
+
 @calendar_bp.route('/calendar/convert', methods=['POST'])
 def convert_date():
     """تحويل التاريخ بين الهجري والميلادي"""
@@ -121,28 +322,72 @@ def convert_date():
         if not date_str:
             return jsonify({'error': 'التاريخ مطلوب'}), 400
         
-        if from_type == 'gregorian' and to_type == 'hijri':
-            # تحويل من ميلادي إلى هجري
-            date_parts = date_str.split('-')
-            year, month, day = int(date_parts[0]), int(date_parts[1]), int(date_parts[2])
-            hijri = Gregorian(year, month, day).to_hijri()
-            converted_date = f"{hijri.year}-{hijri.month:02d}-{hijri.day:02d}"
-        elif from_type == 'hijri' and to_type == 'gregorian':
-            # تحويل من هجري إلى ميلادي
-            date_parts = date_str.split('-')
-            year, month, day = int(date_parts[0]), int(date_parts[1]), int(date_parts[2])
-            gregorian = Hijri(year, month, day).to_gregorian()
-            converted_date = f"{gregorian.year}-{gregorian.month:02d}-{gregorian.day:02d}"
-        else:
-            converted_date = date_str  # نفس التاريخ إذا كان النوع متشابه
+        try:
+            converted_date = convert_single(date_str, from_type, to_type)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({
+        # التحويل حساب ثابت لا يعتمد على المستخدم أو الوقت
+        return with_cache_control(jsonify({
             'original_date': date_str,
             'converted_date': converted_date,
             'from_type': from_type,
             'to_type': to_type
-        }), 200
+        }), IMMUTABLE_CACHE_CONTROL), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@calendar_bp.route('/calendar/convert/batch', methods=['POST'])
+def convert_dates_batch():
+    """تحويل مجموعة تواريخ و/أو نطاقات تواريخ في طلب واحد (بحد أقصى MAX_CONVERT_BATCH يوماً)"""
+    try:
+        data = request.get_json()
+        dates = data.get('dates', [])
+        ranges = data.get('ranges', [])
+        from_type = data.get('from', 'gregorian')  # gregorian, hijri
+        to_type = data.get('to', 'hijri')  # gregorian, hijri
+        
+        if not isinstance(dates, list) or not isinstance(ranges, list) or not (dates or ranges):
+            return jsonify({'error': 'قائمة التواريخ أو النطاقات مطلوبة'}), 400
+        
+        if from_type not in ('gregorian', 'hijri') or to_type not in ('gregorian', 'hijri'):
+            return jsonify({'error': 'نوع التقويم غير مدعوم'}), 400
+        
+        budget = MAX_CONVERT_BATCH - len(dates)
+        if budget < 0:
+            return jsonify({'error': f'الحد الأقصى للتحويل الجماعي هو {MAX_CONVERT_BATCH} يوماً'}), 400
+        
+        conversions = []
+        for date_str in dates:
+            try:
+                conversions.append({'original_date': date_str, 'converted_date': convert_single(date_str, from_type, to_type)})
+            except ValueError as e:
+                conversions.append({'original_date': date_str, 'converted_date': None, 'error': str(e)})
+        
+        range_results = []
+        for date_range in ranges:
+            start_str = date_range.get('start') if isinstance(date_range, dict) else None
+            end_str = date_range.get('end') if isinstance(date_range, dict) else None
+            result = {'start': start_str, 'end': end_str}
+            try:
+                result['conversions'] = convert_range(start_str, end_str, from_type, to_type)
+                budget -= len(result['conversions'])
+                if budget < 0:
+                    raise OverflowError
+            except OverflowError:
+                return jsonify({'error': f'الحد الأقصى للتحويل الجماعي هو {MAX_CONVERT_BATCH} يوماً'}), 400
+            except ValueError as e:
+                result.update(conversions=[], error=str(e))
+            range_results.append(result)
+        
+        return with_cache_control(jsonify({
+            'from_type': from_type,
+            'to_type': to_type,
+            'conversions': conversions,
+            'ranges': range_results,
+            'count': len(conversions) + sum(len(result['conversions']) for result in range_results)
+        }), IMMUTABLE_CACHE_CONTROL), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
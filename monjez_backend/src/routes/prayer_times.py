@@ -1,86 +1,101 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db, User
+from src.models.prayer_reminder import PrayerReminderPreference
+from datetime import date, datetime, timedelta
 import requests
 import json
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from src.utils.hijri_calendar import format_hijri, parse_date
+from src.utils.prayer_calc import (
+    ASR_FACTORS, CALCULATION_METHODS, DEFAULT_CITY, DEFAULT_METHOD, PRAYERS, prayer_times_for, resolve_location
+)
+from src.utils.prayer_timetable import TIMES, compute_timetable, format_minutes
+from src.utils.reminder_scheduler import ReminderSettings, reminder_scheduler
+from src.utils.etags import (IMMUTABLE_CACHE_CONTROL, is_not_modified, make_etag, not_modified,
+                             request_signature, until_local_midnight, with_etag)
 
 prayer_bp = Blueprint('prayer', __name__)
 
-# بيانات أوقات الصلاة الثابتة للرياض (يمكن تحسينها بـ API خارجي)
-RIYADH_PRAYER_TIMES = {
-    "2025-08-25": {
-        "fajr": "04:15",
-        "dhuhr": "12:05",
-        "asr": "15:30",
-        "maghrib": "18:45",
-        "isha": "20:15"
-    },
-    "2025-08-26": {
-        "fajr": "04:16",
-        "dhuhr": "12:05",
-        "asr": "15:29",
-        "maghrib": "18:44",
-        "isha": "20:14"
-    },
-    "2025-08-27": {
-        "fajr": "04:17",
-        "dhuhr": "12:04",
-        "asr": "15:29",
-        "maghrib": "18:43",
-        "isha": "20:13"
-    }
-}
+# حدود طلب جدول أوقات الصلاة لنطاق
+MAX_TIMETABLE_DAYS = 731
+MAX_TIMETABLE_CELLS = 50000  # عدد الأيام × عدد المواقع
+
+def get_calculation_options(args):
+    """قراءة الموقع وطريقة الحساب من معاملات الاستعلام (ValueError عند عدم الصحة)"""
+    try:
+        location = resolve_location(args.get('city'), args.get('lat'), args.get('lng'), args.get('tz'))
+    except ZoneInfoNotFoundError:
+        raise ValueError('المنطقة الزمنية غير صحيحة')
+    
+    method = args.get('method', DEFAULT_METHOD)
+    asr = args.get('asr', 'standard')
+    if method not in CALCULATION_METHODS:
+        raise ValueError('طريقة الحساب غير مدعومة')
+    if asr not in ASR_FACTORS:
+        raise ValueError('مذهب حساب العصر غير مدعوم')
+    return location, method, asr
+
+def local_today(tz_name):
+    """تاريخ اليوم بتوقيت الموقع بصيغة YYYY-MM-DD"""
+    return datetime.now(ZoneInfo(tz_name)).strftime('%Y-%m-%d')
 
 @prayer_bp.route('/prayer-times', methods=['GET'])
 def get_prayer_times():
     """الحصول على أوقات الصلاة"""
     try:
-        date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
-        city = request.args.get('city', 'riyadh')
+        try:
+            location, method, asr = get_calculation_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # الوقت الحالي بتوقيت الموقع المطلوب
+        local_now = datetime.now(ZoneInfo(location.timezone)).replace(tzinfo=None)
+        date = request.args.get('date', local_now.strftime('%Y-%m-%d'))
+        city = location.key or request.args.get('city')
         
         # التحقق من صحة التاريخ
         try:
-            datetime.strptime(date, '%Y-%m-%d')
+            day = datetime.strptime(date, '%Y-%m-%d').date()
         except ValueError:
             return jsonify({'error': 'تنسيق التاريخ غير صحيح. استخدم YYYY-MM-DD'}), 400
         
-        # الحصول على أوقات الصلاة من البيانات المحلية
-        prayer_times = RIYADH_PRAYER_TIMES.get(date)
-        
-        if not prayer_times:
-            # إنشاء أوقات افتراضية إذا لم تكن متوفرة
-            prayer_times = {
-                "fajr": "04:15",
-                "dhuhr": "12:05",
-                "asr": "15:30",
-                "maghrib": "18:45",
-                "isha": "20:15"
-            }
+        # حساب أوقات الصلاة محلياً (مخزنة في ذاكرة LRU بعد أول حساب)
+        calculated = prayer_times_for(location, day, method, asr)
+        prayer_times = {prayer: calculated[prayer] for prayer in PRAYERS}
         
         # إضافة معلومات إضافية
-        current_time = datetime.now().time()
+        current_time = local_now.time()
         next_prayer = None
+        next_time = None
         time_to_next = None
         
         # تحديد الصلاة القادمة
-        prayer_order = ['fajr', 'dhuhr', 'asr', 'maghrib', 'isha']
-        for prayer in prayer_order:
+        for prayer in PRAYERS:
+            if not prayer_times[prayer]:
+                continue
             prayer_time = datetime.strptime(prayer_times[prayer], '%H:%M').time()
             if current_time < prayer_time:
                 next_prayer = prayer
+                next_time = prayer_times[prayer]
                 # حساب الوقت المتبقي
-                now = datetime.combine(datetime.now().date(), current_time)
-                next_prayer_dt = datetime.combine(datetime.now().date(), prayer_time)
-                time_to_next = str(next_prayer_dt - now)
+                next_prayer_dt = datetime.combine(local_now.date(), prayer_time)
+                time_to_next = str(next_prayer_dt - local_now)
                 break
         
         # إذا لم نجد صلاة قادمة اليوم، فالصلاة القادمة هي فجر الغد
         if not next_prayer:
             next_prayer = 'fajr'
-            tomorrow = datetime.now().date() + timedelta(days=1)
-            fajr_time = datetime.strptime(prayer_times['fajr'], '%H:%M').time()
-            next_prayer_dt = datetime.combine(tomorrow, fajr_time)
-            now = datetime.now()
-            time_to_next = str(next_prayer_dt - now)
+            tomorrow = local_now.date() + timedelta(days=1)
+            next_time = prayer_times_for(location, tomorrow, method, asr)['fajr']
+            if next_time:
+                next_prayer_dt = datetime.combine(tomorrow, datetime.strptime(next_time, '%H:%M').time())
+                time_to_next = str(next_prayer_dt - local_now)
+        
+        # ETag ضعيف: الأوقات والصلاة القادمة ثابتة حتى الصلاة التالية، والعدّاد يحسبه العميل من next_prayer.time
+        etag = make_etag(request_signature(), date, next_prayer, next_time)
+        if is_not_modified(etag, weak=True):
+            return not_modified(etag, 'public, no-cache', weak=True)
         
         # ترجمة أسماء الصلوات
         prayer_names = {
@@ -99,18 +114,21 @@ def get_prayer_times():
                 'name': prayer_names[prayer]
             }
         
-        return jsonify({
+        return with_etag(jsonify({
             'date': date,
             'city': city,
+            'location': location._asdict(),
+            'method': method,
+            'sunrise': calculated['sunrise'],
             'prayer_times': arabic_prayer_times,
             'next_prayer': {
                 'name': prayer_names.get(next_prayer, next_prayer),
                 'key': next_prayer,
-                'time': prayer_times.get(next_prayer),
+                'time': next_time,
                 'time_remaining': time_to_next
             },
             'hijri_date': get_hijri_date(date)
-        }), 200
+        }), etag, 'public, no-cache', weak=True), 200
         
     except Exception as e:
         return jsonify({'error': f'خطأ في الحصول على أوقات الصلاة: {str(e)}'}), 500
@@ -119,8 +137,16 @@ def get_prayer_times():
 def get_week_prayer_times():
     """الحصول على أوقات الصلاة لأسبوع كامل"""
     try:
-        start_date = request.args.get('start_date', datetime.now().strftime('%Y-%m-%d'))
-        city = request.args.get('city', 'riyadh')
+        try:
+            location, method, asr = get_calculation_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        city = location.key or request.args.get('city')
+        
+        # الافتراضي "اليوم" بتوقيت الموقع، فلا تُخزن الاستجابة بعد منتصف ليله
+        start_date = request.args.get('start_date') or local_today(location.timezone)
+        cache_control = (IMMUTABLE_CACHE_CONTROL if request.args.get('start_date')
+                         else until_local_midnight(location.timezone))
         
         # التحقق من صحة التاريخ
         try:
@@ -128,6 +154,11 @@ def get_week_prayer_times():
         except ValueError:
             return jsonify({'error': 'تنسيق التاريخ غير صحيح. استخدم YYYY-MM-DD'}), 400
         
+        # الاستجابة دالة في المعاملات وتاريخ البداية فقط
+        etag = make_etag(request_signature(), start_date)
+        if is_not_modified(etag):
+            return not_modified(etag, cache_control)
+        
         week_prayer_times = {}
         
         for i in range(7):
@@ -135,13 +166,8 @@ def get_week_prayer_times():
             date_str = current_date.strftime('%Y-%m-%d')
             
             # الحصول على أوقات الصلاة لهذا اليوم
-            prayer_times = RIYADH_PRAYER_TIMES.get(date_str, {
-                "fajr": "04:15",
-                "dhuhr": "12:05",
-                "asr": "15:30",
-                "maghrib": "18:45",
-                "isha": "20:15"
-            })
+            calculated = prayer_times_for(location, current_date.date(), method, asr)
+            prayer_times = {prayer: calculated[prayer] for prayer in PRAYERS}
             
             week_prayer_times[date_str] = {
                 'date': date_str,
@@ -150,46 +176,179 @@ def get_week_prayer_times():
                 'hijri_date': get_hijri_date(date_str)
             }
         
-        return jsonify({
+        return with_etag(jsonify({
             'start_date': start_date,
             'city': city,
+            'method': method,
             'week_prayer_times': week_prayer_times
-        }), 200
+        }), etag, cache_control), 200
         
     except Exception as e:
         return jsonify({'error': f'خطأ في الحصول على أوقات الصلاة الأسبوعية: {str(e)}'}), 500
 
+@prayer_bp.route('/prayer-times/range', methods=['GET'])
+def get_prayer_times_range():
+    """جدول أوقات الصلاة لنطاق أيام وعدة مدن دفعة واحدة بصيغة عمودية"""
+    try:
+        output_format = request.args.get('format', 'hhmm')  # hhmm, minutes
+        cities = [city for city in request.args.get('cities', '').split(',') if city.strip()]
+        
+        try:
+            if cities:
+                locations = [resolve_location(city) for city in cities]
+                _, method, asr = get_calculation_options({**request.args, 'city': cities[0]})
+            else:
+                location, method, asr = get_calculation_options(request.args)
+                locations = [location]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # الافتراضي "اليوم" بتوقيت الموقع الأول، فلا تُخزن الاستجابة بعد منتصف ليله
+        start_date = request.args.get('start_date') or local_today(locations[0].timezone)
+        end_date = request.args.get('end_date', start_date)
+        cache_control = (IMMUTABLE_CACHE_CONTROL if request.args.get('start_date')
+                         else until_local_midnight(locations[0].timezone))
+        
+        try:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'تنسيق التاريخ غير صحيح. استخدم YYYY-MM-DD'}), 400
+        
+        day_count = (end_dt - start_dt).days + 1
+        if day_count < 1 or day_count > MAX_TIMETABLE_DAYS:
+            return jsonify({'error': f'النطاق يجب أن يكون بين يوم و{MAX_TIMETABLE_DAYS} يوماً'}), 400
+        
+        etag = make_etag(request_signature(), start_date, end_date)
+        if is_not_modified(etag):
+            return not_modified(etag, cache_control)
+        
+        if day_count * len(locations) > MAX_TIMETABLE_CELLS:
+            return jsonify({'error': f'الحد الأقصى هو {MAX_TIMETABLE_CELLS} (يوم × مدينة) في الطلب'}), 400
+        
+        days, timetable = compute_timetable(locations, start_dt, end_dt, method, asr)
+        
+        times = {}
+        for index, location in enumerate(locations):
+            key = location.key or 'custom'
+            if output_format == 'minutes':
+                times[key] = {name: [None if value != value else int(value) for value in timetable[name][index]]
+                              for name in TIMES}
+            else:
+                times[key] = {name: format_minutes(timetable[name][index]) for name in TIMES}
+        
+        return with_etag(jsonify({
+            'start_date': start_date,
+            'end_date': end_date,
+            'method': method,
+            'asr': asr,
+            'format': output_format,
+            'dates': [day.isoformat() for day in days],
+            'hijri_dates': [format_hijri(day) for day in days],
+            'locations': [location._asdict() for location in locations],
+            'times': times
+        }), etag, cache_control), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'خطأ في حساب جدول أوقات الصلاة: {str(e)}'}), 500
+
 @prayer_bp.route('/prayer-times/reminders', methods=['POST'])
+@jwt_required()
 def create_prayer_reminders():
-    """إنشاء تذكيرات للصلوات"""
+    """حفظ تفضيلات تذكير الصلاة للمستخدم وجدولتها"""
     try:
+        user_id = get_jwt_identity()
         data = request.get_json()
         
-        enabled_prayers = data.get('prayers', ['fajr', 'dhuhr', 'asr', 'maghrib', 'isha'])
+        enabled_prayers = data.get('prayers', list(PRAYERS))
         reminder_minutes = data.get('reminder_minutes', 10)  # تذكير قبل 10 دقائق
         
-        # هنا يمكن حفظ تفضيلات التذكير في قاعدة البيانات
-        # وإنشاء مهام تذكير تلقائية
+        if not isinstance(enabled_prayers, list) or any(prayer not in PRAYERS for prayer in enabled_prayers):
+            return jsonify({'error': 'قائمة الصلوات غير صحيحة'}), 400
+        
+        if not isinstance(reminder_minutes, int) or not 0 <= reminder_minutes <= 180:
+            return jsonify({'error': 'مدة التذكير يجب أن تكون بين 0 و180 دقيقة'}), 400
+        
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'المستخدم غير موجود'}), 404
+        
+        preference = PrayerReminderPreference.query.get(user_id) or PrayerReminderPreference(user_id=user_id)
+        preference.prayers = ','.join(prayer for prayer in PRAYERS if prayer in enabled_prayers)
+        preference.reminder_minutes = reminder_minutes
+        preference.city = data.get('city', preference.city or DEFAULT_CITY)
+        if data.get('city') and 'lat' not in data and 'lng' not in data:
+            # الإحداثيات مقدمة على المدينة في resolve_location، فالمدينة الجديدة تلغي القديمة
+            preference.latitude = preference.longitude = None
+        else:
+            preference.latitude = data.get('lat', preference.latitude)
+            preference.longitude = data.get('lng', preference.longitude)
+        preference.timezone = data.get('tz', user.timezone)
+        preference.method = data.get('method', preference.method or DEFAULT_METHOD)
+        preference.enabled = True
+        
+        if preference.method not in CALCULATION_METHODS:
+            return jsonify({'error': 'طريقة الحساب غير مدعومة'}), 400
+        
+        try:
+            settings = ReminderSettings.from_preference(preference)
+        except (ValueError, ZoneInfoNotFoundError):
+            return jsonify({'error': 'الموقع أو المنطقة الزمنية غير صحيحة'}), 400
+        
+        db.session.add(preference)
+        db.session.commit()
+        # العمليات الأخرى تكتفي بالحفظ؛ عملية المُجدول تلتقط التغيير عند الاستطلاع التالي
+        if reminder_scheduler.is_running:
+            reminder_scheduler.schedule(settings)
         
         return jsonify({
             'message': 'تم إنشاء تذكيرات الصلاة بنجاح',
-            'enabled_prayers': enabled_prayers,
+            'enabled_prayers': preference.prayer_list,
             'reminder_minutes': reminder_minutes,
+            'preferences': preference.to_dict(),
             'created_at': datetime.utcnow().isoformat()
         }), 201
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'خطأ في إنشاء تذكيرات الصلاة: {str(e)}'}), 500
 
+@prayer_bp.route('/prayer-times/reminders', methods=['GET'])
+@jwt_required()
+def get_prayer_reminders():
+    """الحصول على تفضيلات تذكير الصلاة للمستخدم"""
+    try:
+        preference = PrayerReminderPreference.query.get(get_jwt_identity())
+        return jsonify({'preferences': preference.to_dict() if preference else None}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'خطأ في الحصول على تذكيرات الصلاة: {str(e)}'}), 500
+
+@prayer_bp.route('/prayer-times/reminders', methods=['DELETE'])
+@jwt_required()
+def delete_prayer_reminders():
+    """إيقاف تذكيرات الصلاة للمستخدم"""
+    try:
+        user_id = get_jwt_identity()
+        preference = PrayerReminderPreference.query.get(user_id)
+        
+        if preference:
+            preference.enabled = False
+            db.session.commit()
+        if reminder_scheduler.is_running:
+            reminder_scheduler.unschedule(user_id)
+        
+        return jsonify({'message': 'تم إيقاف تذكيرات الصلاة'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'خطأ في إيقاف تذكيرات الصلاة: {str(e)}'}), 500
+
 def get_hijri_date(gregorian_date):
     """تحويل التاريخ الميلادي إلى هجري (مبسط)"""
     try:
-        from hijri_converter import Gregorian
-        date_parts = gregorian_date.split('-')
-        year, month, day = int(date_parts[0]), int(date_parts[1]), int(date_parts[2])
-        hijri = Gregorian(year, month, day).to_hijri()
-        return f"{hijri.year}-{hijri.month:02d}-{hijri.day:02d}"
-    except:
+        return format_hijri(date(*parse_date(gregorian_date)))
+    except ValueError:
         return None
 
 def get_arabic_day_name(weekday):
@@ -0,0 +1,124 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, delete
+from src.models import db
+from src.models.task import Task
+from src.models.task_tombstone import TaskTombstone
+from src.utils.etags import PRIVATE_CACHE_CONTROL, with_cache_control
+from datetime import datetime, timedelta
+import base64
+import binascii
+import json
+import os
+
+sync_bp = Blueprint('sync', __name__)
+
+# حدود حجم صفحة المزامنة
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 1000
+
+# مدة الاحتفاظ بآثار الحذف؛ الرموز الأقدم منها تتطلب مزامنة كاملة
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 90))
+
+# هامش تداخل يُعاد إرساله في كل مزامنة حتى لا تضيع كتابات التزمت بطابع زمني أقدم من قراءتنا
+SYNC_SAFETY_SECONDS = 5
+
+
+def encode_sync_token(changed_at, last_id='', issued_at=None):
+    """ترميز موضع المزامنة (changed_at, id) ووقت بدء جلسة المزامنة كرمز معتم"""
+    payload = [changed_at.isoformat(), last_id, (issued_at or changed_at).isoformat()]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_sync_token(token):
+    """فك ترميز رمز المزامنة إلى (changed_at, id, issued_at)؛ الرموز القديمة بلا issued_at تُعامل كصادرة عند changed_at"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        changed_at, last_id = payload[:2]
+        issued_at = payload[2] if len(payload) > 2 else changed_at
+        return datetime.fromisoformat(changed_at), str(last_id), datetime.fromisoformat(issued_at)
+    except (binascii.Error, TypeError, ValueError, KeyError):
+        raise ValueError('رمز المزامنة غير صالح')
+
+
+def after_position(time_column, id_column, changed_at, last_id):
+    """شرط keyset بعد الموضع بترتيب (الوقت، المعرّف)"""
+    return db.or_(time_column > changed_at, db.and_(time_column == changed_at, id_column > last_id))
+
+
+def record_tombstones(user_id, task_ids, deleted_at=None):
+    """تسجيل آثار حذف مهام ضمن معاملة الحذف، مع تنظيف آثار المستخدم المنتهية"""
+    if not task_ids:
+        return
+    deleted_at = deleted_at or datetime.utcnow()
+    db.session.execute(delete(TaskTombstone).where(
+        TaskTombstone.owner_id == user_id,
+        TaskTombstone.deleted_at < deleted_at - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    ))
+    db.session.execute(insert(TaskTombstone), [
+        {'task_id': task_id, 'owner_id': user_id, 'deleted_at': deleted_at} for task_id in task_ids
+    ])
+
+
+@sync_bp.route('/sync', methods=['GET'])
+@jwt_required()
+def sync_tasks():
+    """المهام المنشأة أو المعدلة أو المحذوفة منذ رمز المزامنة، مرتبة ومقسمة إلى صفحات"""
+    try:
+        user_id = get_jwt_identity()
+        now = datetime.utcnow()
+
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_SYNC_LIMIT)), 1), MAX_SYNC_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'قيمة limit غير صحيحة'}), 400
+
+        since = request.args.get('since')
+        if since:
+            try:
+                changed_at, last_id, issued_at = decode_sync_token(since)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # الصلاحية تُقاس بوقت بدء الجلسة لا بموضع الرمز: صفحات المزامنة الكاملة تحمل مواضع قديمة
+            # لكنها بدأت للتو، أما جلسة بدأت قبل مدة الاحتفاظ فقد تكون آثار حذف بعدها نُظفت
+            if issued_at < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+                return jsonify({'error': 'رمز المزامنة منتهي الصلاحية، يلزم إجراء مزامنة كاملة',
+                                'full_resync': True}), 410
+        else:
+            # مزامنة كاملة أولى: كل المهام ولا حاجة لآثار الحذف
+            changed_at, last_id, issued_at = datetime.min, '', now
+
+        # مسحان لفهرسي (owner_id, updated_at) و (owner_id, deleted_at) ثم دمج بالترتيب نفسه
+        tasks = Task.query.filter(
+            Task.owner_id == user_id,
+            after_position(Task.updated_at, Task.id, changed_at, last_id)
+        ).order_by(Task.updated_at, Task.id).limit(limit + 1).all()
+        entries = [(task.updated_at, task.id, task) for task in tasks]
+
+        if since:
+            tombstones = TaskTombstone.query.filter(
+                TaskTombstone.owner_id == user_id,
+                after_position(TaskTombstone.deleted_at, TaskTombstone.task_id, changed_at, last_id)
+            ).order_by(TaskTombstone.deleted_at, TaskTombstone.task_id).limit(limit + 1).all()
+            entries.extend((tombstone.deleted_at, tombstone.task_id, None) for tombstone in tombstones)
+
+        entries.sort(key=lambda entry: entry[:2])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        if has_more:
+            # الصفحة التالية تبدأ بعد آخر عنصر مُرسل تماماً، وتحتفظ بوقت بدء جلسة المزامنة
+            next_token = encode_sync_token(entries[-1][0], entries[-1][1], issued_at=issued_at)
+        else:
+            # اكتملت المزامنة: الرمز التالي يتراجع بهامش الأمان (تكرار بعض العناصر آمن للعميل)
+            next_token = encode_sync_token(max(changed_at, now - timedelta(seconds=SYNC_SAFETY_SECONDS)), issued_at=now)
+
+        return with_cache_control(jsonify({
+            'changed': [task.to_dict() for _, _, task in entries if task is not None],
+            'deleted': [task_id for _, task_id, task in entries if task is None],
+            'next_token': next_token,
+            'has_more': has_more
+        }), PRIVATE_CACHE_CONTROL), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
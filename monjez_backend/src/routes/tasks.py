@@ -1,62 +1,387 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, update, delete
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from src.models.user import db, User
-from src.models.task import Task, Project, Label
-from datetime import datetime
+from src.models.task import Task, Project, Label, Team, user_teams, task_labels
+from src.routes.calendar import invalidate_calendar_cache, is_recurring
+from src.routes.sync import record_tombstones
+from src.models.task_occurrence import Occurrence
+from src.utils import occurrence_index
+from src.utils.user_cache import user_timezone
+from src.utils.etags import bump_version, is_not_modified, not_modified, user_etag, with_etag
+from src.utils.recurrence import expand_task, invalidate_expansions, validate_rule
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import base64
+import json
+import uuid
 
 tasks_bp = Blueprint('tasks', __name__)
 
+# حدود حجم الصفحة في قائمة المهام
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# إعدادات البث والتصدير
+NDJSON_MIMETYPE = 'application/x-ndjson'
+EXPORT_BATCH_SIZE = 1000
+
+# الحد الأقصى لعدد العمليات في طلب /tasks/batch
+MAX_BATCH_OPERATIONS = 1000
+
+# عدد الأيام التي يغطيها عرض upcoming
+UPCOMING_DAYS = 7
+
+# عروض تعتمد على اللحظة الحالية لا على التاريخ فقط، فلا تُعطى ETag
+TIME_RELATIVE_VIEWS = ('overdue', 'upcoming')
+
+# مدى توسيع نسخ المهام المتكررة عندما يحدد المرشح بداية دون نهاية
+OCCURRENCE_WINDOW_DAYS = 366
+
+# العمق الافتراضي والأقصى لشجرة المهام الفرعية
+DEFAULT_TREE_DEPTH = 10
+MAX_TREE_DEPTH = 50
+
+# أعمدة لازمة لتوسيع التكرار حتى مع fields=
+RECURRENCE_FIELDS = ('recurrence_rule', 'calendar_type', 'updated_at')
+
+def get_view_range(view, tz_name, now=None):
+    """حساب نطاق [البداية, النهاية) لعرض المهام بتوقيت UTC بناءً على منطقة المستخدم الزمنية"""
+    try:
+        tz = ZoneInfo(tz_name or 'Asia/Riyadh')
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo('Asia/Riyadh')
+    
+    now = now or datetime.now(timezone.utc)
+    local_now = now.astimezone(tz)
+    local_midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if view == 'today':
+        start, end = local_midnight, local_midnight + timedelta(days=1)
+    elif view == 'week':
+        # بداية الأسبوع (الأحد) كما في شبكة التقويم
+        days_since_sunday = (local_midnight.weekday() + 1) % 7
+        start = local_midnight - timedelta(days=days_since_sunday)
+        end = start + timedelta(days=7)
+    elif view == 'upcoming':
+        start, end = local_now, local_now + timedelta(days=UPCOMING_DAYS)
+    else:
+        return None
+    
+    # due_at مخزن كتوقيت UTC بدون منطقة زمنية
+    to_utc = lambda dt: dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return to_utc(start), to_utc(end)
+
+def encode_cursor(task):
+    """ترميز موضع آخر مهمة في الصفحة كمؤشر معتم (due_at, id)"""
+    payload = [task.due_at.isoformat() if task.due_at else None, task.id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor):
+    """فك ترميز المؤشر إلى (due_at, id)"""
+    due_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return (datetime.fromisoformat(due_at) if due_at else None), task_id
+
+def apply_cursor(query, cursor):
+    """تطبيق شرط keyset بعد المؤشر بترتيب (due_at NULLS LAST, id)"""
+    due_at, task_id = decode_cursor(cursor)
+    
+    if due_at is None:
+        # المهام بلا تاريخ استحقاق تأتي في النهاية مرتبة حسب المعرّف
+        return query.filter(Task.due_at.is_(None), Task.id > task_id)
+    
+    return query.filter(db.or_(
+        Task.due_at > due_at,
+        db.and_(Task.due_at == due_at, Task.id > task_id),
+        Task.due_at.is_(None)
+    ))
+
+def parse_fields(fields_param):
+    """تحليل معامل fields= مع إضافة الأعمدة اللازمة للمؤشر دائماً"""
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    invalid = [field for field in fields if field not in Task.PROJECTABLE_FIELDS]
+    if invalid:
+        raise ValueError(f"حقول غير معروفة: {', '.join(invalid)}")
+    
+    for required in ('due_at', 'id'):
+        if required not in fields:
+            fields.insert(0, required)
+    return fields
+
+def parse_include(include_param):
+    """تحليل معامل include= (labels, subtasks, project, team)"""
+    include = [name.strip() for name in (include_param or '').split(',') if name.strip()]
+    invalid = [name for name in include if name not in Task.INCLUDABLE_RELATIONS]
+    if invalid:
+        raise ValueError(f"علاقات غير معروفة: {', '.join(invalid)}")
+    return tuple(dict.fromkeys(include))
+
+def apply_includes(query, include):
+    """تحميل العلاقات المطلوبة مسبقاً بعدد ثابت من الاستعلامات مهما كان عدد المهام"""
+    options = []
+    # المجموعات باستعلام IN منفصل، والعلاقات المفردة بـ JOIN في نفس الاستعلام
+    if 'labels' in include:
+        options.append(selectinload(Task.labels))
+    if 'subtasks' in include:
+        options.append(selectinload(Task.subtasks))
+    if 'project' in include:
+        options.append(joinedload(Task.project))
+    if 'team' in include:
+        options.append(joinedload(Task.team))
+    return query.options(*options) if options else query
+
+def get_date_window(user_id, args):
+    """النطاق الزمني المغلق (بداية، نهاية) المطلوب عبر from/to أو العرض، وأي طرف قد يكون None"""
+    view = args.get('view', 'all')
+    window_start = parser.parse(args['from']) if args.get('from') else None
+    window_end = parser.parse(args['to']) if args.get('to') else None
+    
+    if view in ('today', 'week', 'upcoming'):
+        view_start, view_end = get_view_range(view, user_timezone(user_id))
+        view_end -= timedelta(microseconds=1)
+        window_start = max(window_start, view_start) if window_start else view_start
+        window_end = min(window_end, view_end) if window_end else view_end
+    
+    if window_start is None and window_end is None:
+        return None
+    return window_start, window_end
+
+def serialize_task(task, fields=None, window=None, occurrences=None, include=()):
+    """تمثيل المهمة مع مواعيد نسخها داخل النطاق إن كانت متكررة؛ None إن لم تقع فيه أي نسخة"""
+    data = task.to_dict(fields, include)
+    if window and task.recurrence_rule:
+        window_start, window_end = window
+        if window_end is None:
+            window_end = window_start + timedelta(days=OCCURRENCE_WINDOW_DAYS)
+        if occurrences is None:
+            occurrences = expand_task(task, window_start or datetime.min, window_end)
+        if not occurrences:
+            return None
+        data['occurrences'] = [occurrence.isoformat() for occurrence in occurrences]
+    return data
+
+def project_fields(query, fields, window=None):
+    """تحميل الأعمدة المطلوبة فقط (مع أعمدة التكرار عند وجود نطاق زمني)"""
+    if not fields:
+        return query
+    columns = set(fields) | (set(RECURRENCE_FIELDS) if window else set())
+    return query.options(load_only(*[getattr(Task, field) for field in columns]))
+
+def apply_task_filters(query, user_id, args):
+    """تطبيق فلاتر قائمة المهام المشتركة (الحالة، الأولوية، المشروع، التواريخ، العرض)"""
+    view = args.get('view', 'all')
+    status = args.get('status')
+    priority = args.get('priority')
+    project_id = args.get('project_id')
+    
+    # تطبيق الفلاتر
+    if status:
+        query = query.filter_by(status=status)
+    
+    if priority:
+        query = query.filter_by(priority=priority)
+    
+    if project_id:
+        query = query.filter_by(project_id=project_id)
+    
+    # فلاتر التاريخ والعرض كنطاق على due_at يستفيد من فهرس (owner_id, due_at)؛
+    # المهام المتكررة تدخل إذا بدأت سلسلتها قبل نهاية النطاق وتُصفّى حسب نسخها لاحقاً
+    window = get_date_window(user_id, args)
+    if window:
+        window_start, window_end = window
+        in_window = [Task.due_at >= window_start] if window_start else []
+        if window_end:
+            in_window.append(Task.due_at <= window_end)
+        if window_end and occurrence_index.covers(window_end):
+            # المهام المتكررة التي لها نسخة في النطاق عبر مسح فهرس (owner_id, occurs_at)
+            occurring = db.session.query(Occurrence.task_id).filter(
+                Occurrence.owner_id == user_id, Occurrence.occurs_at <= window_end)
+            if window_start:
+                occurring = occurring.filter(Occurrence.occurs_at >= window_start)
+            recurring = db.and_(is_recurring(), Task.id.in_(occurring))
+        else:
+            series_started = [Task.due_at <= window_end] if window_end else [Task.due_at.isnot(None)]
+            recurring = db.and_(is_recurring(), *series_started)
+        query = query.filter(db.or_(db.and_(*in_window), recurring))
+    
+    if view == 'overdue':
+        query = query.filter(Task.due_at < datetime.utcnow(), Task.status != 'done')
+    
+    return query
+
+def wants_ndjson():
+    """هل طلب العميل بث النتائج بصيغة NDJSON؟"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_tasks(query, fields=None, output_format='ndjson', window=None, include=()):
+    """بث المهام من مؤشر في جانب الخادم دون تحميل النتيجة كاملة في الذاكرة"""
+    tasks = query.order_by(Task.due_at.asc().nulls_last(), Task.id.asc()).yield_per(EXPORT_BATCH_SIZE)
+    rows = (data for data in (serialize_task(task, fields, window, include=include) for task in tasks)
+            if data is not None)
+    
+    def generate():
+        if output_format == 'json':
+            yield '{"tasks": ['
+            separator = ''
+            for data in rows:
+                yield separator + json.dumps(data, ensure_ascii=False)
+                separator = ','
+            yield ']}'
+        else:
+            for data in rows:
+                yield json.dumps(data, ensure_ascii=False) + '\n'
+    
+    mimetype = 'application/json' if output_format == 'json' else NDJSON_MIMETYPE
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def build_task_values(user_id, data):
+    """قيم أعمدة مهمة جديدة من جسم الطلب"""
+    validate_rule(data.get('recurrence_rule'))
+    return {
+        'title': data['title'],
+        'description': data.get('description'),
+        'status': data.get('status', 'todo'),
+        'priority': data.get('priority', 'med'),
+        'owner_id': user_id,
+        'created_by': user_id,
+        'project_id': data.get('project_id'),
+        'all_day': data.get('all_day', False),
+        'calendar_type': data.get('calendar_type', 'gregorian'),
+        'recurrence_rule': data.get('recurrence_rule'),
+        'parent_task_id': data.get('parent_task_id'),
+        # تحويل التواريخ
+        'start_at': parser.parse(data['start_at']) if data.get('start_at') else None,
+        'due_at': parser.parse(data['due_at']) if data.get('due_at') else None
+    }
+
+def parse_task_updates(data):
+    """الحقول المسموح بتحديثها من جسم طلب PATCH"""
+    updates = {}
+    for field in ('title', 'description', 'status', 'priority', 'project_id',
+                  'all_day', 'calendar_type', 'recurrence_rule'):
+        if field in data:
+            updates[field] = data[field]
+    
+    if 'recurrence_rule' in updates:
+        validate_rule(updates['recurrence_rule'])
+    
+    for field in ('start_at', 'due_at'):
+        if field in data:
+            updates[field] = parser.parse(data[field]) if data[field] else None
+    
+    return updates
+
 @tasks_bp.route('/tasks', methods=['GET'])
 @jwt_required()
 def get_tasks():
     try:
         user_id = get_jwt_identity()
         
-        # الحصول على المعاملات من الاستعلام
-        view = request.args.get('view', 'all')
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        status = request.args.get('status')
-        priority = request.args.get('priority')
-        project_id = request.args.get('project_id')
-        
-        # بناء الاستعلام الأساسي
-        query = Task.query.filter_by(owner_id=user_id)
-        
-        # تطبيق الفلاتر
-        if status:
-            query = query.filter_by(status=status)
-        
-        if priority:
-            query = query.filter_by(priority=priority)
-        
-        if project_id:
-            query = query.filter_by(project_id=project_id)
-        
-        if from_date:
-            from_dt = parser.parse(from_date)
-            query = query.filter(Task.due_at >= from_dt)
+        # النافذة تُحسب بتوقيت المستخدم (today/week تتغير عند منتصف ليله المحلي)
+        window = get_date_window(user_id, request.args)
         
-        if to_date:
-            to_dt = parser.parse(to_date)
-            query = query.filter(Task.due_at <= to_dt)
+        # 304 قبل أي استعلام إن لم تتغير مهام المستخدم ولا النافذة المحسوبة
+        # (overdue و upcoming نسبيان إلى "الآن" فلا يُخزنان)
+        etag = None
+        if not wants_ndjson() and request.args.get('view') not in TIME_RELATIVE_VIEWS:
+            etag = user_etag(user_id, window)
+            if is_not_modified(etag):
+                return not_modified(etag)
         
-        # تطبيق فلاتر العرض
-        if view == 'today':
-            today = datetime.now().date()
-            query = query.filter(db.func.date(Task.due_at) == today)
-        elif view == 'week':
-            # المهام للأسبوع الحالي
-            pass  # يمكن تطبيق منطق الأسبوع هنا
-        elif view == 'overdue':
-            query = query.filter(Task.due_at < datetime.now(), Task.status != 'done')
+        # الحصول على المعاملات من الاستعلام
+        cursor = request.args.get('cursor')
+        fields_param = request.args.get('fields')
+        
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'قيمة limit غير صحيحة'}), 400
+        
+        fields = None
+        try:
+            if fields_param:
+                fields = parse_fields(fields_param)
+            include = parse_include(request.args.get('include'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        tasks = query.order_by(Task.due_at.asc()).all()
+        # بناء الاستعلام الأساسي
+        query = apply_task_filters(Task.query.filter_by(owner_id=user_id), user_id, request.args)
+        query = apply_includes(project_fields(query, fields, window), include)
+        
+        # Accept: application/x-ndjson يبث كل النتائج بدلاً من صفحة واحدة
+        if wants_ndjson():
+            return stream_tasks(query, fields, window=window, include=include)
+        
+        if cursor:
+            try:
+                query = apply_cursor(query, cursor)
+            except Exception:
+                return jsonify({'error': 'المؤشر غير صالح'}), 400
+        
+        # جلب عنصر إضافي لمعرفة وجود صفحة تالية دون استعلام COUNT
+        tasks = query.order_by(Task.due_at.asc().nulls_last(), Task.id.asc()).limit(limit + 1).all()
+        has_more = len(tasks) > limit
+        tasks = tasks[:limit]
+        
+        # نسخ مهام الصفحة المتكررة من الفهرس المادي باستعلام واحد إن كان يغطي النطاق
+        occurrences = {}
+        if window and window[1] and occurrence_index.covers(window[1]):
+            occurrences = occurrence_index.occurrences_by_task(
+                [task.id for task in tasks if task.recurrence_rule], window[0], window[1])
+        
+        # المهام المتكررة بلا نسخ داخل النطاق تُستبعد من الصفحة (المؤشر يبقى على آخر صف)
+        serialized = [serialize_task(task, fields, window, occurrences.get(task.id) if occurrences else None,
+                                     include) for task in tasks]
+        
+        response = jsonify({
+            'tasks': [data for data in serialized if data is not None],
+            'next_cursor': encode_cursor(tasks[-1]) if has_more else None,
+            'has_more': has_more
+        })
+        return (with_etag(response, etag) if etag else response), 200
         
-        return jsonify({
-            'tasks': [task.to_dict() for task in tasks]
-        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tasks_bp.route('/tasks/export', methods=['GET'])
+@jwt_required()
+def export_tasks():
+    """تصدير كل المهام المطابقة كبث NDJSON (أو JSON مجزأ عبر format=json)"""
+    try:
+        user_id = get_jwt_identity()
+        team_id = request.args.get('team_id')
+        output_format = request.args.get('format', 'ndjson')
+        
+        if output_format not in ('ndjson', 'json'):
+            return jsonify({'error': 'صيغة التصدير غير مدعومة'}), 400
+        
+        fields = None
+        try:
+            if request.args.get('fields'):
+                fields = parse_fields(request.args['fields'])
+            include = parse_include(request.args.get('include'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if team_id:
+            # تصدير مهام الفريق متاح لأعضائه فقط
+            team = Team.query.get(team_id)
+            is_member = team and (team.owner_id == user_id or db.session.query(user_teams).filter_by(
+                team_id=team_id, user_id=user_id).first() is not None)
+            if not is_member:
+                return jsonify({'error': 'الفريق غير موجود'}), 404
+            query = Task.query.filter_by(team_id=team_id)
+        else:
+            query = Task.query.filter_by(owner_id=user_id)
+        
+        query = apply_task_filters(query, user_id, request.args)
+        window = get_date_window(user_id, request.args)
+        query = apply_includes(project_fields(query, fields, window), include)
+        
+        return stream_tasks(query, fields, output_format, window, include)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -71,29 +396,18 @@ def create_task():
         if not data.get('title'):
             return jsonify({'error': 'عنوان المهمة مطلوب'}), 400
         
-        task = Task(
-            title=data['title'],
-            description=data.get('description'),
-            status=data.get('status', 'todo'),
-            priority=data.get('priority', 'med'),
-            owner_id=user_id,
-            created_by=user_id,
-            project_id=data.get('project_id'),
-            all_day=data.get('all_day', False),
-            calendar_type=data.get('calendar_type', 'gregorian'),
-            recurrence_rule=data.get('recurrence_rule'),
-            parent_task_id=data.get('parent_task_id')
-        )
-        
-        # تحويل التواريخ
-        if data.get('start_at'):
-            task.start_at = parser.parse(data['start_at'])
-        
-        if data.get('due_at'):
-            task.due_at = parser.parse(data['due_at'])
+        try:
+            task = Task(**build_task_values(user_id, data))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         db.session.add(task)
+        if task.recurrence_rule:
+            db.session.flush()
+            occurrence_index.rebuild_occurrences(task.id)
+        bump_version(user_id)
         db.session.commit()
+        invalidate_calendar_cache(user_id, task.due_at, recurring=bool(task.recurrence_rule))
         
         return jsonify({
             'message': 'تم إنشاء المهمة بنجاح',
@@ -109,12 +423,96 @@ def create_task():
 def get_task(task_id):
     try:
         user_id = get_jwt_identity()
-        task = Task.query.filter_by(id=task_id, owner_id=user_id).first()
+        
+        try:
+            include = parse_include(request.args.get('include'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        etag = user_etag(user_id)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        
+        task = apply_includes(Task.query.filter_by(id=task_id, owner_id=user_id), include).first()
         
         if not task:
             return jsonify({'error': 'المهمة غير موجودة'}), 404
         
-        return jsonify({'task': task.to_dict()}), 200
+        return with_etag(jsonify({'task': task.to_dict(include=include)}), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tasks_bp.route('/tasks/<task_id>/tree', methods=['GET'])
+@jwt_required()
+def get_task_tree(task_id):
+    """شجرة المهام الفرعية كاملة باستعلام CTE تكراري واحد مع إحصاءات الإنجاز لكل عقدة
+
+    total_count و done_count تعد أحفاد العقدة فقط (دون العقدة نفسها) ضمن حد العمق؛
+    truncated يشير إلى عقد لها أبناء بعد الحد فلا تشملهم إحصاءاتها.
+    """
+    try:
+        user_id = get_jwt_identity()
+        
+        try:
+            max_depth = min(max(int(request.args.get('depth', DEFAULT_TREE_DEPTH)), 0), MAX_TREE_DEPTH)
+        except ValueError:
+            return jsonify({'error': 'قيمة depth غير صحيحة'}), 400
+        
+        # CTE تكراري واحد يجلب العقد حتى max_depth ومستوى إضافياً لمعرفة إن قُطعت الشجرة؛
+        # المسار (معرفات الأسلاف مفصولة بـ /) يمنع الدورات في parent_task_id
+        anchor = db.select(
+            Task.id,
+            db.literal(0).label('depth'),
+            db.cast(Task.id, db.Text).label('path')
+        ).where(Task.id == task_id, Task.owner_id == user_id)
+        tree = anchor.cte('task_tree', recursive=True)
+        child = db.aliased(Task)
+        tree = tree.union_all(
+            db.select(
+                child.id,
+                tree.c.depth + 1,
+                db.cast(tree.c.path + '/' + child.id, db.Text)
+            ).where(child.parent_task_id == tree.c.id, child.owner_id == user_id,
+                    tree.c.depth <= max_depth, db.not_(tree.c.path.contains(child.id)))
+        )
+        rows = db.session.query(Task, tree.c.depth).join(tree, tree.c.id == Task.id).order_by(tree.c.depth).all()
+        
+        if not rows:
+            return jsonify({'error': 'المهمة غير موجودة'}), 404
+        
+        # بناء الشجرة من الصفوف المسطحة (كل أب يسبق أبناءه في ترتيب العمق)
+        nodes = {}
+        truncated = False
+        for task, depth in rows:
+            if depth > max_depth:
+                truncated = True
+                nodes[task.parent_task_id][1]['truncated'] = True
+                continue
+            data = task.to_dict()
+            data.update(depth=depth, truncated=False, children=[])
+            nodes[task.id] = (task, data)
+        
+        # الإحصاءات في مرور واحد من الأعمق إلى الجذر: كل عقدة تضيف نفسها وأحفادها إلى أبيها
+        rollups = {node_id: [0, 0] for node_id in nodes}
+        for task, data in sorted(nodes.values(), key=lambda item: item[1]['depth'], reverse=True):
+            total, done = rollups[task.id]
+            data.update(total_count=total, done_count=done, progress=round(done / total, 4) if total else 0.0)
+            if task.id != task_id:
+                parent = rollups[task.parent_task_id]
+                parent[0] += total + 1
+                parent[1] += done + (task.status == 'done')
+        
+        for task, data in sorted(nodes.values(), key=lambda item: item[0].created_at or datetime.min):
+            if task.id != task_id:
+                nodes[task.parent_task_id][1]['children'].append(data)
+        
+        return jsonify({
+            'tree': nodes[task_id][1],
+            'node_count': len(nodes),
+            'depth_limit': max_depth,
+            'truncated': truncated
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -130,34 +528,28 @@ def update_task(task_id):
             return jsonify({'error': 'المهمة غير موجودة'}), 404
         
         data = request.get_json()
+        previous_due_at = task.due_at
+        previous_rule = task.recurrence_rule
+        
+        try:
+            updates = parse_task_updates(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # تحديث الحقول المسموحة
-        if 'title' in data:
-            task.title = data['title']
-        if 'description' in data:
-            task.description = data['description']
-        if 'status' in data:
-            task.status = data['status']
-        if 'priority' in data:
-            task.priority = data['priority']
-        if 'project_id' in data:
-            task.project_id = data['project_id']
-        if 'all_day' in data:
-            task.all_day = data['all_day']
-        if 'calendar_type' in data:
-            task.calendar_type = data['calendar_type']
-        if 'recurrence_rule' in data:
-            task.recurrence_rule = data['recurrence_rule']
-        
-        if 'start_at' in data:
-            task.start_at = parser.parse(data['start_at']) if data['start_at'] else None
-        
-        if 'due_at' in data:
-            task.due_at = parser.parse(data['due_at']) if data['due_at'] else None
+        for field, value in updates.items():
+            setattr(task, field, value)
         
         task.updated_at = datetime.utcnow()
         
+        if previous_rule or task.recurrence_rule:
+            db.session.flush()
+            occurrence_index.rebuild_occurrences(task.id)
+        bump_version(user_id)
         db.session.commit()
+        invalidate_expansions(task.id)
+        invalidate_calendar_cache(user_id, previous_due_at, task.due_at,
+                                  recurring=bool(previous_rule or task.recurrence_rule))
         
         return jsonify({
             'message': 'تم تحديث المهمة بنجاح',
@@ -178,8 +570,14 @@ def delete_task(task_id):
         if not task:
             return jsonify({'error': 'المهمة غير موجودة'}), 404
         
+        due_at, recurring = task.due_at, bool(task.recurrence_rule)
+        occurrence_index.delete_occurrences(task_id)
         db.session.delete(task)
+        record_tombstones(user_id, [task_id])
+        bump_version(user_id)
         db.session.commit()
+        invalidate_expansions(task_id)
+        invalidate_calendar_cache(user_id, due_at, recurring=recurring)
         
         return jsonify({'message': 'تم حذف المهمة بنجاح'}), 200
         
@@ -201,7 +599,9 @@ def complete_task(task_id):
         task.completed_at = datetime.utcnow()
         task.updated_at = datetime.utcnow()
         
+        bump_version(user_id)
         db.session.commit()
+        invalidate_calendar_cache(user_id, task.due_at, recurring=bool(task.recurrence_rule))
         
         return jsonify({
             'message': 'تم إكمال المهمة بنجاح',
@@ -212,3 +612,130 @@ def complete_task(task_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@tasks_bp.route('/tasks/batch', methods=['POST'])
+@jwt_required()
+def batch_tasks():
+    """تنفيذ مجموعة عمليات (create, update, complete, delete) في معاملة واحدة"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        operations = data.get('operations') if isinstance(data, dict) else None
+        
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'قائمة العمليات مطلوبة'}), 400
+        
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({'error': f'الحد الأقصى للعمليات في الطلب الواحد هو {MAX_BATCH_OPERATIONS}'}), 400
+        
+        # جلب معرفات المهام المملوكة للمستخدم باستعلام واحد
+        referenced_ids = {op.get('id') for op in operations if isinstance(op, dict) and isinstance(op.get('id'), str)}
+        owned_ids = {}
+        if referenced_ids:
+            owned_ids = {row.id: row for row in db.session.query(Task.id, Task.due_at, Task.recurrence_rule).filter(
+                Task.id.in_(referenced_ids), Task.owner_id == user_id)}
+        
+        now = datetime.utcnow()
+        results = []
+        inserts = []
+        updates = {}
+        deleted_ids = []
+        
+        for index, op in enumerate(operations):
+            op = op if isinstance(op, dict) else {}
+            action = op.get('op')
+            task_id = op.get('id')
+            result = {'index': index, 'op': action}
+            
+            try:
+                if task_id is not None and not isinstance(task_id, str):
+                    raise TypeError('معرف المهمة يجب أن يكون نصاً')
+                if not isinstance(op.get('data') or {}, dict):
+                    raise TypeError('بيانات العملية يجب أن تكون كائناً')
+                
+                if action == 'create':
+                    values = op.get('data') or {}
+                    if not values.get('title'):
+                        raise ValueError('عنوان المهمة مطلوب')
+                    row = build_task_values(user_id, values)
+                    task_id = str(uuid.uuid4())
+                    row.update(id=task_id, created_at=now, updated_at=now, completed_at=None, team_id=None)
+                    inserts.append(row)
+                elif action in ('update', 'complete', 'delete'):
+                    if task_id not in owned_ids or task_id in deleted_ids:
+                        raise LookupError('المهمة غير موجودة')
+                    if action == 'update':
+                        row = parse_task_updates(op.get('data') or {})
+                    elif action == 'complete':
+                        row = {'status': 'done', 'completed_at': now}
+                    else:
+                        deleted_ids.append(task_id)
+                        updates.pop(task_id, None)
+                        row = None
+                    if row is not None:
+                        # دمج العمليات المتتالية على نفس المهمة بالترتيب (الأحدث يغلب)
+                        updates.setdefault(task_id, {'id': task_id}).update(row, updated_at=now)
+                else:
+                    raise ValueError('نوع العملية غير معروف')
+                
+                result.update(id=task_id, status='ok')
+            except (ValueError, LookupError, OverflowError, TypeError) as e:
+                result.update(id=task_id, status='error', error=str(e))
+            
+            results.append(result)
+        
+        # إدراج وتحديث جماعي (executemany) ثم حذف بشرط IN، كلها في معاملة واحدة
+        if inserts:
+            db.session.execute(insert(Task), inserts)
+        
+        if updates:
+            # تجميع التحديثات حسب مجموعة الأعمدة لأن executemany يتطلب مفاتيح موحدة
+            groups = {}
+            for row in updates.values():
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+            for rows in groups.values():
+                db.session.execute(update(Task), rows)
+        
+        if deleted_ids:
+            # محاكاة سلوك حذف ORM: فك ارتباط التسميات والمهام الفرعية
+            db.session.execute(delete(task_labels).where(task_labels.c.task_id.in_(deleted_ids)))
+            occurrence_index.delete_occurrences(*deleted_ids)
+            db.session.execute(update(Task).where(Task.parent_task_id.in_(deleted_ids))
+                               .values(parent_task_id=None, updated_at=now))
+            db.session.execute(delete(Task).where(Task.id.in_(deleted_ids)))
+            record_tombstones(user_id, deleted_ids, now)
+        
+        # إعادة بناء فهرس النسخ للمهام المتكررة المنشأة أو المعدلة
+        occurrence_index.rebuild_occurrences(
+            *[row['id'] for row in inserts if row.get('recurrence_rule')],
+            *[task_id for task_id, row in updates.items()
+              if row.get('recurrence_rule') or owned_ids[task_id].recurrence_rule]
+        )
+        
+        # لا تتغير ETags العملاء إن فشلت كل العمليات
+        succeeded = sum(1 for result in results if result['status'] == 'ok')
+        if succeeded:
+            bump_version(user_id)
+        db.session.commit()
+        
+        # إبطال شبكات التقويم المتأثرة بتواريخ الاستحقاق القديمة والجديدة
+        touched_ids = set(updates) | set(deleted_ids)
+        invalidate_expansions(*touched_ids)
+        invalidate_calendar_cache(
+            user_id,
+            *[row['due_at'] for row in inserts],
+            *[owned_ids[task_id].due_at for task_id in touched_ids],
+            *[row['due_at'] for row in updates.values() if 'due_at' in row],
+            recurring=any(row.get('recurrence_rule') for row in (*inserts, *updates.values()))
+            or any(owned_ids[task_id].recurrence_rule for task_id in touched_ids)
+        )
+        
+        return jsonify({
+            'message': 'تم تنفيذ العمليات',
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
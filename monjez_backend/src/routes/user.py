@@ -12,7 +12,7 @@ def get_users():
 def create_user():
     
     data = request.json
-    user = User(username=data['username'], email=data['email'])
+    user = User(username=data['username'], email=User.normalize_email(data['email']))
     db.session.add(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
@@ -27,7 +27,7 @@ def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.json
     user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
+    user.email = User.normalize_email(data.get('email', user.email))
     db.session.commit()
     return jsonify(user.to_dict())
 
@@ -0,0 +1,102 @@
+"""تخزين مؤقت ودمج لطلبات الذكاء الاصطناعي المتطابقة وتشغيلها كمهام خلفية"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from src.utils.cache import LRUCache
+
+# مهلة استدعاء OpenAI بالثواني؛ الطلبات المدموجة تنتظر المدة نفسها ثم تفشل بدلاً من حجز خيطها
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', 30))
+
+
+def context_hash(value):
+    """بصمة ثابتة لسياق قابل للتحويل إلى JSON (ترتيب المفاتيح لا يؤثر)"""
+    normalized = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class CoalescingCache:
+    """ذاكرة مؤقتة تدمج الطلبات المتزامنة لنفس المفتاح في استدعاء واحد للخدمة الخارجية"""
+    
+    def __init__(self, cache):
+        self.cache = cache
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, key, compute, cacheable=lambda value: True, timeout=None):
+        """القيمة المخزنة أو نتيجة compute؛ الطلبات المنتظرة لاستدعاء جارٍ ترفع TimeoutError بعد timeout"""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        
+        # طلب مطابق قيد التنفيذ: ننتظر نتيجته بدلاً من استدعاء جديد
+        if not owner:
+            return future.result(timeout=timeout)
+        
+        try:
+            value = compute()
+            if cacheable(value):
+                self.cache.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+    
+    def stats(self):
+        return {**self.cache.stats(), 'coalesced': self.coalesced, 'inflight': len(self._inflight)}
+
+
+class JobQueue:
+    """تشغيل الاستدعاءات الطويلة في مجمّع خيوط محدود مع حفظ نتائجها للاستعلام لاحقاً"""
+    
+    def __init__(self, max_workers=4, ttl=3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-jobs')
+        self._jobs = LRUCache(maxsize=10000, ttl=ttl)
+    
+    def submit(self, owner_id, fn, *args):
+        job_id = str(uuid.uuid4())
+        job = {
+            'owner_id': owner_id,
+            'future': self._executor.submit(fn, *args),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        self._jobs.set(job_id, job)
+        return job_id
+    
+    def get(self, job_id, owner_id):
+        """حالة المهمة: (الحالة، النتيجة، الخطأ)، أو None إن لم توجد أو لم تكن للمستخدم"""
+        job = self._jobs.get(job_id)
+        if job is None or job['owner_id'] != owner_id:
+            return None
+        
+        future = job['future']
+        if not future.done():
+            return {'status': 'running' if future.running() else 'pending', 'created_at': job['created_at']}
+        
+        error = future.exception()
+        if error is not None:
+            return {'status': 'error', 'error': str(error), 'created_at': job['created_at']}
+        return {'status': 'done', 'result': future.result(), 'created_at': job['created_at']}
+
+
+# مشتركة على مستوى العملية
+suggestion_cache = CoalescingCache(LRUCache(maxsize=1024, ttl=int(os.getenv('AI_CACHE_TTL', 600))))
+ai_jobs = JobQueue(max_workers=int(os.getenv('AI_WORKERS', 4)))
@@ -0,0 +1,95 @@
+# ETag وطلبات GET الشرطية: إصدار تغييرات لكل مستخدم، و304 قبل تنفيذ الاستعلام
+from datetime import datetime, time, timedelta, timezone
+import hashlib
+from zoneinfo import ZoneInfo
+
+from flask import current_app, request
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.change_version import ChangeVersion
+
+# مدة التخزين للاستجابات المحسوبة المستقلة عن المستخدم (الصلاة والتحويل)
+# (الاستجابات المعتمدة على تاريخ اليوم لا تتجاوز منتصف الليل المحلي، انظر until_local_midnight)
+COMPUTED_MAX_AGE = 3600
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=86400'
+
+# استجابات المستخدم تُعاد مصادقتها دائماً ولا تُخزن في الوسطاء المشتركين
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def bump_version(user_id):
+    """زيادة إصدار تغييرات المستخدم ضمن معاملة الكتابة الحالية (upsert ذري)"""
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    statement = insert(ChangeVersion).values(user_id=user_id, version=1)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[ChangeVersion.user_id],
+        set_={'version': ChangeVersion.version + 1}
+    ))
+
+
+def current_version(user_id):
+    """الإصدار الحالي (استعلام مفتاح أساسي واحد)"""
+    version = db.session.query(ChangeVersion.version).filter_by(user_id=user_id).scalar()
+    return version or 0
+
+
+def until_local_midnight(tz_name, max_age=COMPUTED_MAX_AGE, now=None):
+    """Cache-Control عام لاستجابة تعتمد على "اليوم": لا يتجاوز منتصف الليل بتوقيت الموقع"""
+    now = now or datetime.now(timezone.utc)
+    tz = ZoneInfo(tz_name)
+    local_today = now.astimezone(tz).date()
+    midnight = datetime.combine(local_today + timedelta(days=1), time(), tzinfo=tz)
+    seconds = int((midnight - now).total_seconds())
+    return f'public, max-age={max(0, min(max_age, seconds))}'
+
+
+def make_etag(*parts):
+    """بصمة ثابتة من أجزاء ETag"""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def request_signature():
+    """المسار ومعاملات الاستعلام مرتبة (لا يتغير المفتاح بترتيب المعاملات)"""
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def user_etag(user_id, *parts, version=None):
+    """ETag لاستجابة مستخدم: الإصدار والطلب وأي أجزاء زمنية يعتمد عليها المحتوى (النافذة، تاريخ اليوم)
+
+    يمكن تمرير version إن قرأه المستدعي مسبقاً لتجنب استعلام ثانٍ.
+    """
+    if version is None:
+        version = current_version(user_id)
+    return make_etag(user_id, version, request_signature(), *parts)
+
+
+def is_not_modified(etag, weak=False):
+    """هل يطابق If-None-Match الـ ETag الحالي؟"""
+    if weak:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag, cache_control=PRIVATE_CACHE_CONTROL, weak=False):
+    """استجابة 304 فارغة مع نفس الترويسات"""
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag, cache_control, weak)
+
+
+def with_cache_control(response, cache_control):
+    """إضافة Cache-Control فقط (للاستجابات المحسوبة دون ETag)"""
+    target = response[0] if isinstance(response, tuple) else response
+    target.headers['Cache-Control'] = cache_control
+    return response
+
+
+def with_etag(response, etag, cache_control=PRIVATE_CACHE_CONTROL, weak=False):
+    """إضافة ETag و Cache-Control لاستجابة (أو لزوج (استجابة، رمز))"""
+    target = response[0] if isinstance(response, tuple) else response
+    target.set_etag(etag, weak=weak)
+    target.headers['Cache-Control'] = cache_control
+    if cache_control.startswith('private'):
+        target.vary.add('Authorization')
+    return response
@@ -0,0 +1,97 @@
+"""جدول تحويل مسبق الحساب بين التقويمين الميلادي والهجري (أم القرى)"""
+from array import array
+from datetime import date
+from hijri_converter import ummalqura
+
+# MONTH_STARTS مخزنة كأيام جوليانية مختصرة (JD - 2400000)؛ نحولها إلى ordinal الخاص بـ Python
+_RJD_TO_ORDINAL = date(1858, 11, 16).toordinal()
+
+# بدايات الأشهر الهجرية كأرقام ordinal (عنصر إضافي في النهاية لحساب طول آخر شهر)
+_MONTH_STARTS = array('l', (rjd + _RJD_TO_ORDINAL for rjd in ummalqura.MONTH_STARTS))
+
+FIRST_ORDINAL = _MONTH_STARTS[0]
+LAST_ORDINAL = _MONTH_STARTS[-1] - 1
+
+GREGORIAN_RANGE = (date.fromordinal(FIRST_ORDINAL), date.fromordinal(LAST_ORDINAL))
+HIJRI_RANGE = ummalqura.HIJRI_RANGE
+
+# فهرس الشهر الهجري لكل يوم في النطاق المدعوم (يُبنى عند أول استخدام)
+_month_index_by_day = None
+
+
+def _build_day_table():
+    table = array('H', bytes(2 * (LAST_ORDINAL - FIRST_ORDINAL + 1)))
+    for index in range(len(_MONTH_STARTS) - 1):
+        start = _MONTH_STARTS[index] - FIRST_ORDINAL
+        end = _MONTH_STARTS[index + 1] - FIRST_ORDINAL
+        table[start:end] = array('H', [index]) * (end - start)
+    return table
+
+
+def _day_table():
+    global _month_index_by_day
+    if _month_index_by_day is None:
+        _month_index_by_day = _build_day_table()
+    return _month_index_by_day
+
+
+def gregorian_to_hijri(gregorian):
+    """تحويل تاريخ ميلادي إلى (سنة، شهر، يوم) هجري، أو None خارج النطاق المدعوم"""
+    ordinal = gregorian.toordinal()
+    if not FIRST_ORDINAL <= ordinal <= LAST_ORDINAL:
+        return None
+    
+    index = _day_table()[ordinal - FIRST_ORDINAL]
+    month_number = index + ummalqura.HIJRI_OFFSET
+    return month_number // 12 + 1, month_number % 12 + 1, ordinal - _MONTH_STARTS[index] + 1
+
+
+def hijri_to_gregorian(year, month, day):
+    """تحويل تاريخ هجري إلى date ميلادي، مع ValueError للتواريخ غير الصالحة"""
+    index = (year - 1) * 12 + month - 1 - ummalqura.HIJRI_OFFSET
+    if not 1 <= month <= 12 or not 0 <= index < len(_MONTH_STARTS) - 1:
+        raise ValueError('التاريخ الهجري خارج النطاق المدعوم')
+    
+    if not 1 <= day <= hijri_month_length(year, month):
+        raise ValueError('اليوم غير صالح لهذا الشهر الهجري')
+    
+    return date.fromordinal(_MONTH_STARTS[index] + day - 1)
+
+
+def hijri_month_length(year, month):
+    """عدد أيام الشهر الهجري (29 أو 30)"""
+    index = (year - 1) * 12 + month - 1 - ummalqura.HIJRI_OFFSET
+    return _MONTH_STARTS[index + 1] - _MONTH_STARTS[index]
+
+
+def iter_days(first, last):
+    """توليد (date ميلادي، (سنة، شهر، يوم) هجري) لكل يوم في نطاق مغلق بالتقدم عبر الأشهر دون بحث لكل يوم"""
+    ordinal = first.toordinal()
+    last_ordinal = last.toordinal()
+    if ordinal < FIRST_ORDINAL or last_ordinal > LAST_ORDINAL:
+        raise ValueError('التاريخ خارج النطاق المدعوم')
+    
+    index = _day_table()[ordinal - FIRST_ORDINAL] if ordinal <= last_ordinal else 0
+    while ordinal <= last_ordinal:
+        if ordinal == _MONTH_STARTS[index + 1]:
+            index += 1
+        month_number = index + ummalqura.HIJRI_OFFSET
+        yield date.fromordinal(ordinal), (month_number // 12 + 1, month_number % 12 + 1, ordinal - _MONTH_STARTS[index] + 1)
+        ordinal += 1
+
+
+def format_hijri(gregorian):
+    """التاريخ الهجري بصيغة YYYY-MM-DD، أو None خارج النطاق المدعوم"""
+    hijri = gregorian_to_hijri(gregorian)
+    if hijri is None:
+        return None
+    return f"{hijri[0]}-{hijri[1]:02d}-{hijri[2]:02d}"
+
+
+def parse_date(date_str):
+    """تحليل نص بصيغة YYYY-MM-DD إلى (سنة، شهر، يوم)"""
+    try:
+        year, month, day = (int(part) for part in date_str.split('-'))
+    except (ValueError, AttributeError):
+        raise ValueError('تنسيق التاريخ غير صحيح. استخدم YYYY-MM-DD')
+    return year, month, day
@@ -0,0 +1,193 @@
+# فهرس مادي لنسخ المهام المتكررة (جدول task_occurrences) مع أفق متدحرج
+from datetime import datetime, timedelta
+from itertools import islice
+import os
+import threading
+import time
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.task import Task
+from src.models.task_occurrence import Occurrence, OccurrenceHorizon
+from src.utils.recurrence import TaskOccurrence, iter_occurrences
+
+# الفهرس اختياري؛ بدونه تُوسَّع القواعد عند الطلب (مع ذاكرة مؤقتة)
+ENABLED = os.getenv('OCCURRENCE_INDEX_ENABLED', '').lower() in ('1', 'true')
+
+# أفق التخزين (18 شهراً تقريباً) وفترة تمديده في الخلفية
+HORIZON_DAYS = int(os.getenv('OCCURRENCE_HORIZON_DAYS', 548))
+REFRESH_SECONDS = int(os.getenv('OCCURRENCE_REFRESH_SECONDS', 86400))
+
+# حد أعلى لعدد النسخ المخزنة لمهمة واحدة في كل عملية بناء
+MAX_MATERIALIZED_OCCURRENCES = 20000
+
+# عدد المهام في كل معاملة أثناء التمديد (فشل دفعة لا يُلغي ما قبلها)
+EXTEND_BATCH_SIZE = 500
+
+
+def horizon(now=None):
+    """نهاية الأفق المطلوب تخزينه الآن"""
+    return (now or datetime.utcnow()) + timedelta(days=HORIZON_DAYS)
+
+
+def materialized_horizon():
+    """نهاية الأفق المخزن فعلاً لكل المهام، أو None قبل أول تمديد مكتمل"""
+    row = db.session.get(OccurrenceHorizon, 1)
+    return row.materialized_until if row else None
+
+
+def covers(range_end):
+    """هل يغطي الفهرس النطاق؟ (حسب الأفق المخزن فعلاً لا حسب الساعة)"""
+    if not ENABLED:
+        return False
+    until = materialized_horizon()
+    return until is not None and range_end <= until
+
+
+def _occurrence_rows(task, after, until, inclusive=True):
+    """صفوف نسخ المهمة حتى until، ونهاية ما غُطي فعلاً (أقرب إن بلغت الحد الأقصى)"""
+    occurrences = list(islice(iter_occurrences(task.recurrence_rule, task.due_at, after, until, task.calendar_type),
+                              MAX_MATERIALIZED_OCCURRENCES))
+    covered = occurrences[-1] if len(occurrences) == MAX_MATERIALIZED_OCCURRENCES else until
+    rows = [{'task_id': task.id, 'owner_id': task.owner_id, 'occurs_at': occurs_at}
+            for occurs_at in occurrences if inclusive or occurs_at > after]
+    return rows, covered
+
+
+def _insert_occurrences(rows):
+    """إدراج نسخ مع تجاهل الموجود منها (بناء متزامن من طلب كتابة أو عملية أخرى)"""
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    db.session.execute(insert(Occurrence).on_conflict_do_nothing(index_elements=['task_id', 'occurs_at']), rows)
+
+
+def _lower_horizon(covered):
+    """خفض الأفق المخزن إلى ما غطته مهمة مقطوعة عند الحد الأقصى"""
+    db.session.execute(update(OccurrenceHorizon).where(OccurrenceHorizon.materialized_until > covered)
+                       .values(materialized_until=covered))
+
+
+def _advance_horizon(previous, covered):
+    """تسجيل الأفق بعد تمديد مكتمل؛ لا يكتب إن غيّره غيره منذ بداية التمديد (مقارنة ثم تعيين)"""
+    if previous is None:
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(insert(OccurrenceHorizon).values(id=1, materialized_until=covered)
+                           .on_conflict_do_nothing(index_elements=['id']))
+    else:
+        db.session.execute(update(OccurrenceHorizon).where(
+            OccurrenceHorizon.id == 1, OccurrenceHorizon.materialized_until == previous
+        ).values(materialized_until=covered))
+    db.session.commit()
+
+
+def delete_occurrences(*task_ids):
+    """حذف نسخ مهام (قبل حذفها أو عند إزالة قاعدة التكرار)"""
+    if task_ids:
+        db.session.execute(delete(Occurrence).where(Occurrence.task_id.in_(task_ids)))
+
+
+def rebuild_occurrences(*task_ids):
+    """إعادة بناء نسخ مهام تغيّرت ضمن معاملة الكتابة نفسها (لا شيء إن كان الفهرس معطلاً)"""
+    if not ENABLED or not task_ids:
+        return 0
+    delete_occurrences(*task_ids)
+    until = horizon()
+    covered = until
+    rows = []
+    for task in Task.query.filter(Task.id.in_(task_ids), Task.recurrence_rule.isnot(None),
+                                  Task.recurrence_rule != '', Task.due_at.isnot(None)):
+        try:
+            task_rows, task_covered = _occurrence_rows(task, task.due_at, until)
+        except (TypeError, ValueError):
+            continue
+        rows.extend(task_rows)
+        covered = min(covered, task_covered)
+    if rows:
+        _insert_occurrences(rows)
+    if covered < until:
+        _lower_horizon(covered)
+    return len(rows)
+
+
+def extend_horizon(now=None):
+    """تمديد الأفق: توليد النسخ بين آخر نسخة مخزنة لكل مهمة ونهاية الأفق الجديد فقط"""
+    until = horizon(now)
+    previous = materialized_horizon()
+    last_stored = dict(db.session.query(Occurrence.task_id, db.func.max(Occurrence.occurs_at))
+                       .group_by(Occurrence.task_id))
+    # أعمدة فقط، لأن الحفظ بعد كل دفعة يُبطل مؤشر yield_per المفتوح
+    recurring = db.session.query(Task.id, Task.owner_id, Task.recurrence_rule, Task.due_at, Task.calendar_type).filter(
+        Task.recurrence_rule.isnot(None), Task.recurrence_rule != '', Task.due_at.isnot(None)).all()
+    
+    inserted = 0
+    covered = until
+    complete = True
+    for offset in range(0, len(recurring), EXTEND_BATCH_SIZE):
+        rows = []
+        for task in recurring[offset:offset + EXTEND_BATCH_SIZE]:
+            try:
+                if task.id in last_stored:
+                    task_rows, task_covered = _occurrence_rows(task, last_stored[task.id], until, inclusive=False)
+                else:
+                    task_rows, task_covered = _occurrence_rows(task, task.due_at, until)
+            except (TypeError, ValueError):
+                continue
+            rows.extend(task_rows)
+            covered = min(covered, task_covered)
+        try:
+            if rows:
+                _insert_occurrences(rows)
+            db.session.commit()
+            inserted += len(rows)
+        except Exception as e:
+            # مثلاً مهمة حُذفت أثناء التمديد؛ الدفعة تُعاد في التحديث التالي والأفق لا يتقدم
+            db.session.rollback()
+            complete = False
+            print(f"Occurrence index batch error: {e}")
+    
+    if complete:
+        _advance_horizon(previous, covered)
+    return inserted
+
+
+def fetch_occurrences(user_id, start, end):
+    """نسخ مهام المستخدم ضمن [start, end] بمسح واحد لفهرس (owner_id, occurs_at)"""
+    rows = db.session.query(Task, Occurrence.occurs_at).join(Occurrence, Occurrence.task_id == Task.id).filter(
+        Occurrence.owner_id == user_id,
+        Occurrence.occurs_at >= start,
+        Occurrence.occurs_at <= end
+    ).order_by(Occurrence.occurs_at).all()
+    return [TaskOccurrence(task, occurs_at) for task, occurs_at in rows]
+
+
+def occurrences_by_task(task_ids, start, end):
+    """مواعيد نسخ مجموعة مهام ضمن النطاق باستعلام واحد"""
+    occurrences = {}
+    if task_ids:
+        query = db.session.query(Occurrence.task_id, Occurrence.occurs_at).filter(
+            Occurrence.task_id.in_(task_ids), Occurrence.occurs_at <= end)
+        if start:
+            query = query.filter(Occurrence.occurs_at >= start)
+        for task_id, occurs_at in query.order_by(Occurrence.occurs_at):
+            occurrences.setdefault(task_id, []).append(occurs_at)
+    return occurrences
+
+
+def start_refresh(app):
+    """تشغيل مهمة الخلفية التي تمدد الأفق دورياً"""
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    extend_horizon()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Occurrence index refresh error: {e}")
+            time.sleep(REFRESH_SECONDS)
+
+    thread = threading.Thread(target=run, name='occurrence-index', daemon=True)
+    thread.start()
+    return thread
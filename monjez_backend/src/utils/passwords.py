@@ -0,0 +1,46 @@
+# تجزئة كلمات المرور بمعاملات قابلة للضبط مع حد لعدد عمليات التجزئة المتزامنة
+from functools import lru_cache
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# صيغة werkzeug: scrypt:N:r:p أو pbkdf2:sha256:iterations
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+# حد عمليات التجزئة المتزامنة في العملية. التجزئة تبقى على خيط الطلب (لا تُنقل لخيط آخر)،
+# لكن الحد يمنع عاصفة تسجيل دخول من شغل كل الأنوية والذاكرة (scrypt يحجز 32MB لكل عملية)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS)
+
+
+@lru_cache(maxsize=1)
+def _current_prefix():
+    # البادئة التي يكتبها werkzeug للمعاملات الحالية (بعد إكمال القيم الافتراضية)؛ تُحسب عند أول استخدام
+    return generate_password_hash('', method=PASSWORD_HASH_METHOD).split('$', 1)[0] + '$'
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    # تجزئة وهمية تُفحص عند عدم وجود المستخدم لتوحيد زمن الاستجابة
+    return generate_password_hash('monjez', method=PASSWORD_HASH_METHOD)
+
+
+def hash_password(password):
+    """تجزئة كلمة مرور بالمعاملات الحالية"""
+    with _hash_slots:
+        return generate_password_hash(password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """التحقق من كلمة المرور؛ password_hash قد يكون None لمستخدم غير موجود"""
+    target = password_hash or _dummy_hash()
+    with _hash_slots:
+        valid = check_password_hash(target, password)
+    return valid and password_hash is not None
+
+
+def needs_rehash(password_hash):
+    """هل خُزّنت التجزئة بمعاملات غير الحالية؟"""
+    return not password_hash.startswith(_current_prefix())
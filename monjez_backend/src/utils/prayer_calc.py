@@ -0,0 +1,160 @@
+"""حساب أوقات الصلاة فلكياً دون اتصال (موقع الشمس، زوايا الفجر والعشاء، ظل العصر)"""
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import math
+
+from src.utils.hijri_calendar import gregorian_to_hijri
+
+Location = namedtuple('Location', ['key', 'name', 'latitude', 'longitude', 'timezone'])
+
+PRAYERS = ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha')
+
+# طرق الحساب: زاوية الفجر، وزاوية العشاء أو عدد الدقائق بعد المغرب
+CALCULATION_METHODS = {
+    'umm_al_qura': {'name': 'أم القرى', 'fajr_angle': 18.5, 'isha_minutes': 90, 'isha_minutes_ramadan': 120},
+    'mwl': {'name': 'رابطة العالم الإسلامي', 'fajr_angle': 18, 'isha_angle': 17},
+    'egypt': {'name': 'الهيئة المصرية العامة للمساحة', 'fajr_angle': 19.5, 'isha_angle': 17.5},
+    'karachi': {'name': 'جامعة العلوم الإسلامية بكراتشي', 'fajr_angle': 18, 'isha_angle': 18},
+    'isna': {'name': 'الجمعية الإسلامية لأمريكا الشمالية', 'fajr_angle': 15, 'isha_angle': 15},
+}
+
+DEFAULT_METHOD = 'umm_al_qura'
+
+# معامل ظل العصر: 1 للجمهور، 2 للحنفية
+ASR_FACTORS = {'standard': 1, 'hanafi': 2}
+
+SAUDI_CITIES = {
+    'riyadh': Location('riyadh', 'الرياض', 24.7136, 46.6753, 'Asia/Riyadh'),
+    'jeddah': Location('jeddah', 'جدة', 21.4858, 39.1925, 'Asia/Riyadh'),
+    'makkah': Location('makkah', 'مكة المكرمة', 21.3891, 39.8579, 'Asia/Riyadh'),
+    'madinah': Location('madinah', 'المدينة المنورة', 24.5247, 39.5692, 'Asia/Riyadh'),
+    'dammam': Location('dammam', 'الدمام', 26.4207, 50.0888, 'Asia/Riyadh'),
+    'khobar': Location('khobar', 'الخبر', 26.2172, 50.1971, 'Asia/Riyadh'),
+    'dhahran': Location('dhahran', 'الظهران', 26.2361, 50.0393, 'Asia/Riyadh'),
+    'jubail': Location('jubail', 'الجبيل', 27.0046, 49.6460, 'Asia/Riyadh'),
+    'hofuf': Location('hofuf', 'الهفوف', 25.3647, 49.5856, 'Asia/Riyadh'),
+    'qatif': Location('qatif', 'القطيف', 26.5196, 50.0115, 'Asia/Riyadh'),
+    'taif': Location('taif', 'الطائف', 21.2703, 40.4158, 'Asia/Riyadh'),
+    'tabuk': Location('tabuk', 'تبوك', 28.3835, 36.5662, 'Asia/Riyadh'),
+    'buraidah': Location('buraidah', 'بريدة', 26.3260, 43.9750, 'Asia/Riyadh'),
+    'unaizah': Location('unaizah', 'عنيزة', 26.0843, 43.9935, 'Asia/Riyadh'),
+    'hail': Location('hail', 'حائل', 27.5114, 41.7208, 'Asia/Riyadh'),
+    'abha': Location('abha', 'أبها', 18.2164, 42.5053, 'Asia/Riyadh'),
+    'khamis_mushait': Location('khamis_mushait', 'خميس مشيط', 18.3000, 42.7333, 'Asia/Riyadh'),
+    'jazan': Location('jazan', 'جازان', 16.8892, 42.5511, 'Asia/Riyadh'),
+    'najran': Location('najran', 'نجران', 17.5656, 44.2289, 'Asia/Riyadh'),
+    'al_baha': Location('al_baha', 'الباحة', 20.0129, 41.4677, 'Asia/Riyadh'),
+    'yanbu': Location('yanbu', 'ينبع', 24.0895, 38.0618, 'Asia/Riyadh'),
+    'arar': Location('arar', 'عرعر', 30.9753, 41.0381, 'Asia/Riyadh'),
+    'sakaka': Location('sakaka', 'سكاكا', 29.9697, 40.2064, 'Asia/Riyadh'),
+    'al_kharj': Location('al_kharj', 'الخرج', 24.1556, 47.3120, 'Asia/Riyadh'),
+}
+
+DEFAULT_CITY = 'riyadh'
+
+
+def resolve_location(city=None, latitude=None, longitude=None, tz_name=None):
+    """تحديد الموقع من اسم مدينة سعودية أو من إحداثيات ومنطقة زمنية صريحة"""
+    if latitude is not None and longitude is not None:
+        latitude, longitude = float(latitude), float(longitude)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('الإحداثيات غير صحيحة')
+        tz_name = tz_name or 'Asia/Riyadh'
+        ZoneInfo(tz_name)  # التحقق من صحة المنطقة الزمنية
+        return Location(None, None, latitude, longitude, tz_name)
+    
+    location = SAUDI_CITIES.get((city or DEFAULT_CITY).strip().lower().replace(' ', '_').replace('-', '_'))
+    if location is None:
+        raise ValueError('المدينة غير مدعومة')
+    return location
+
+
+# دوال مثلثية بالدرجات
+def _sin(d): return math.sin(math.radians(d))
+def _cos(d): return math.cos(math.radians(d))
+def _tan(d): return math.tan(math.radians(d))
+def _asin(x): return math.degrees(math.asin(x))
+def _acos(x): return math.degrees(math.acos(x))
+def _atan2(y, x): return math.degrees(math.atan2(y, x))
+def _acot(x): return math.degrees(math.atan(1 / x))
+def _fix(a, b): return a - b * math.floor(a / b)
+
+
+def sun_position(jd):
+    """ميل الشمس ومعادلة الزمن (بالساعات) ليوم جولياني معين"""
+    d = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * d, 360)
+    q = _fix(280.459 + 0.98564736 * d, 360)
+    ecliptic_longitude = _fix(q + 1.915 * _sin(g) + 0.020 * _sin(2 * g), 360)
+    obliquity = 23.439 - 0.00000036 * d
+    
+    right_ascension = _fix(_atan2(_cos(obliquity) * _sin(ecliptic_longitude), _cos(ecliptic_longitude)) / 15, 24)
+    declination = _asin(_sin(obliquity) * _sin(ecliptic_longitude))
+    equation_of_time = q / 15 - right_ascension
+    return declination, equation_of_time
+
+
+def _mid_day(jd, t):
+    return _fix(12 - sun_position(jd + t)[1], 24)
+
+
+def _sun_angle_time(jd, latitude, angle, t, before_noon=False):
+    """الوقت الذي تكون فيه الشمس على زاوية angle تحت الأفق قبل الزوال أو بعده، أو None إن تعذر"""
+    declination = sun_position(jd + t)[0]
+    x = (-_sin(angle) - _sin(declination) * _sin(latitude)) / (_cos(declination) * _cos(latitude))
+    if not -1 <= x <= 1:
+        return None
+    hours = _acos(x) / 15
+    return _mid_day(jd, t) + (-hours if before_noon else hours)
+
+
+def _asr_time(jd, latitude, factor, t):
+    declination = sun_position(jd + t)[0]
+    angle = -_acot(factor + _tan(abs(latitude - declination)))
+    return _sun_angle_time(jd, latitude, angle, t)
+
+
+def _format_time(hours):
+    if hours is None:
+        return None
+    minutes = int(_fix(hours + 0.5 / 60, 24) * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@lru_cache(maxsize=8192)
+def compute_prayer_times(latitude, longitude, tz_name, day, method=DEFAULT_METHOD, asr='standard'):
+    """أوقات الصلاة (HH:MM بالتوقيت المحلي) لموقع ويوم وطريقة حساب؛ النتائج مخزنة في LRU"""
+    params = CALCULATION_METHODS[method]
+    offset = ZoneInfo(tz_name).utcoffset(datetime(day.year, day.month, day.day, 12)).total_seconds() / 3600
+    
+    # اليوم الجولياني عند منتصف الليل بتوقيت غرينتش مصححاً بخط الطول
+    jd = day.toordinal() + 1721424.5 - longitude / (15 * 24)
+    
+    times = {
+        'fajr': _sun_angle_time(jd, latitude, params['fajr_angle'], 5 / 24, before_noon=True),
+        'sunrise': _sun_angle_time(jd, latitude, 0.833, 6 / 24, before_noon=True),
+        'dhuhr': _mid_day(jd, 12 / 24),
+        'asr': _asr_time(jd, latitude, ASR_FACTORS[asr], 13 / 24),
+        'maghrib': _sun_angle_time(jd, latitude, 0.833, 18 / 24),
+    }
+    
+    if 'isha_minutes' in params:
+        # أم القرى: العشاء بعد المغرب بمدة ثابتة (تزيد في رمضان)
+        hijri = gregorian_to_hijri(day)
+        minutes = params['isha_minutes_ramadan'] if hijri and hijri[1] == 9 else params['isha_minutes']
+        times['isha'] = times['maghrib'] + minutes / 60 if times['maghrib'] is not None else None
+    else:
+        times['isha'] = _sun_angle_time(jd, latitude, params['isha_angle'], 18 / 24)
+    
+    adjustment = offset - longitude / 15
+    return {
+        name: _format_time(value + adjustment if value is not None else None)
+        for name, value in times.items()
+    }
+
+
+def prayer_times_for(location, day, method=DEFAULT_METHOD, asr='standard'):
+    """أوقات الصلاة لموقع (Location) ويوم"""
+    return compute_prayer_times(location.latitude, location.longitude, location.timezone, day, method, asr)
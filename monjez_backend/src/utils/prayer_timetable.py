@@ -0,0 +1,101 @@
+"""توليد جداول أوقات الصلاة لنطاق أيام ومجموعة مواقع دفعة واحدة باستخدام NumPy"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+
+from src.utils.hijri_calendar import GREGORIAN_RANGE, iter_days
+from src.utils.prayer_calc import ASR_FACTORS, CALCULATION_METHODS, DEFAULT_METHOD, PRAYERS
+
+TIMES = ('fajr', 'sunrise') + PRAYERS[1:]
+
+
+def _sun_position(jd):
+    """ميل الشمس ومعادلة الزمن لمصفوفة أيام جوليانية (نفس معادلات prayer_calc.sun_position)"""
+    d = jd - 2451545.0
+    g = np.radians(np.mod(357.529 + 0.98560028 * d, 360))
+    q = np.mod(280.459 + 0.98564736 * d, 360)
+    ecliptic_longitude = np.radians(np.mod(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g), 360))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    
+    right_ascension = np.mod(np.degrees(np.arctan2(
+        np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude))) / 15, 24)
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude))
+    return declination, q / 15 - right_ascension
+
+
+def _mid_day(jd, t):
+    return np.mod(12 - _sun_position(jd + t)[1], 24)
+
+
+def _sun_angle_time(jd, latitude, angle, t, before_noon=False):
+    """زمن وصول الشمس للزاوية angle؛ NaN حيث لا يتحقق ذلك (خطوط العرض العالية)"""
+    declination = _sun_position(jd + t)[0]
+    x = (-np.sin(np.radians(angle)) - np.sin(declination) * np.sin(latitude)) / (np.cos(declination) * np.cos(latitude))
+    with np.errstate(invalid='ignore'):
+        hours = np.degrees(np.arccos(x)) / 15
+    return _mid_day(jd, t) + (-hours if before_noon else hours)
+
+
+def _utc_offsets(location, days):
+    tz = ZoneInfo(location.timezone)
+    # المناطق بدون توقيت صيفي لها إزاحة ثابتة، فلا حاجة لحسابها لكل يوم
+    first = days[0]
+    if tz.utcoffset(datetime(first.year, 1, 1)) == tz.utcoffset(datetime(first.year, 7, 1)) and \
+            days[-1].year == first.year:
+        return np.full(len(days), tz.utcoffset(datetime(first.year, 1, 1)).total_seconds() / 3600)
+    return np.array([tz.utcoffset(datetime(day.year, day.month, day.day, 12)).total_seconds() / 3600 for day in days])
+
+
+def compute_timetable(locations, start, end, method=DEFAULT_METHOD, asr='standard'):
+    """
+    أوقات الصلاة لكل موقع ولكل يوم في النطاق [start, end] كمصفوفات بالدقائق منذ منتصف الليل المحلي.
+    تعيد (قائمة الأيام، {اسم الوقت: مصفوفة بشكل (المواقع، الأيام)}) مع NaN للأوقات المتعذرة.
+    """
+    params = CALCULATION_METHODS[method]
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    
+    # الأبعاد: المواقع على المحور الأول والأيام على الثاني
+    latitude = np.radians(np.array([location.latitude for location in locations]))[:, None]
+    longitude = np.array([location.longitude for location in locations])[:, None]
+    offsets = np.stack([_utc_offsets(location, days) for location in locations])
+    jd = np.array([day.toordinal() + 1721424.5 for day in days])[None, :] - longitude / (15 * 24)
+    
+    times = {
+        'fajr': _sun_angle_time(jd, latitude, params['fajr_angle'], 5 / 24, before_noon=True),
+        'sunrise': _sun_angle_time(jd, latitude, 0.833, 6 / 24, before_noon=True),
+        'dhuhr': _mid_day(jd, 12 / 24),
+        'maghrib': _sun_angle_time(jd, latitude, 0.833, 18 / 24),
+    }
+    
+    declination = _sun_position(jd + 13 / 24)[0]
+    asr_angle = -np.degrees(np.arctan(1 / (ASR_FACTORS[asr] + np.tan(np.abs(latitude - declination)))))
+    times['asr'] = _sun_angle_time(jd, latitude, asr_angle, 13 / 24)
+    
+    if 'isha_minutes' in params:
+        # أم القرى: مدة ثابتة بعد المغرب، أطول في رمضان
+        ramadan = _ramadan_mask(start, end)
+        minutes = np.where(ramadan, params['isha_minutes_ramadan'], params['isha_minutes'])[None, :]
+        times['isha'] = times['maghrib'] + minutes / 60
+    else:
+        times['isha'] = _sun_angle_time(jd, latitude, params['isha_angle'], 18 / 24)
+    
+    adjustment = offsets - longitude / 15
+    return days, {
+        name: np.floor(np.mod(times[name] + adjustment + 0.5 / 60, 24) * 60)
+        for name in TIMES
+    }
+
+
+def _ramadan_mask(start, end):
+    """أيام رمضان في النطاق؛ خارج جدول أم القرى تُعامل كغير رمضان كما في prayer_calc"""
+    mask = np.zeros((end - start).days + 1, dtype=bool)
+    first, last = max(start, GREGORIAN_RANGE[0]), min(end, GREGORIAN_RANGE[1])
+    if first <= last:
+        offset = (first - start).days
+        mask[offset:offset + (last - first).days + 1] = [hijri[1] == 9 for _, hijri in iter_days(first, last)]
+    return mask
+
+
+def format_minutes(values):
+    """تحويل مصفوفة دقائق إلى قائمة نصوص HH:MM (None مكان NaN)"""
+    return [None if np.isnan(value) else f"{int(value) // 60:02d}:{int(value) % 60:02d}" for value in values]
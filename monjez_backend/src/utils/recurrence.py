@@ -0,0 +1,210 @@
+# توسيع قواعد التكرار (iCal RRULE) إلى نسخ ضمن نافذة زمنية، مع دعم التقويم الهجري (RSCALE)
+from datetime import datetime, time
+from itertools import islice
+
+from dateutil import parser
+from dateutil.rrule import rrulestr
+
+from src.utils.cache import LRUCache
+from src.utils.hijri_calendar import HIJRI_RANGE, gregorian_to_hijri, hijri_month_length, hijri_to_gregorian
+
+# حد أعلى لعدد النسخ في نافذة واحدة
+MAX_OCCURRENCES_PER_WINDOW = 1000
+
+# التكرارات المدعومة؛ ما دون اليومي يُرفض لأن rrule يمشي خطياً من بداية السلسلة حتى النافذة
+# (سلسلة SECONDLY قديمة تكلف ملايين الخطوات في كل طلب مهما كان حد النسخ المعادة)
+SUPPORTED_FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+# قيم RSCALE الهجرية وفق RFC 7529؛ كلها تُحسب بجدول أم القرى
+HIJRI_SCALES = ('ISLAMIC-UMALQURA', 'ISLAMIC', 'ISLAMIC-CIVIL', 'ISLAMIC-TBLA', 'ISLAMIC-RGSA')
+
+# توسيعات مخزنة لكل (مهمة، نافذة)؛ القيمة (بصمة المهمة، قائمة المواعيد)
+EXPANSION_CACHE = LRUCache(maxsize=4096, ttl=3600)
+
+
+class TaskOccurrence:
+    """نسخة من مهمة متكررة في موعد محدد، بنفس واجهة Task المستخدمة في الشبكات والقوائم"""
+    __slots__ = ('task', 'due_at')
+
+    def __init__(self, task, due_at):
+        self.task = task
+        self.due_at = due_at
+
+    @property
+    def id(self):
+        return self.task.id
+
+    @property
+    def start_at(self):
+        """بداية النسخة: بداية المهمة مزاحة بفرق موعد النسخة عن موعدها الأصلي"""
+        if self.task.start_at and self.task.due_at:
+            return self.task.start_at + (self.due_at - self.task.due_at)
+        return self.task.start_at
+
+    def to_dict(self, fields=None, include=()):
+        data = self.task.to_dict(fields, include)
+        data['due_at'] = self.due_at.isoformat()
+        if data.get('start_at'):
+            data['start_at'] = self.start_at.isoformat()
+        data['occurrence_of'] = self.task.id
+        return data
+
+
+def parse_rule(rule):
+    """تفكيك نص القاعدة إلى قاموس خصائص بأحرف كبيرة"""
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[6:]
+    parts = {}
+    for part in rule.split(';'):
+        if '=' in part:
+            name, value = part.split('=', 1)
+            parts[name.strip().upper()] = value.strip().upper()
+    if 'FREQ' not in parts:
+        raise ValueError('قاعدة التكرار غير صحيحة: FREQ مطلوب')
+    if parts['FREQ'] not in SUPPORTED_FREQUENCIES:
+        raise ValueError('قاعدة التكرار غير صحيحة: FREQ يجب أن يكون DAILY أو WEEKLY أو MONTHLY أو YEARLY')
+    return parts
+
+
+def is_hijri_rule(parts, calendar_type=None):
+    """القاعدة هجرية إذا حددت RSCALE إسلامياً، أو كانت المهمة هجرية بتكرار شهري/سنوي"""
+    if 'RSCALE' in parts:
+        if parts['RSCALE'] not in HIJRI_SCALES:
+            raise ValueError('قيمة RSCALE غير مدعومة')
+        return True
+    return calendar_type == 'hijri' and parts['FREQ'] in ('YEARLY', 'MONTHLY')
+
+
+def validate_rule(rule):
+    """التحقق من قاعدة التكرار قبل حفظها (ValueError برسالة عربية)"""
+    if not rule:
+        return
+    parts = parse_rule(rule)
+    try:
+        if 'RSCALE' in parts:
+            is_hijri_rule(parts)
+            _hijri_options(parts)
+        else:
+            rrulestr(rule, dtstart=datetime(2000, 1, 1), ignoretz=True)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'قاعدة التكرار غير صحيحة: {e}')
+
+
+def _hijri_options(parts):
+    if parts['FREQ'] not in ('YEARLY', 'MONTHLY'):
+        raise ValueError('التكرار الهجري يدعم YEARLY و MONTHLY فقط')
+    months = [int(month) for month in parts['BYMONTH'].split(',')] if 'BYMONTH' in parts else None
+    days = [int(day) for day in parts['BYMONTHDAY'].split(',')] if 'BYMONTHDAY' in parts else None
+    if months and not all(1 <= month <= 12 for month in months):
+        raise ValueError('BYMONTH خارج النطاق')
+    if days and not all(1 <= abs(day) <= 30 for day in days):
+        raise ValueError('BYMONTHDAY خارج النطاق')
+    interval = int(parts.get('INTERVAL', 1))
+    if interval < 1:
+        raise ValueError('INTERVAL يجب أن يكون موجباً')
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    until = parser.parse(parts['UNTIL'], ignoretz=True) if 'UNTIL' in parts else None
+    return months, days, interval, count, until
+
+
+def _gregorian_occurrences(rule, dtstart, start, end):
+    for occurrence in rrulestr(rule, dtstart=dtstart, ignoretz=True).xafter(start, inc=True):
+        if occurrence > end:
+            return
+        yield occurrence
+
+
+def _hijri_occurrences(parts, dtstart, start, end):
+    months, days, interval, count, until = _hijri_options(parts)
+    origin = gregorian_to_hijri(dtstart.date())
+    if origin is None:
+        return
+    yearly = parts['FREQ'] == 'YEARLY'
+    months = sorted(months or [origin[1]])
+    days = days or [origin[2]]
+    time_of_day = dtstart - datetime.combine(dtstart.date(), time())
+
+    # كل فترة تبدأ عند فهرس شهر (السنة × 12 + الشهر)؛ السنوية تبدأ من المحرم
+    step = 12 * interval if yearly else interval
+    first_index = origin[0] * 12 if yearly else origin[0] * 12 + origin[1] - 1
+    last_index = HIJRI_RANGE[1][0] * 12 + HIJRI_RANGE[1][1] - 1
+
+    period = 0
+    if count is None and start > dtstart:
+        # القفز مباشرة إلى الفترة السابقة لبداية النافذة بدلاً من التوليد من البداية
+        window = gregorian_to_hijri(start.date())
+        if window is not None:
+            period = max(0, (window[0] * 12 + window[1] - 1 - first_index) // step - 1)
+
+    emitted = 0
+    while True:
+        base = first_index + period * step
+        if yearly:
+            candidates = [(base // 12, month) for month in months]
+        else:
+            month = base % 12 + 1
+            candidates = [(base // 12, month)] if 'BYMONTH' not in parts or month in months else []
+        for year, month in candidates:
+            if year * 12 + month - 1 > last_index:
+                return
+            length = hijri_month_length(year, month)
+            for day in sorted(day if day > 0 else length + 1 + day for day in days):
+                if not 1 <= day <= length:
+                    continue  # أيام غير موجودة في الشهر تُتجاوز (SKIP=OMIT)
+                occurrence = datetime.combine(hijri_to_gregorian(year, month, day), time()) + time_of_day
+                if occurrence < dtstart:
+                    continue
+                if (until and occurrence > until) or (count is not None and emitted >= count) or occurrence > end:
+                    return
+                emitted += 1
+                if occurrence >= start:
+                    yield occurrence
+        period += 1
+
+
+def iter_occurrences(rule, dtstart, start, end, calendar_type=None):
+    """مولّد مواعيد النسخ ضمن [start, end] دون توليد السلسلة كاملة"""
+    parts = parse_rule(rule)
+    if is_hijri_rule(parts, calendar_type):
+        return _hijri_occurrences(parts, dtstart, start, end)
+    return _gregorian_occurrences(rule, dtstart, start, end)
+
+
+def expand_task(task, start, end):
+    """مواعيد نسخ مهمة متكررة ضمن [start, end]، مخزنة مؤقتاً لكل (مهمة، نافذة)"""
+    if task.due_at is None:
+        return []
+    signature = (task.recurrence_rule, task.due_at, task.calendar_type, task.updated_at)
+    key = (task.id, start, end)
+    cached = EXPANSION_CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    try:
+        occurrences = list(islice(iter_occurrences(task.recurrence_rule, task.due_at, start, end, task.calendar_type),
+                                  MAX_OCCURRENCES_PER_WINDOW))
+    except (TypeError, ValueError):
+        # قاعدة غير صالحة (محفوظة قبل التحقق): تُعامل المهمة كمهمة عادية
+        occurrences = [task.due_at] if start <= task.due_at <= end else []
+    EXPANSION_CACHE.set(key, (signature, occurrences))
+    return occurrences
+
+
+def expand_tasks(tasks, start, end):
+    """تحويل المهام المتكررة إلى نسخها ضمن النافذة وإبقاء غيرها كما هي"""
+    expanded = []
+    for task in tasks:
+        if task.recurrence_rule:
+            expanded.extend(TaskOccurrence(task, due_at) for due_at in expand_task(task, start, end))
+        else:
+            expanded.append(task)
+    return expanded
+
+
+def invalidate_expansions(*task_ids):
+    """إبطال التوسيعات المخزنة لمهام تغيّرت"""
+    task_ids = set(task_ids)
+    if not task_ids:
+        return 0
+    return EXPANSION_CACHE.invalidate(lambda key, value: key[0] in task_ids)
@@ -0,0 +1,244 @@
+"""جدولة تذكيرات الصلاة في الخلفية باستخدام كومة (heap) مرتبة حسب وقت الإطلاق التالي"""
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from src.models.prayer_reminder import PrayerReminderPreference
+from src.utils.prayer_calc import PRAYERS, prayer_times_for, resolve_location
+
+# فترة استطلاع تغييرات التفضيلات المحفوظة من أي عملية
+POLL_SECONDS = int(os.getenv('PRAYER_REMINDER_POLL_SECONDS', 30))
+
+
+class MemorySink:
+    """مستقبِل محلي يحتفظ بالتذكيرات المُطلقة في قائمة (للاختبار والتطوير)"""
+    
+    def __init__(self):
+        self.delivered = []
+    
+    def __call__(self, reminder):
+        self.delivered.append(reminder)
+
+
+class LogSink:
+    """مستقبِل افتراضي يطبع التذكيرات في سجل الخادم"""
+    
+    def __call__(self, reminder):
+        print(f"Prayer reminder: user={reminder['user_id']} prayer={reminder['prayer']} at={reminder['prayer_at']}")
+
+
+class ReminderSettings:
+    """نسخة خفيفة من تفضيلات المستخدم لا تعتمد على جلسة قاعدة البيانات"""
+    
+    __slots__ = ('user_id', 'prayers', 'minutes', 'location', 'method')
+    
+    def __init__(self, user_id, prayers, minutes, location, method):
+        self.user_id = user_id
+        self.prayers = prayers
+        self.minutes = minutes
+        self.location = location
+        self.method = method
+    
+    @classmethod
+    def from_preference(cls, preference):
+        location = resolve_location(preference.city, preference.latitude, preference.longitude, preference.timezone)
+        prayers = [prayer for prayer in PRAYERS if prayer in preference.prayer_list]
+        return cls(preference.user_id, prayers, preference.reminder_minutes, location, preference.method)
+
+
+@lru_cache(maxsize=64)
+def _zone(tz_name):
+    return ZoneInfo(tz_name)
+
+
+@lru_cache(maxsize=4096)
+def prayer_instants(location, day, method):
+    """أوقات صلوات يوم لموقع كـ datetime بتوقيت UTC؛ مشتركة بين كل مستخدمي الموقع"""
+    tz = _zone(location.timezone)
+    instants = {}
+    for prayer, value in prayer_times_for(location, day, method).items():
+        if value:
+            hour, minute = map(int, value.split(':'))
+            # المقارنة بين قيم UTC أسرع بكثير من قيم بمناطق زمنية مختلفة
+            instants[prayer] = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz).astimezone(timezone.utc)
+    return instants
+
+
+class ReminderScheduler:
+    """
+    يحتفظ لكل مستخدم بمدخل واحد في الكومة هو تذكيره القادم، فلا يُفحص إلا ما حان وقته
+    (O(k log n) لكل دفعة) بدلاً من المرور على كل المستخدمين كل دقيقة.
+    تغيير التفضيلات يرفع رقم جيل المستخدم فتُهمل المدخلات القديمة عند سحبها.
+    عملية المُجدول تستطلع جدول التفضيلات دورياً، فتصلها تغييرات العمليات الأخرى.
+    """
+    
+    def __init__(self, sink=None):
+        self.sink = sink or LogSink()
+        self._heap = []
+        self._settings = {}
+        self._generations = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self._app = None
+        self._synced_at = None
+        self._versions = {}
+    
+    def __len__(self):
+        return len(self._settings)
+    
+    @property
+    def is_running(self):
+        """هل هذه العملية هي عملية المُجدول؟ (غيرها يكتفي بحفظ التفضيلات)"""
+        return self._thread is not None
+    
+    def next_reminder(self, settings, now):
+        """أول تذكير بعد now: (وقت الإطلاق، الصلاة، وقت الصلاة) بتوقيت UTC"""
+        local_today = now.astimezone(_zone(settings.location.timezone)).date()
+        lead = timedelta(minutes=settings.minutes)
+        
+        for offset in range(3):
+            instants = prayer_instants(settings.location, local_today + timedelta(days=offset), settings.method)
+            for prayer in settings.prayers:
+                prayer_at = instants.get(prayer)
+                if prayer_at is not None and prayer_at - lead > now:
+                    return prayer_at - lead, prayer, prayer_at
+        return None
+    
+    def schedule(self, settings, now=None):
+        """إضافة أو استبدال جدولة مستخدم"""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            generation = self._generations.get(settings.user_id, 0) + 1
+            self._generations[settings.user_id] = generation
+            self._settings[settings.user_id] = settings
+            self._push(settings, generation, now)
+            self._compact()
+        self._wakeup.set()
+    
+    def unschedule(self, user_id):
+        with self._lock:
+            self._settings.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+    
+    def _push(self, settings, generation, now):
+        upcoming = self.next_reminder(settings, now) if settings.prayers else None
+        if upcoming:
+            fire_at, prayer, prayer_at = upcoming
+            heapq.heappush(self._heap, (fire_at, next(self._counter), settings.user_id, generation, prayer, prayer_at))
+    
+    def _compact(self):
+        # إعادة بناء الكومة إذا تراكمت فيها مدخلات ملغاة كثيرة
+        if len(self._heap) > 2 * len(self._settings) + 1024:
+            self._heap = [entry for entry in self._heap
+                          if self._generations.get(entry[2]) == entry[3] and entry[2] in self._settings]
+            heapq.heapify(self._heap)
+    
+    def next_fire_time(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+    
+    def run_pending(self, now=None):
+        """إطلاق كل التذكيرات المستحقة حتى now وجدولة التالي لكل مستخدم؛ يعيد عدد المُطلق"""
+        now = now or datetime.now(timezone.utc)
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, _, user_id, generation, prayer, prayer_at = heapq.heappop(self._heap)
+                settings = self._settings.get(user_id)
+                if settings is None or self._generations.get(user_id) != generation:
+                    continue
+                due.append({
+                    'user_id': user_id,
+                    'prayer': prayer,
+                    'prayer_at': prayer_at.astimezone(_zone(settings.location.timezone)).isoformat(),
+                    'fire_at': fire_at.isoformat(),
+                    'reminder_minutes': settings.minutes
+                })
+                self._push(settings, generation, fire_at)
+        
+        for reminder in due:
+            try:
+                self.sink(reminder)
+            except Exception as e:
+                print(f"Prayer reminder delivery error: {e}")
+        return len(due)
+    
+    def sync_preferences(self):
+        """تطبيق التفضيلات المتغيرة منذ آخر استطلاع (يتطلب سياق التطبيق)؛ يعيد عدد المطبّق"""
+        query = PrayerReminderPreference.query
+        if self._synced_at is None:
+            query = query.filter_by(enabled=True)
+        else:
+            # هامش بسيط لفروق الساعة والمعاملات المتأخرة بين العمليات
+            query = query.filter(PrayerReminderPreference.updated_at >= self._synced_at - timedelta(seconds=5))
+        
+        applied = 0
+        for preference in query.yield_per(1000):
+            if preference.updated_at:
+                self._synced_at = max(self._synced_at or preference.updated_at, preference.updated_at)
+            if self._versions.get(preference.user_id) == preference.updated_at:
+                continue
+            self._versions[preference.user_id] = preference.updated_at
+            applied += 1
+            if not preference.enabled:
+                self.unschedule(preference.user_id)
+                continue
+            try:
+                self.schedule(ReminderSettings.from_preference(preference))
+            except (ValueError, KeyError) as e:
+                print(f"Skipping prayer reminders for {preference.user_id}: {e}")
+        return applied
+    
+    def _run(self):
+        next_poll = 0.0
+        while not self._stopped:
+            if self._app is not None and time.monotonic() >= next_poll:
+                with self._app.app_context():
+                    try:
+                        self.sync_preferences()
+                    except Exception as e:
+                        print(f"Prayer reminder sync error: {e}")
+                next_poll = time.monotonic() + POLL_SECONDS
+            self.run_pending()
+            next_fire = self.next_fire_time()
+            timeout = 60 if next_fire is None else max(0, (next_fire - datetime.now(timezone.utc)).total_seconds())
+            self._wakeup.wait(min(timeout, POLL_SECONDS if self._app is not None else 60))
+            self._wakeup.clear()
+    
+    def start(self, app=None):
+        """تشغيل خيط الإطلاق؛ مع app يحمّل التفضيلات ويستطلع تغييراتها من قاعدة البيانات"""
+        if self._thread is None:
+            self._app = app
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='prayer-reminders', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def load(self, preferences):
+        """جدولة مجموعة تفضيلات (مثلاً عند بدء الخادم)"""
+        count = 0
+        for preference in preferences:
+            try:
+                self.schedule(ReminderSettings.from_preference(preference))
+                count += 1
+            except ValueError as e:
+                print(f"Skipping prayer reminders for {preference.user_id}: {e}")
+        return count
+
+
+# مُجدول مشترك على مستوى العملية
+reminder_scheduler = ReminderScheduler()
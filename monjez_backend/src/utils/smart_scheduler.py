@@ -0,0 +1,172 @@
+# محرك الجدولة الذكية: توزيع المهام على الفترات الحرة حول المهام القائمة وأوقات الصلاة
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from src.utils.prayer_calc import CALCULATION_METHODS, DEFAULT_METHOD
+from src.utils.reminder_scheduler import prayer_instants
+
+SLOT_MINUTES = 15
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'med': 2, 'low': 3}
+WEEKEND_DAYS = (4, 5)  # الجمعة والسبت
+PRAYER_BLOCK_PRAYERS = ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha')
+
+
+class SlotTree:
+    """شجرة مقاطع فوق الفترات الزمنية تحفظ أطول تتابع حر؛ البحث والحجز بزمن O(log n)"""
+
+    def __init__(self, free):
+        self.size = len(free)
+        size = 4 * max(self.size, 1)
+        self.prefix = [0] * size
+        self.suffix = [0] * size
+        self.best = [0] * size
+        self.lazy = [False] * size
+        if self.size:
+            self._build(1, 0, self.size - 1, free)
+
+    def _build(self, node, left, right, free):
+        if left == right:
+            value = 1 if free[left] else 0
+            self.prefix[node] = self.suffix[node] = self.best[node] = value
+            return
+        mid = (left + right) // 2
+        self._build(2 * node, left, mid, free)
+        self._build(2 * node + 1, mid + 1, right, free)
+        self._pull(node, left, mid, right)
+
+    def _pull(self, node, left, mid, right):
+        lc, rc = 2 * node, 2 * node + 1
+        left_len, right_len = mid - left + 1, right - mid
+        self.prefix[node] = self.prefix[lc] + self.prefix[rc] if self.prefix[lc] == left_len else self.prefix[lc]
+        self.suffix[node] = self.suffix[rc] + self.suffix[lc] if self.suffix[rc] == right_len else self.suffix[rc]
+        self.best[node] = max(self.best[lc], self.best[rc], self.suffix[lc] + self.prefix[rc])
+
+    def _push(self, node):
+        if self.lazy[node]:
+            for child in (2 * node, 2 * node + 1):
+                self.prefix[child] = self.suffix[child] = self.best[child] = 0
+                self.lazy[child] = True
+            self.lazy[node] = False
+
+    def find(self, length):
+        """بداية أول تتابع حر بطول length أو -1"""
+        if length <= 0 or not self.size or self.best[1] < length:
+            return -1
+        node, left, right = 1, 0, self.size - 1
+        while left != right:
+            self._push(node)
+            mid = (left + right) // 2
+            lc, rc = 2 * node, 2 * node + 1
+            if self.best[lc] >= length:
+                node, right = lc, mid
+            elif self.suffix[lc] + self.prefix[rc] >= length:
+                return mid - self.suffix[lc] + 1
+            else:
+                node, left = rc, mid + 1
+        return left
+
+    def occupy(self, start, end):
+        """حجز الفترات [start, end)"""
+        if start < end:
+            self._occupy(1, 0, self.size - 1, start, end - 1)
+
+    def _occupy(self, node, left, right, start, end):
+        if end < left or right < start:
+            return
+        if start <= left and right <= end:
+            self.prefix[node] = self.suffix[node] = self.best[node] = 0
+            self.lazy[node] = True
+            return
+        self._push(node)
+        mid = (left + right) // 2
+        self._occupy(2 * node, left, mid, start, end)
+        self._occupy(2 * node + 1, mid + 1, right, start, end)
+        self._pull(node, left, mid, right)
+
+
+def parse_clock(value, default):
+    """تحويل "HH:MM" إلى دقائق من بداية اليوم"""
+    if not value:
+        return default
+    hour, minute = map(int, str(value).split(':'))
+    return hour * 60 + minute
+
+
+def build_schedule(tasks, busy_blocks, location, now, method=None, horizon_days=14, work_start='08:00',
+                   work_end='17:00', include_weekend=False, prayer_minutes=20, durations=None,
+                   default_duration=60):
+    """جدولة المهام حسب الأولوية ثم أقرب موعد نهائي في أول فترة حرة مناسبة
+
+    الأوقات كلها datetime بتوقيت UTC بدون منطقة زمنية (كما تُخزَّن في قاعدة البيانات)،
+    وساعات العمل وعطلة نهاية الأسبوع تُحسب بتوقيت الموقع.
+    """
+    method = method or DEFAULT_METHOD
+    if method not in CALCULATION_METHODS:
+        raise ValueError('طريقة الحساب غير مدعومة')
+    tz = ZoneInfo(location.timezone)
+    slot = timedelta(minutes=SLOT_MINUTES)
+    origin = now.replace(second=0, microsecond=0)
+    origin -= timedelta(minutes=origin.minute % SLOT_MINUTES)
+    if origin < now:
+        origin += slot
+    slot_count = horizon_days * 24 * 60 // SLOT_MINUTES
+    horizon_end = origin + slot * slot_count
+
+    def to_slot(moment, round_up=False):
+        minutes = (moment - origin).total_seconds() / 60
+        index = int(minutes // SLOT_MINUTES)
+        if round_up and minutes % SLOT_MINUTES:
+            index += 1
+        return min(max(index, 0), slot_count)
+
+    def to_utc(local_day, minutes):
+        moment = datetime(local_day.year, local_day.month, local_day.day, tzinfo=tz) + timedelta(minutes=minutes)
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+    # الفترات الحرة المبدئية: ساعات العمل في أيام العمل فقط
+    free = bytearray(slot_count)
+    start_minutes = parse_clock(work_start, 8 * 60)
+    end_minutes = parse_clock(work_end, 17 * 60)
+    local_day = origin.replace(tzinfo=timezone.utc).astimezone(tz).date() - timedelta(days=1)
+    last_day = horizon_end.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    days = []
+    while local_day <= last_day:
+        days.append(local_day)
+        if include_weekend or local_day.weekday() not in WEEKEND_DAYS:
+            first, last = to_slot(to_utc(local_day, start_minutes)), to_slot(to_utc(local_day, end_minutes))
+            free[first:last] = b'\x01' * (last - first)
+        local_day += timedelta(days=1)
+
+    tree = SlotTree(free)
+
+    # المهام القائمة ونوافذ الصلاة تحجز فتراتها
+    for start_at, end_at in busy_blocks:
+        if end_at > origin and start_at < horizon_end:
+            tree.occupy(to_slot(start_at), to_slot(end_at, round_up=True))
+    prayer_block = timedelta(minutes=prayer_minutes)
+    for day in days:
+        for prayer, instant in prayer_instants(location, day, method).items():
+            if prayer in PRAYER_BLOCK_PRAYERS:
+                instant = instant.replace(tzinfo=None)
+                tree.occupy(to_slot(instant), to_slot(instant + prayer_block, round_up=True))
+
+    durations = durations or {}
+    ordered = sorted(tasks, key=lambda task: (PRIORITY_RANK.get(task.priority, 2),
+                                              task.due_at or datetime.max, task.created_at or datetime.max))
+    results = []
+    for task in ordered:
+        minutes = durations.get(task.id)
+        if minutes is None and task.start_at and task.due_at and task.due_at > task.start_at:
+            minutes = (task.due_at - task.start_at).total_seconds() / 60
+        minutes = int(minutes or default_duration)
+        length = max(1, -(-minutes // SLOT_MINUTES))
+
+        start = tree.find(length)
+        if start < 0:
+            results.append({'task': task, 'start': None, 'end': None, 'duration_minutes': minutes})
+            continue
+        tree.occupy(start, start + length)
+        begin = origin + slot * start
+        results.append({'task': task, 'start': begin, 'end': begin + timedelta(minutes=minutes),
+                        'duration_minutes': minutes})
+    return results
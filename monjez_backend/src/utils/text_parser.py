@@ -0,0 +1,224 @@
+"""استخراج محلي سريع للمهام والتواريخ من النصوص العربية والإنجليزية"""
+from datetime import datetime, timedelta
+import re
+
+# الحد الأدنى لمتوسط الثقة المحلية قبل اللجوء إلى نموذج اللغة
+ESCALATION_THRESHOLD = 0.6
+
+# إزالة التشكيل والتطويل قبل التحليل
+_DIACRITICS = re.compile('[ً-ْـ]')
+
+# توحيد الحروف والأرقام (استبدال حرف بحرف لتبقى مواضع المطابقات صالحة للنص الأصلي)
+_NORMALIZE = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ة': 'ه', 'ى': 'ي',
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+
+_FLAGS = re.IGNORECASE
+
+# أنماط المهام: (النمط، الثقة الأساسية، هل تُضاف الكلمة المفتاحية للعنوان)
+TASK_PATTERNS = [
+    (re.compile(r'^\s*(?:[-*•▪]\s*)?(?:مهمه|task|todo|to-do|يجب|لازم|ضروري|must|need to|remember to)\s*:?\s*(.+)$', _FLAGS), 0.7, False),
+    (re.compile(r'^\s*(?:[-*•▪]\s*)?(اجتماع|meeting|موعد|appointment|call|مكالمه)\s+(.+)$', _FLAGS), 0.7, True),
+    (re.compile(r'^\s*(?:[-*•▪]|\d+[.)])\s+(.+)$', _FLAGS), 0.5, False),
+]
+
+_WEEKDAYS = {
+    'الاثنين': 0, 'الثلاثاء': 1, 'الاربعاء': 2, 'الخميس': 3, 'الجمعه': 4, 'السبت': 5, 'الاحد': 6,
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6,
+}
+
+_NUMBER_WORDS = {'يومين': 2, 'ساعتين': 2, 'اسبوعين': 2}
+
+# أبعد موعد نسبي مقبول ("بعد 500 يوم" غالباً ليست عبارة تاريخ)
+MAX_RELATIVE_DELTA = timedelta(days=366)
+
+# أنماط التاريخ: (النمط، اسم المعالج)
+DATE_PATTERNS = [
+    (re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'), 'iso'),
+    (re.compile(r'\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b'), 'dmy'),
+    (re.compile(r'(?<!\w)(?:بعد\s+(?:بكره|بكرا|غد)|day after tomorrow)(?!\w)', _FLAGS), 'after_tomorrow'),
+    (re.compile(r'(?<!\w)(?:بكره|بكرا|غدا|الغد|tomorrow)(?!\w)', _FLAGS), 'tomorrow'),
+    (re.compile(r'(?<!\w)(?:اليوم|الليله|today|tonight)(?!\w)', _FLAGS), 'today'),
+    (re.compile(r'(?<!\w)(?:بعد|خلال|within|in|after)\s+(?:(\d{1,3})\s*(ايام|يوم|ساعات|ساعه|اسابيع|اسبوع|days?|hours?|weeks?)|(يومين|ساعتين|اسبوعين))(?!\w)', _FLAGS), 'relative'),
+    (re.compile(r'(?<!\w)(?:الاسبوع\s+(?:القادم|الجاي|المقبل)|next\s+week)(?!\w)', _FLAGS), 'next_week'),
+    (re.compile(r'(?<!\w)(?:يوم\s+)?(الاثنين|الثلاثاء|الاربعاء|الخميس|الجمعه|السبت|الاحد)(?!\w)(?:\s+(?:القادم|الجاي|المقبل)(?!\w))?', _FLAGS), 'weekday'),
+    (re.compile(r'\b(?:(?:next|this|on)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b', _FLAGS), 'weekday'),
+]
+
+# كل أنماط الوقت بثلاث مجموعات: (الساعة، الدقائق، المؤشر) حتى لو كانت الأخيرة فارغة
+TIME_PATTERNS = [
+    re.compile(r'(?:الساعه|ساعه)\s*(\d{1,2})(?::(\d{2}))?\s*(صباحا|الصبح|ص|مساء|م|الظهر|العصر|المغرب|العشاء|الليل|بالليل)?(?!\w)', _FLAGS),
+    re.compile(r'\b(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)(?!\w)', _FLAGS),
+    re.compile(r'\bat\s+(\d{1,2})(?::(\d{2}))?\b()', _FLAGS),
+    re.compile(r'\b(\d{1,2}):(\d{2})\b()'),
+]
+
+_PM_MARKERS = {'مساء', 'م', 'الظهر', 'العصر', 'المغرب', 'العشاء', 'الليل', 'بالليل', 'pm', 'p.m.'}
+_AM_MARKERS = {'صباحا', 'الصبح', 'ص', 'am', 'a.m.'}
+
+_TITLE_TRIM = re.compile(r'^[\s:،,.\-–]+|[\s:،,.\-–]+$|\s+(?:في|on|at|by|قبل)$', _FLAGS)
+
+
+def normalize(text):
+    """إزالة التشكيل ثم توحيد الحروف والأرقام حرفاً بحرف"""
+    text = _DIACRITICS.sub('', text)
+    return text, text.translate(_NORMALIZE)
+
+
+def _resolve_date(kind, match, now):
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == 'iso':
+        return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))), 0.3
+    if kind == 'dmy':
+        year = match.group(3)
+        year = int(year) + (2000 if len(year) == 2 else 0) if year else today.year
+        value = datetime(year, int(match.group(2)), int(match.group(1)))
+        if not match.group(3) and value < today:
+            value = value.replace(year=year + 1)
+        return value, 0.25
+    if kind == 'today':
+        return today, 0.2
+    if kind == 'tomorrow':
+        return today + timedelta(days=1), 0.2
+    if kind == 'after_tomorrow':
+        return today + timedelta(days=2), 0.2
+    if kind == 'next_week':
+        return today + timedelta(days=7), 0.15
+    if kind == 'weekday':
+        weekday = _WEEKDAYS[match.group(1).lower()]
+        return today + timedelta(days=(weekday - today.weekday()) % 7 or 7), 0.2
+    
+    # relative: بعد N أيام/ساعات/أسابيع، أو بصيغة المثنى (يومين، ساعتين، أسبوعين)
+    if match.group(3):
+        amount, unit = _NUMBER_WORDS[match.group(3)], match.group(3)
+    else:
+        amount, unit = int(match.group(1)), match.group(2).lower()
+    if unit.startswith(('ساع', 'hour')):
+        delta, base = timedelta(hours=amount), now
+    elif unit.startswith(('اسب', 'اساب', 'week')):
+        delta, base = timedelta(weeks=amount), today
+    else:
+        delta, base = timedelta(days=amount), today
+    if delta > MAX_RELATIVE_DELTA:
+        raise ValueError('المدة النسبية بعيدة جداً')
+    return base + delta, 0.2
+
+
+def _resolve_time(match):
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    marker = (match.group(3) or '').lower()
+    
+    if marker in _PM_MARKERS and hour < 12:
+        hour += 12
+    elif marker in _AM_MARKERS and hour == 12:
+        hour = 0
+    elif not marker and 1 <= hour <= 6:
+        # "الساعة ٣" بدون تحديد تعني غالباً بعد الظهر في سياق العمل
+        hour += 12
+    
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+def parse_datetime(text, now):
+    """استخراج أول تاريخ/وقت من سطر: (datetime أو None، المقاطع المطابقة، إضافة الثقة)"""
+    spans = []
+    due, boost = None, 0.0
+    
+    for pattern, kind in DATE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            try:
+                due, boost = _resolve_date(kind, match, now)
+            except ValueError:
+                continue
+            spans.append(match.span())
+            break
+    
+    for pattern in TIME_PATTERNS:
+        match = pattern.search(text)
+        if match and not any(start <= match.start() < end for start, end in spans):
+            clock = _resolve_time(match)
+            if clock is None:
+                continue
+            if due is None:
+                # وقت بدون تاريخ: اليوم إن لم يمض، وإلا غداً
+                due = now.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+                if due <= now:
+                    due += timedelta(days=1)
+            else:
+                due = due.replace(hour=clock[0], minute=clock[1])
+            spans.append(match.span())
+            boost += 0.1
+            break
+    
+    return due, spans, boost
+
+
+def extract_tasks(text, now=None):
+    """استخراج المهام محلياً؛ يعيد (قائمة المهام، متوسط الثقة)"""
+    now = now or datetime.now()
+    original, normalized = normalize(text)
+    
+    tasks = []
+    candidate_lines = 0
+    for line, normalized_line in zip(original.split('\n'), normalized.split('\n')):
+        if not line.strip():
+            continue
+        candidate_lines += 1
+        
+        for pattern, confidence, keep_keyword in TASK_PATTERNS:
+            match = pattern.match(normalized_line)
+            if not match:
+                continue
+            
+            title_group = 2 if keep_keyword else 1
+            start, end = match.span(title_group)
+            due, spans, boost = parse_datetime(normalized_line, now)
+            
+            # حذف عبارات التاريخ والوقت من العنوان مع الحفاظ على النص الأصلي
+            title_chars = list(line[start:end])
+            for span_start, span_end in spans:
+                for index in range(max(span_start, start), min(span_end, end)):
+                    title_chars[index - start] = ''
+            title = re.sub(r'\s{2,}', ' ', ''.join(title_chars))
+            title = _TITLE_TRIM.sub('', _TITLE_TRIM.sub('', title))
+            if keep_keyword:
+                title = f"{line[match.start(1):match.end(1)]} {title}".strip()
+            
+            if len(title) > 3:  # تجنب المطابقات القصيرة جداً
+                tasks.append({
+                    'title': title,
+                    'extracted_from': line.strip(),
+                    'due_date': due.isoformat() if due else None,
+                    'confidence': round(min(confidence + boost, 0.95), 2),
+                    'source': 'local'
+                })
+            break
+    
+    if not tasks:
+        return tasks, 0.0
+    
+    confidence = sum(task['confidence'] for task in tasks) / len(tasks)
+    # نص طويل لم يُستخرج منه إلا القليل (مثل محاضر الاجتماعات) يُعامل كثقة منخفضة
+    if candidate_lines >= 4 and len(tasks) / candidate_lines < 0.3:
+        confidence *= 0.5
+    return tasks, round(confidence, 2)
+
+
+def normalize_title(title):
+    """صيغة موحدة لعنوان المهمة لاكتشاف التكرار (حروف، أرقام، مسافات، حالة الأحرف)"""
+    return ' '.join(normalize(title)[1].casefold().split())
+
+
+def should_escalate(tasks, confidence, mode='auto', threshold=ESCALATION_THRESHOLD):
+    """هل يجب استدعاء نموذج اللغة؟ (auto: فقط عند انخفاض الثقة المحلية)"""
+    if mode == 'always':
+        return True
+    if mode == 'never':
+        return False
+    return not tasks or confidence < threshold
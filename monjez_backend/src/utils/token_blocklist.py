@@ -0,0 +1,130 @@
+# قائمة إبطال التوكنات (JTI): مرشح Bloom ومجموعة محدودة في الذاكرة أمام جدول revoked_tokens
+from datetime import datetime, timedelta, timezone
+import hashlib
+import math
+import os
+import threading
+import time
+
+from src.models import db
+from src.models.revoked_token import RevokedToken
+from src.utils.cache import LRUCache
+
+# الحجم المتوقع للقائمة ونسبة الإيجابيات الكاذبة المقبولة للمرشح
+BLOCKLIST_CAPACITY = int(os.getenv('TOKEN_BLOCKLIST_CAPACITY', 100000))
+BLOCKLIST_ERROR_RATE = 0.001
+
+# مزامنة الإبطالات من العمليات الأخرى، وإعادة بناء المرشح لإسقاط المنتهية (في خيط الخلفية)
+SYNC_SECONDS = int(os.getenv('TOKEN_BLOCKLIST_SYNC_SECONDS', 30))
+REBUILD_SECONDS = 3600
+
+
+class BloomFilter:
+    """مرشح Bloom: لا إيجابيات سالبة، وإيجابيات كاذبة بنسبة محددة؛ الفحص بضع عمليات تجزئة فقط"""
+    
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, item):
+        # تجزئتان مستقلتان تولّدان k موضعاً (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+    
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenBlocklist:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(BLOCKLIST_CAPACITY, BLOCKLIST_ERROR_RATE)
+        # الإبطالات الحديثة محلياً تُجاب دون قاعدة البيانات
+        self._recent = LRUCache(maxsize=10000, ttl=REBUILD_SECONDS)
+        self._synced_at = None
+        self._next_rebuild = 0.0
+    
+    def load(self, now=None):
+        """إعادة بناء المرشح من التوكنات المبطلة غير المنتهية وحذف المنتهية من الجدول"""
+        now = now or datetime.utcnow()
+        RevokedToken.query.filter(RevokedToken.expires_at < now).delete()
+        db.session.commit()
+        bloom = BloomFilter(BLOCKLIST_CAPACITY, BLOCKLIST_ERROR_RATE)
+        for (jti,) in db.session.query(RevokedToken.jti).yield_per(10000):
+            bloom.add(jti)
+        with self._lock:
+            self._bloom = bloom
+            self._synced_at = now
+            self._next_rebuild = time.monotonic() + REBUILD_SECONDS
+    
+    def sync(self):
+        """إضافة ما أبطلته العمليات الأخرى منذ آخر مزامنة (استعلام واحد)"""
+        now = datetime.utcnow()
+        query = db.session.query(RevokedToken.jti)
+        if self._synced_at is not None:
+            # هامش بسيط لفروق الساعة بين العمليات
+            query = query.filter(RevokedToken.revoked_at >= self._synced_at - timedelta(seconds=5))
+        jtis = [jti for (jti,) in query]
+        with self._lock:
+            for jti in jtis:
+                self._bloom.add(jti)
+            self._synced_at = now
+    
+    def refresh(self):
+        """خطوة الخلفية: إعادة بناء كل REBUILD_SECONDS، ومزامنة تزايدية فيما بينها"""
+        if time.monotonic() >= self._next_rebuild:
+            self.load()
+        else:
+            self.sync()
+    
+    def start_refresh(self, app):
+        """تشغيل خيط الخلفية الذي يزامن القائمة كل SYNC_SECONDS خارج مسار الطلبات"""
+        def run():
+            while True:
+                time.sleep(SYNC_SECONDS)
+                with app.app_context():
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Token blocklist refresh error: {e}")
+        
+        thread = threading.Thread(target=run, name='token-blocklist', daemon=True)
+        thread.start()
+        return thread
+    
+    def revoke(self, payload):
+        """إبطال توكن من حمولته المفكوكة (يُحفظ في الجدول ويُضاف فوراً للذاكرة)"""
+        jti = payload['jti']
+        if RevokedToken.query.get(jti) is None:
+            db.session.add(RevokedToken(
+                jti=jti,
+                user_id=payload.get('sub'),
+                token_type=payload.get('type', 'access'),
+                expires_at=datetime.fromtimestamp(payload['exp'], timezone.utc).replace(tzinfo=None)
+                if payload.get('exp') else datetime.max
+            ))
+            db.session.commit()
+        with self._lock:
+            self._bloom.add(jti)
+        self._recent.set(jti, True)
+    
+    def is_revoked(self, jti):
+        """فحص JTI: المرشح ينفي معظم التوكنات دون قاعدة البيانات، والجدول يحسم الإيجابيات"""
+        if jti not in self._bloom:
+            return False
+        if self._recent.get(jti):
+            return True
+        revoked = db.session.query(RevokedToken.jti).filter_by(jti=jti).first() is not None
+        if revoked:
+            self._recent.set(jti, True)
+        return revoked
+
+
+token_blocklist = TokenBlocklist()
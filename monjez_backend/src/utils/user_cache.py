@@ -0,0 +1,50 @@
+# ذاكرة مؤقتة لكل عملية لسجلات المستخدمين المسلسلة، تُبطل تلقائياً عند تعديل المستخدم
+import os
+
+from sqlalchemy import event
+
+from src.models.user import User
+from src.utils.cache import LRUCache
+
+USER_CACHE = LRUCache(maxsize=int(os.getenv('USER_CACHE_SIZE', 10000)), ttl=int(os.getenv('USER_CACHE_TTL', 60)))
+
+# مطالبات غير حساسة يمكن تضمينها في التوكن ليجيب /auth/me دون قاعدة البيانات
+PROFILE_CLAIMS = ('name', 'locale', 'timezone')
+EMBED_PROFILE_CLAIMS = os.getenv('JWT_PROFILE_CLAIMS', '').lower() in ('1', 'true')
+
+DEFAULT_TIMEZONE = 'Asia/Riyadh'
+
+
+def get_user_dict(user_id):
+    """تمثيل المستخدم من الذاكرة المؤقتة أو من قاعدة البيانات؛ None إن لم يوجد"""
+    data = USER_CACHE.get(user_id)
+    if data is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        data = user.to_dict()
+        USER_CACHE.set(user_id, data)
+    return data
+
+
+def user_timezone(user_id):
+    """المنطقة الزمنية للمستخدم (الرياض افتراضياً)"""
+    data = get_user_dict(user_id)
+    return data['timezone'] if data and data.get('timezone') else DEFAULT_TIMEZONE
+
+
+def invalidate_user(user_id):
+    USER_CACHE.pop(user_id)
+
+
+def profile_claims(user):
+    """المطالبات الإضافية للتوكن من تمثيل المستخدم (فارغة ما لم يُفعّل JWT_PROFILE_CLAIMS)"""
+    if not EMBED_PROFILE_CLAIMS:
+        return {}
+    return {'profile': {claim: user[claim] for claim in PROFILE_CLAIMS}}
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+import pytest
+
+# قاعدة SQLite مؤقتة لكل جلسة اختبار (يجب ضبطها قبل استيراد src.main)
+_DB_DIR = tempfile.mkdtemp(prefix='monjez-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-benchmarks', action='store_true', default=False,
+                     help='تشغيل اختبارات الأداء (بطيئة وتحتاج بيانات كبيرة)')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: اختبار أداء لا يُشغَّل إلا مع --run-benchmarks')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-benchmarks'):
+        return
+    skip = pytest.mark.skip(reason='يتطلب --run-benchmarks')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    app.config.update(TESTING=True)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """عميل اختبار فوق جداول فارغة، داخل سياق التطبيق لتهيئة البيانات مباشرة"""
+    from src.models import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+
+
+@pytest.fixture
+def query_log(app):
+    """جمل SQL المنفذة أثناء الاختبار كأزواج (الجملة، المعاملات)"""
+    from sqlalchemy import event
+    from src.models import db
+    
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def auth_headers(client):
+    """تسجيل مستخدم (أو دخوله) وإرجاع ترويسة Authorization"""
+    def make(email='user@example.com', password='pw123456'):
+        response = client.post('/api/auth/register', json={'name': 'Test', 'email': email, 'password': password})
+        if response.status_code != 201:
+            response = client.post('/api/auth/login', json={'email': email, 'password': password})
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    return make
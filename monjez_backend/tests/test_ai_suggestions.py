@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+from src.routes import ai
+from src.utils.ai_requests import CoalescingCache, JobQueue, suggestion_cache
+from src.utils.cache import LRUCache
+
+
+class FakeUpstream:
+    """بديل fetch_suggestions يعد الاستدعاءات ويمكن إيقافه حتى يُسمح له بالرد"""
+
+    def __init__(self, result=({'suggestions': ['ok']}, True), error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, prompt):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    suggestion_cache.cache.clear()
+    fake = FakeUpstream()
+    monkeypatch.setattr(ai, 'fetch_suggestions', fake)
+    yield fake
+    fake.release.set()
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    coalescing = CoalescingCache(LRUCache())
+    fake = FakeUpstream(result='value')
+    fake.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescing.get_or_compute('key', lambda: fake(None))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: coalescing.coalesced == 7)
+    fake.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls == 1
+    assert results == ['value'] * 8
+    assert coalescing.get_or_compute('key', lambda: fake(None)) == 'value'
+    assert fake.calls == 1
+
+
+def test_waiters_time_out_when_upstream_hangs():
+    coalescing = CoalescingCache(LRUCache())
+    fake = FakeUpstream(result='late')
+    fake.release.clear()
+    owner = threading.Thread(target=lambda: coalescing.get_or_compute('key', lambda: fake(None)))
+    owner.start()
+    wait_until(lambda: fake.calls == 1)
+
+    with pytest.raises(TimeoutError):
+        coalescing.get_or_compute('key', lambda: fake(None), timeout=0.05)
+    fake.release.set()
+    owner.join()
+
+
+def test_uncacheable_results_are_not_stored():
+    coalescing = CoalescingCache(LRUCache())
+    fake = FakeUpstream(result=('fallback', False))
+    for _ in range(2):
+        coalescing.get_or_compute('key', lambda: fake(None), cacheable=lambda result: result[1])
+    assert fake.calls == 2
+
+
+def test_sync_suggestions_are_served_from_cache(client, auth_headers, upstream):
+    headers = auth_headers()
+    first = client.post('/api/ai/suggestions', json={'type': 'general', 'context': 'plan  my week'}, headers=headers)
+    # السياق يُوحَّد في المفتاح فلا تؤثر المسافات الزائدة
+    second = client.post('/api/ai/suggestions', json={'type': 'general', 'context': 'plan my week'}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json()['suggestions'] == {'suggestions': ['ok']}
+    assert upstream.calls == 1
+    assert client.get('/api/ai/suggestions/cache-stats', headers=headers).get_json()['suggestion_cache']['hits'] >= 1
+
+    client.post('/api/tasks', json={'title': 'new task'}, headers=headers)
+    client.post('/api/ai/suggestions', json={'type': 'general', 'context': 'plan my week'}, headers=headers)
+    assert upstream.calls == 2
+
+
+def test_upstream_timeout_returns_504(client, auth_headers, upstream):
+    upstream.error = TimeoutError()
+    response = client.post('/api/ai/suggestions', json={'context': 'x'}, headers=auth_headers())
+    assert response.status_code == 504
+
+
+def test_async_job_status_transitions(client, auth_headers, upstream):
+    headers = auth_headers()
+    upstream.release.clear()
+    submitted = client.post('/api/ai/suggestions', json={'context': 'later', 'async': True}, headers=headers)
+    assert submitted.status_code == 202
+    status_url = submitted.get_json()['status_url']
+
+    assert client.get(status_url, headers=headers).get_json()['status'] in ('pending', 'running')
+    upstream.release.set()
+    wait_until(lambda: client.get(status_url, headers=headers).get_json()['status'] == 'done')
+    assert client.get(status_url, headers=headers).get_json()['result']['suggestions'] == {'suggestions': ['ok']}
+
+    # مهمة مستخدم آخر غير مرئية
+    assert client.get(status_url, headers=auth_headers('other@example.com')).status_code == 404
+
+
+def test_async_job_failure_is_reported(client, auth_headers, upstream):
+    headers = auth_headers()
+    upstream.error = RuntimeError('upstream unavailable')
+    status_url = client.post('/api/ai/suggestions', json={'context': 'fail', 'async': True},
+                             headers=headers).get_json()['status_url']
+    wait_until(lambda: client.get(status_url, headers=headers).get_json()['status'] not in ('pending', 'running'))
+    job = client.get(status_url, headers=headers).get_json()
+    assert (job['status'], job['error']) == ('error', 'upstream unavailable')
+
+
+def test_job_queue_scopes_jobs_to_owner():
+    jobs = JobQueue(max_workers=1)
+    job_id = jobs.submit('owner', lambda: 42)
+    wait_until(lambda: jobs.get(job_id, 'owner')['status'] == 'done')
+    assert jobs.get(job_id, 'owner')['result'] == 42
+    assert jobs.get(job_id, 'someone-else') is None
+    assert jobs.get('missing', 'owner') is None
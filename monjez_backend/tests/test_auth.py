@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import time
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.models import db
+from src.models.revoked_token import RevokedToken
+from src.models.user import User
+from src.utils import passwords, user_cache
+from src.utils.token_blocklist import token_blocklist
+
+
+def login(client, email='user@example.com'):
+    client.post('/api/auth/register', json={'name': 'Test', 'email': email, 'password': 'pw123456'})
+    return client.post('/api/auth/login', json={'email': email, 'password': 'pw123456'}).get_json()
+
+
+def test_logout_rejects_malformed_refresh_token_before_revoking(client):
+    tokens = login(client)
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    response = client.post('/api/auth/logout', json={'refresh_token': 'not-a-jwt'}, headers=headers)
+    assert response.status_code == 400
+    # توكن الوصول لم يُبطل بسبب الطلب الفاشل
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+
+
+def test_logout_rejects_access_token_in_refresh_field(client):
+    tokens = login(client)
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+    response = client.post('/api/auth/logout', json={'refresh_token': tokens['access_token']}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_logout_revokes_access_and_refresh_tokens(client):
+    tokens = login(client)
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+    response = client.post('/api/auth/logout', json={'refresh_token': tokens['refresh_token']}, headers=headers)
+    assert response.status_code == 200
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+    assert client.post('/api/auth/refresh', headers={
+        'Authorization': f"Bearer {tokens['refresh_token']}"}).status_code == 401
+
+
+def test_refresh_picks_up_revocations_from_other_processes(client):
+    token_blocklist.load()
+    # إبطال كتبته عملية أخرى مباشرة في الجدول
+    db.session.add(RevokedToken(jti='other-process-jti', expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.session.commit()
+    assert not token_blocklist.is_revoked('other-process-jti')
+    token_blocklist.refresh()
+    assert token_blocklist.is_revoked('other-process-jti')
+
+
+def test_login_rehashes_outdated_parameters(client, monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    passwords._current_prefix.cache_clear()
+    login(client, 'old@example.com')
+    user = User.find_by_email('OLD@example.com')
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+    passwords._current_prefix.cache_clear()
+    assert client.post('/api/auth/login', json={'email': 'old@example.com', 'password': 'pw123456'}).status_code == 200
+    db.session.expire_all()
+    assert User.find_by_email('old@example.com').password_hash.startswith('pbkdf2:sha256:2000$')
+    passwords._current_prefix.cache_clear()
+
+
+@pytest.mark.benchmark
+def test_login_throughput(client, app):
+    """معدل تسجيل الدخول بالمعاملات المضبوطة (PASSWORD_HASH_METHOD) لتقدير عدد العمليات المطلوبة"""
+    login(client, 'bench@example.com')
+    body = {'email': 'bench@example.com', 'password': 'pw123456'}
+    count = int(os.getenv('BENCH_LOGINS', 40))
+
+    def one_login(_):
+        assert app.test_client().post('/api/auth/login', json=body).status_code == 200
+
+    results = {}
+    for threads in sorted({1, passwords.PASSWORD_HASH_WORKERS}):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(one_login, range(count)))
+        results[threads] = count / (time.perf_counter() - started)
+        print(f'\nlogin ({passwords.PASSWORD_HASH_METHOD}, {threads} threads): {results[threads]:.1f} logins/s')
+    assert results[1] > 1
+
+
+def test_emails_are_unique_regardless_of_case(client, monkeypatch):
+    first = client.post('/api/auth/register', json={'name': 'A', 'email': ' Sara@Example.com ', 'password': 'pw123456'})
+    assert first.status_code == 201
+    assert first.get_json()['user']['email'] == 'sara@example.com'
+    assert client.post('/api/auth/register', json={
+        'name': 'B', 'email': 'SARA@example.COM', 'password': 'pw123456'}).status_code == 400
+
+    # سباق تسجيل: الفحص المسبق لا يرى الحساب الآخر فيرفضه الفهرس الفريد
+    monkeypatch.setattr(User, 'find_by_email', classmethod(lambda cls, email: None))
+    assert client.post('/api/auth/register', json={
+        'name': 'C', 'email': 'sara@EXAMPLE.com', 'password': 'pw123456'}).status_code == 400
+    monkeypatch.undo()
+    assert User.query.count() == 1
+
+    # القيد على lower(email) نفسه، لا على التطبيع في المسار فقط
+    db.session.add(User(name='D', email='Sara@example.com', password_hash='x'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    login = client.post('/api/auth/login', json={'email': '  SARA@example.com', 'password': 'pw123456'})
+    assert login.status_code == 200
+
+
+def user_queries(query_log):
+    return [statement for statement, _ in query_log if 'FROM users' in statement]
+
+
+def test_me_is_served_from_the_user_cache_and_invalidated_on_change(client, query_log):
+    user_cache.USER_CACHE.clear()
+    headers = {'Authorization': f"Bearer {login(client)['access_token']}"}
+    query_log.clear()
+    assert client.get('/api/auth/me', headers=headers).get_json()['user']['name'] == 'Test'
+    assert len(user_queries(query_log)) == 1
+
+    query_log.clear()
+    assert client.get('/api/auth/me', headers=headers).get_json()['user']['name'] == 'Test'
+    assert user_queries(query_log) == []
+
+    User.query.filter_by(email='user@example.com').one().name = 'Renamed'
+    db.session.commit()
+    assert client.get('/api/auth/me', headers=headers).get_json()['user']['name'] == 'Renamed'
+
+
+def test_me_answers_from_token_claims_without_the_database(client, query_log, monkeypatch):
+    monkeypatch.setattr(user_cache, 'EMBED_PROFILE_CLAIMS', True)
+    user_cache.USER_CACHE.clear()
+    tokens = login(client)
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    query_log.clear()
+    body = client.get('/api/auth/me', headers=headers).get_json()
+    assert body['source'] == 'token'
+    assert set(body['user']) == {'id', 'name', 'locale', 'timezone'}
+    assert user_queries(query_log) == []
+
+    fresh = client.get('/api/auth/me?fresh=1', headers=headers).get_json()
+    assert 'source' not in fresh and fresh['user']['email'] == 'user@example.com'
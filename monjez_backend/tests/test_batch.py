@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+from src.models.task import Task
+
+
+def test_batch_applies_valid_operations_and_reports_failures(client, auth_headers):
+    headers = auth_headers()
+    task_id = client.post('/api/tasks', json={'title': 'existing'}, headers=headers).get_json()['task']['id']
+    response = client.post('/api/tasks/batch', json={'operations': [
+        {'op': 'create', 'data': {'title': 'new'}},
+        {'op': 'update', 'id': task_id, 'data': {'priority': 'high'}},
+        {'op': 'complete', 'id': task_id},
+        {'op': 'delete', 'id': 'missing'},
+        {'op': 'create', 'data': {}},
+    ]}, headers=headers)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['succeeded'], body['failed']) == (3, 2)
+    task = Task.query.get(task_id)
+    assert (task.priority, task.status) == ('high', 'done')
+    assert Task.query.count() == 2
+
+
+def test_malformed_operations_fail_individually(client, auth_headers):
+    headers = auth_headers()
+    task_id = client.post('/api/tasks', json={'title': 'existing'}, headers=headers).get_json()['task']['id']
+    response = client.post('/api/tasks/batch', json={'operations': [
+        {'op': 'update', 'id': ['a'], 'data': {'title': 'x'}},
+        {'op': 'update', 'id': task_id, 'data': ['not', 'a', 'dict']},
+        {'op': 'create', 'data': 'title'},
+        {'op': 'complete', 'id': task_id},
+    ]}, headers=headers)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [result['status'] for result in body['results']] == ['error', 'error', 'error', 'ok']
+    assert Task.query.get(task_id).status == 'done'
+
+
+def test_failed_batch_keeps_etags(client, auth_headers):
+    headers = auth_headers()
+    etag = client.get('/api/tasks', headers=headers).headers['ETag']
+    response = client.post('/api/tasks/batch', json={'operations': [
+        {'op': 'delete', 'id': 'missing'}, {'op': 'unknown'}]}, headers=headers)
+    assert response.get_json()['succeeded'] == 0
+    assert client.get('/api/tasks', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+
+@pytest.mark.benchmark
+def test_batch_throughput_against_per_item_calls(client, auth_headers):
+    """إنشاء ثم تحديث ثم إكمال ثم حذف BENCH_BATCH_SIZE مهمة: طلب batch لكل مرحلة مقابل طلب لكل مهمة"""
+    size = int(os.getenv('BENCH_BATCH_SIZE', 500))
+    headers = auth_headers()
+
+    started = time.perf_counter()
+    ids = [client.post('/api/tasks', json={'title': f'task {i}', 'due_at': '2026-11-01T09:00:00'},
+                       headers=headers).get_json()['task']['id'] for i in range(size)]
+    for task_id in ids:
+        client.patch(f'/api/tasks/{task_id}', json={'priority': 'high'}, headers=headers)
+    for task_id in ids:
+        client.post(f'/api/tasks/{task_id}/complete', headers=headers)
+    for task_id in ids:
+        client.delete(f'/api/tasks/{task_id}', headers=headers)
+    per_item = time.perf_counter() - started
+    assert Task.query.count() == 0
+
+    def batch(operations):
+        response = client.post('/api/tasks/batch', json={'operations': operations}, headers=headers)
+        assert response.get_json()['failed'] == 0
+        return response.get_json()['results']
+
+    started = time.perf_counter()
+    results = batch([{'op': 'create', 'data': {'title': f'task {i}', 'due_at': '2026-11-01T09:00:00'}}
+                     for i in range(size)])
+    ids = [result['id'] for result in results]
+    assert Task.query.filter(Task.due_at.isnot(None)).count() == size
+    batch([{'op': 'update', 'id': task_id, 'data': {'priority': 'high'}} for task_id in ids])
+    batch([{'op': 'complete', 'id': task_id} for task_id in ids])
+    batch([{'op': 'delete', 'id': task_id} for task_id in ids])
+    batched = time.perf_counter() - started
+    assert Task.query.count() == 0
+
+    operations = size * 4
+    print(f'\nper-item: {operations / per_item:,.0f} ops/s, batch: {operations / batched:,.0f} ops/s '
+          f'({per_item / batched:.1f}x)')
+    assert batched * 5 < per_item
@@ -0,0 +1,102 @@
+from datetime import date, datetime, timedelta
+
+from hijri_converter import Gregorian, Hijri
+
+from src.models import db
+from src.models.task import Task
+from src.models.user import User
+from src.routes import calendar
+from src.routes.calendar import GRID_CACHE
+from src.utils.etags import bump_version
+
+
+def test_grid_cache_follows_writes_from_other_workers(client, auth_headers):
+    headers = auth_headers()
+    GRID_CACHE.clear()
+    path = '/api/calendar/grid?view=month&from=2026-11-01'
+    assert client.get(path, headers=headers).get_json()['total_tasks'] == 0
+
+    # كتابة من عملية أخرى: ترفع الإصدار المشترك ولا تصل إلى إبطال الذاكرة المحلية
+    user = User.query.filter_by(email='user@example.com').one()
+    db.session.add(Task(title='elsewhere', owner_id=user.id, created_by=user.id, due_at=datetime(2026, 11, 5, 9)))
+    bump_version(user.id)
+    db.session.commit()
+
+    assert client.get(path, headers=headers).get_json()['total_tasks'] == 1
+
+
+def test_grid_served_from_cache_while_version_is_unchanged(client, auth_headers):
+    headers = auth_headers()
+    GRID_CACHE.clear()
+    path = '/api/calendar/grid?view=month&from=2026-11-01&compact=1'
+    first = client.get(path, headers=headers)
+    hits = GRID_CACHE.stats()['hits']
+    assert client.get(path, headers=headers).get_json() == first.get_json()
+    assert GRID_CACHE.stats()['hits'] == hits + 1
+
+
+def test_compact_grid_keeps_each_occurrence_time(client, auth_headers):
+    headers = auth_headers()
+    GRID_CACHE.clear()
+    client.post('/api/tasks', json={'title': 'standup', 'start_at': '2026-11-01T05:30:00',
+                                    'due_at': '2026-11-01T06:00:00', 'recurrence_rule': 'FREQ=DAILY;COUNT=3'},
+                headers=headers)
+    client.post('/api/tasks', json={'title': 'once', 'due_at': '2026-11-02T10:00:00'}, headers=headers)
+    body = client.get('/api/calendar/grid?view=week&from=2026-11-01&compact=1', headers=headers).get_json()
+
+    standup = next(task_id for task_id, task in body['tasks'].items() if task['title'] == 'standup')
+    assert 'due_at' not in body['tasks'][standup] and 'start_at' not in body['tasks'][standup]
+    assert body['counts'][:4] == [1, 2, 1, 0]
+    assert body['task_ids'][1].count(standup) == 1
+    assert [times for day in body['times'][:3] for times in day if times[0].endswith('06:00:00')] == [
+        ['2026-11-01T06:00:00', '2026-11-01T05:30:00'],
+        ['2026-11-02T06:00:00', '2026-11-02T05:30:00'],
+        ['2026-11-03T06:00:00', '2026-11-03T05:30:00'],
+    ]
+    once_index = body['task_ids'][1].index(next(task_id for task_id in body['task_ids'][1] if task_id != standup))
+    assert body['times'][1][once_index] == ['2026-11-02T10:00:00', None]
+
+
+def test_batch_conversion_of_dates_and_ranges(client):
+    response = client.post('/api/calendar/convert/batch', json={
+        'dates': ['2026-10-18', '2026-02-30', '1800-01-01'],
+        'ranges': [{'start': '2026-12-30', 'end': '2027-01-02'}, {'start': '2026-05-02', 'end': '2026-05-01'}],
+    })
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['conversions'][0] == {'original_date': '2026-10-18',
+                                      'converted_date': '{}-{:02d}-{:02d}'.format(*Gregorian(2026, 10, 18).to_hijri().datetuple())}
+    assert [conversion['converted_date'] for conversion in body['conversions'][1:]] == [None, None]
+    assert all('error' in conversion for conversion in body['conversions'][1:])
+
+    days = body['ranges'][0]['conversions']
+    first = date(2026, 12, 30)
+    assert [day['original_date'] for day in days] == [(first + timedelta(days=i)).isoformat() for i in range(4)]
+    assert [day['converted_date'] for day in days] == [
+        '{}-{:02d}-{:02d}'.format(*Gregorian.fromdate(first + timedelta(days=i)).to_hijri().datetuple()) for i in range(4)]
+    assert body['ranges'][1]['conversions'] == [] and body['ranges'][1]['error']
+    assert body['count'] == 3 + 4
+    assert response.headers['Cache-Control'] == 'public, max-age=86400'
+
+
+def test_batch_conversion_from_hijri_crosses_month_boundary(client):
+    # ربيع الثاني 1448 ثم جمادى الأولى
+    end_of_month = Hijri(1448, 4, 1).month_length()
+    body = client.post('/api/calendar/convert/batch', json={
+        'from': 'hijri', 'to': 'gregorian',
+        'ranges': [{'start': f'1448-04-{end_of_month - 1}', 'end': '1448-05-02'}],
+    }).get_json()
+    days = body['ranges'][0]['conversions']
+    assert [day['original_date'] for day in days] == [
+        f'1448-04-{end_of_month - 1}', f'1448-04-{end_of_month}', '1448-05-01', '1448-05-02']
+    assert [day['converted_date'] for day in days] == [
+        Hijri(*map(int, day['original_date'].split('-'))).to_gregorian().isoformat() for day in days]
+
+
+def test_batch_conversion_enforces_the_day_budget(client, monkeypatch):
+    monkeypatch.setattr(calendar, 'MAX_CONVERT_BATCH', 10)
+    assert client.post('/api/calendar/convert/batch', json={
+        'dates': ['2026-10-18'] * 3, 'ranges': [{'start': '2026-10-01', 'end': '2026-10-08'}]}).status_code == 400
+    assert client.post('/api/calendar/convert/batch', json={
+        'dates': ['2026-10-18'] * 2, 'ranges': [{'start': '2026-10-01', 'end': '2026-10-08'}]}).status_code == 200
+    assert client.post('/api/calendar/convert/batch', json={'dates': []}).status_code == 400
@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+from src.routes import tasks
+
+
+GET_VIEW_RANGE = tasks.get_view_range
+
+
+def freeze_view_clock(monkeypatch, moment):
+    monkeypatch.setattr(tasks, 'get_view_range', lambda view, tz_name, now=None: GET_VIEW_RANGE(view, tz_name, moment))
+
+
+def test_today_etag_changes_at_local_midnight(client, auth_headers, monkeypatch):
+    headers = auth_headers()
+    # 23:30 ثم 00:30 بتوقيت الرياض، في يوم UTC نفسه
+    freeze_view_clock(monkeypatch, datetime(2026, 10, 18, 20, 30, tzinfo=timezone.utc))
+    first = client.get('/api/tasks?view=today', headers=headers)
+    assert client.get('/api/tasks?view=today', headers={
+        **headers, 'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    freeze_view_clock(monkeypatch, datetime(2026, 10, 18, 21, 30, tzinfo=timezone.utc))
+    second = client.get('/api/tasks?view=today', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_time_relative_views_have_no_etag(client, auth_headers):
+    headers = auth_headers()
+    for view in ('overdue', 'upcoming'):
+        assert 'ETag' not in client.get(f'/api/tasks?view={view}', headers=headers).headers
+
+
+def test_write_invalidates_list_etag(client, auth_headers):
+    headers = auth_headers()
+    etag = client.get('/api/tasks', headers=headers).headers['ETag']
+    client.post('/api/tasks', json={'title': 'new task'}, headers=headers)
+    assert client.get('/api/tasks', headers={**headers, 'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+import time
+
+import pytest
+from hijri_converter import Gregorian, Hijri
+
+from src.utils import hijri_calendar
+
+
+def test_table_matches_hijri_converter_across_the_supported_range():
+    first, last = hijri_calendar.GREGORIAN_RANGE
+    for gregorian, hijri in hijri_calendar.iter_days(first, last):
+        assert hijri == Gregorian.fromdate(gregorian).to_hijri().datetuple(), gregorian
+    assert hijri_calendar.gregorian_to_hijri(last) == Gregorian.fromdate(last).to_hijri().datetuple()
+    assert hijri_calendar.gregorian_to_hijri(first - timedelta(days=1)) is None
+    assert hijri_calendar.gregorian_to_hijri(last + timedelta(days=1)) is None
+
+
+def test_hijri_to_gregorian_round_trip():
+    assert hijri_calendar.hijri_to_gregorian(1448, 5, 7) == Hijri(1448, 5, 7).to_gregorian()
+    with pytest.raises(ValueError):
+        hijri_calendar.hijri_to_gregorian(1448, 5, 31)
+
+
+@pytest.mark.benchmark
+def test_table_lookup_against_hijri_converter():
+    """تحويل سنة ميلادية يوماً بيوم: الجدول (بحث لكل يوم ومرور متتابع) مقابل hijri_converter"""
+    first = date(2026, 1, 1)
+    days = [first + timedelta(days=offset) for offset in range(365)]
+    rounds = 20
+
+    def measure(convert):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            convert()
+        return rounds * len(days) / (time.perf_counter() - started)
+
+    converter = measure(lambda: [Gregorian.fromdate(day).to_hijri().datetuple() for day in days])
+    lookup = measure(lambda: [hijri_calendar.gregorian_to_hijri(day) for day in days])
+    sequential = measure(lambda: list(hijri_calendar.iter_days(days[0], days[-1])))
+    print(f'\nhijri_converter: {converter:,.0f} days/s, table lookup: {lookup:,.0f} days/s, '
+          f'iter_days: {sequential:,.0f} days/s')
+    assert lookup > converter * 3
+    assert sequential > converter * 3
@@ -0,0 +1,80 @@
+import io
+import json
+
+from src.models.task import Task
+from src.routes import ai
+
+
+def ingest(client, headers, documents, **kwargs):
+    response = client.post('/api/ai/ingest', json={'documents': documents}, headers=headers, **kwargs)
+    return response, [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_document_error_is_reported_without_cutting_the_stream(client, auth_headers, monkeypatch):
+    original = ai.extract_tasks
+
+    def flaky(text, now):
+        if 'boom' in text:
+            raise RuntimeError('parser failure')
+        return original(text, now)
+
+    monkeypatch.setattr(ai, 'extract_tasks', flaky)
+    response, records = ingest(client, auth_headers(), ['مهمة: مراجعة التقرير', 'boom', 'todo: call the bank'])
+
+    assert response.status_code == 200
+    assert records[1] == {'document': 1, 'error': 'parser failure'}
+    assert records[-1]['status'] == 'done'
+    assert records[-1]['created'] == 2
+    assert Task.query.count() == 2
+
+
+def test_local_due_dates_are_stored_as_utc(client, auth_headers):
+    # توقيت المستخدم الافتراضي هو الرياض (UTC+3)
+    _, records = ingest(client, auth_headers(), ['todo: call the bank tomorrow at 3pm'])
+    assert records[-1]['created'] == 1
+    task = Task.query.one()
+    assert (task.due_at.hour, task.due_at.minute) == (12, 0)
+
+
+class CountingStream(io.BytesIO):
+    """مجرى إدخال يسجل عدد البايتات المقروءة منه"""
+
+    consumed = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.consumed += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.consumed += count
+        return count
+
+
+def test_body_size_is_bounded_while_reading_without_content_length(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(ai, 'MAX_INGEST_BYTES', 1000)
+    stream = CountingStream(json.dumps({'documents': ['مهمة: ' + 'ا' * 200000]}).encode())
+    # طلب مجزأ بلا Content-Length كما يرسله عميل يبث الجسم
+    response = client.post('/api/ai/ingest', input_stream=stream, headers={
+        **auth_headers(), 'Content-Type': 'application/json', 'Transfer-Encoding': 'chunked'
+    }, environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
+    # القراءة توقفت قرب الحد بدلاً من تخزين الجسم كله
+    assert stream.consumed < 100000
+
+
+def test_declared_content_length_over_limit_is_rejected(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(ai, 'MAX_INGEST_BYTES', 100)
+    response, _ = ingest(client, auth_headers(), ['مهمة: ' + 'ا' * 200])
+    assert response.status_code == 413
+    assert Task.query.count() == 0
+
+
+def test_multipart_files_within_limit_are_ingested(client, auth_headers):
+    response = client.post('/api/ai/ingest', headers=auth_headers(), content_type='multipart/form-data', data={
+        'files': [(io.BytesIO('مهمة: مراجعة العقد'.encode()), 'a.txt'), (io.BytesIO(b'todo: call the bank'), 'b.txt')]
+    })
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+    assert response.status_code == 200
+    assert records[-1]['created'] == 2
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models import db
+from src.models.task import Task
+from src.models.task_occurrence import Occurrence
+from src.models.user import User
+from src.utils import occurrence_index
+
+NOW = datetime(2026, 10, 18)
+
+
+@pytest.fixture
+def index(client, monkeypatch):
+    monkeypatch.setattr(occurrence_index, 'ENABLED', True)
+    db.session.add(User(id='u1', name='Owner', email='owner@example.com', password_hash='x'))
+    db.session.commit()
+    return occurrence_index
+
+
+def add_task(task_id, rule='FREQ=DAILY', due_at=datetime(2026, 1, 1, 9)):
+    db.session.add(Task(id=task_id, title=task_id, owner_id='u1', created_by='u1', due_at=due_at,
+                        recurrence_rule=rule))
+    db.session.commit()
+
+
+def test_covers_uses_materialized_horizon(index):
+    add_task('daily')
+    assert not index.covers(NOW)
+    index.extend_horizon(NOW)
+    assert index.materialized_horizon() == index.horizon(NOW)
+    assert index.covers(index.horizon(NOW))
+    assert not index.covers(index.horizon(NOW) + timedelta(days=1))
+
+
+def test_extension_ignores_rows_inserted_concurrently(index):
+    add_task('daily')
+    # نسخ أدرجها طلب كتابة أو عملية أخرى قبل التمديد
+    db.session.add(Occurrence(task_id='daily', owner_id='u1', occurs_at=datetime(2026, 1, 1, 9)))
+    db.session.commit()
+    index.extend_horizon(NOW)
+    assert index.covers(index.horizon(NOW))
+    assert Occurrence.query.filter_by(task_id='daily', occurs_at=datetime(2026, 1, 1, 9)).count() == 1
+
+
+def test_truncated_task_lowers_horizon(index, monkeypatch):
+    monkeypatch.setattr(index, 'MAX_MATERIALIZED_OCCURRENCES', 10)
+    add_task('dense', rule='FREQ=DAILY;BYHOUR=1,2,3,4,5')
+    index.extend_horizon(NOW)
+    last = db.session.query(db.func.max(Occurrence.occurs_at)).scalar()
+    assert index.materialized_horizon() == last
+    assert not index.covers(last + timedelta(hours=1))
+
+
+def test_failed_batch_does_not_advance_horizon(index, monkeypatch):
+    add_task('daily')
+
+    def failing(rows):
+        raise RuntimeError('lost connection')
+
+    monkeypatch.setattr(index, '_insert_occurrences', failing)
+    index.extend_horizon(NOW)
+    assert index.materialized_horizon() is None
+    assert not index.covers(NOW)
+
+
+def test_listing_reads_occurrences_from_index(index, auth_headers, client):
+    headers = auth_headers()
+    response = client.post('/api/tasks', json={'title': 'weekly', 'due_at': '2026-10-05T09:00:00',
+                                               'recurrence_rule': 'FREQ=WEEKLY'}, headers=headers)
+    task_id = response.get_json()['task']['id']
+    index.extend_horizon()
+    assert Occurrence.query.filter_by(task_id=task_id).count() > 0
+    tasks = client.get('/api/tasks?from=2026-11-01T00:00:00&to=2026-11-30T00:00:00',
+                       headers=headers).get_json()['tasks']
+    assert [len(task['occurrences']) for task in tasks] == [4]
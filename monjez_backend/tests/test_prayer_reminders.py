@@ -0,0 +1,30 @@
+from src.utils.reminder_scheduler import ReminderScheduler, MemorySink, reminder_scheduler
+
+
+def test_preferences_saved_by_any_worker_reach_the_scheduler_process(client, auth_headers):
+    headers = auth_headers()
+    # هذه العملية ليست عملية المُجدول: الحفظ فقط دون مدخلات في الكومة المحلية
+    assert not reminder_scheduler.is_running
+    response = client.post('/api/prayer-times/reminders', json={'prayers': ['fajr'], 'city': 'riyadh'},
+                           headers=headers)
+    assert response.status_code == 201
+    assert len(reminder_scheduler) == 0
+
+    scheduler = ReminderScheduler(sink=MemorySink())
+    assert scheduler.sync_preferences() == 1
+    assert len(scheduler) == 1
+    # لا تغيير منذ آخر استطلاع
+    assert scheduler.sync_preferences() == 0
+
+    client.delete('/api/prayer-times/reminders', headers=headers)
+    assert scheduler.sync_preferences() == 1
+    assert len(scheduler) == 0
+
+
+def test_city_replaces_saved_coordinates(client, auth_headers):
+    headers = auth_headers()
+    client.post('/api/prayer-times/reminders', json={'lat': 21.4, 'lng': 39.8}, headers=headers)
+    preferences = client.post('/api/prayer-times/reminders', json={'city': 'dammam'},
+                              headers=headers).get_json()['preferences']
+    assert preferences['city'] == 'dammam'
+    assert preferences['latitude'] is None and preferences['longitude'] is None
@@ -0,0 +1,104 @@
+from datetime import date, datetime, timezone
+import re
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.utils.prayer_calc import compute_prayer_times, prayer_times_for, resolve_location
+from src.utils.prayer_timetable import compute_timetable, format_minutes
+from src.utils.etags import until_local_midnight
+
+
+def test_range_outside_umm_al_qura_table(client):
+    response = client.get('/api/prayer-times/range?city=riyadh&start_date=2080-01-01&end_date=2080-01-03')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['hijri_dates'] == [None, None, None]
+    assert all(data['times'][key]['isha'][0] for key in data['times'])
+
+
+def test_timetable_matches_scalar_engine_across_table_edge():
+    location = resolve_location('riyadh')
+    # 1446-09-01 (رمضان) داخل الجدول، و 2077-11-15..2077-11-20 يعبر نهايته
+    for start, end in ((date(2025, 2, 27), date(2025, 3, 3)), (date(2077, 11, 15), date(2077, 11, 20))):
+        days, timetable = compute_timetable([location], start, end)
+        isha = format_minutes(timetable['isha'][0])
+        assert isha == [prayer_times_for(location, day)['isha'] for day in days]
+
+
+def test_cache_lifetime_stops_at_local_midnight():
+    # 23:59:30 بتوقيت الرياض
+    assert until_local_midnight('Asia/Riyadh', now=datetime(2026, 10, 18, 20, 59, 30, tzinfo=timezone.utc)) \
+        == 'public, max-age=30'
+    assert until_local_midnight('Asia/Riyadh', now=datetime(2026, 10, 18, 9, 0, tzinfo=timezone.utc)) \
+        == 'public, max-age=3600'
+
+
+def test_default_start_date_follows_location_day_and_midnight(client):
+    today = datetime.now(ZoneInfo('Asia/Riyadh')).date().isoformat()
+    for path in ('/api/prayer-times/week?city=riyadh', '/api/prayer-times/range?city=riyadh'):
+        response = client.get(path)
+        assert response.get_json()['start_date'] == today
+        max_age = int(re.search(r'max-age=(\d+)', response.headers['Cache-Control']).group(1))
+        seconds_to_midnight = (datetime.combine(date.fromisoformat(today), datetime.min.time(),
+                                                ZoneInfo('Asia/Riyadh')).timestamp() + 86400
+                               - datetime.now(timezone.utc).timestamp())
+        assert max_age <= min(3600, seconds_to_midnight + 1)
+
+    explicit = client.get('/api/prayer-times/week?city=riyadh&start_date=2026-10-18')
+    assert explicit.headers['Cache-Control'] == 'public, max-age=86400'
+
+
+def minutes(hhmm):
+    hours, mins = map(int, hhmm.split(':'))
+    return hours * 60 + mins
+
+
+def test_umm_al_qura_matches_published_riyadh_times():
+    # تقويم أم القرى للرياض، 18 أكتوبر 2026 (بهامش دقيقتين)
+    published = {'fajr': '04:35', 'sunrise': '05:53', 'dhuhr': '11:38', 'asr': '14:57', 'maghrib': '17:23',
+                 'isha': '18:53'}
+    calculated = prayer_times_for(resolve_location('riyadh'), date(2026, 10, 18))
+    for prayer, expected in published.items():
+        assert abs(minutes(calculated[prayer]) - minutes(expected)) <= 2, (prayer, calculated[prayer])
+
+
+def test_method_asr_school_and_ramadan_rules():
+    riyadh = resolve_location('riyadh')
+    regular = prayer_times_for(riyadh, date(2026, 10, 18))
+    ramadan = prayer_times_for(riyadh, date(2026, 3, 1))  # 12 رمضان 1447
+    assert minutes(regular['isha']) - minutes(regular['maghrib']) == 90
+    assert minutes(ramadan['isha']) - minutes(ramadan['maghrib']) == 120
+
+    hanafi = prayer_times_for(riyadh, date(2026, 10, 18), asr='hanafi')
+    assert minutes(hanafi['asr']) > minutes(regular['asr'])
+    isna = prayer_times_for(riyadh, date(2026, 10, 18), 'isna')
+    assert minutes(isna['fajr']) > minutes(regular['fajr'])
+
+
+def test_location_changes_times():
+    day = date(2026, 10, 18)
+    # جدة غرب الدمام بأكثر من 10 درجات طول: الظهر متأخر بأكثر من 40 دقيقة
+    jeddah, dammam = prayer_times_for(resolve_location('jeddah'), day), prayer_times_for(resolve_location('dammam'), day)
+    assert minutes(jeddah['dhuhr']) - minutes(dammam['dhuhr']) > 40
+    custom = resolve_location(latitude='21.4858', longitude='39.1925', tz_name='Asia/Riyadh')
+    assert prayer_times_for(custom, day) == jeddah
+
+    with pytest.raises(ValueError):
+        resolve_location('atlantis')
+    with pytest.raises(ValueError):
+        resolve_location(latitude=95, longitude=0)
+
+
+def test_route_uses_city_and_memoizes(client):
+    compute_prayer_times.cache_clear()
+    response = client.get('/api/prayer-times?city=jeddah&date=2026-10-18')
+    times = response.get_json()['prayer_times']
+    expected = prayer_times_for(resolve_location('jeddah'), date(2026, 10, 18))
+    assert {prayer: value['time'] for prayer, value in times.items()} == \
+        {prayer: expected[prayer] for prayer in ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha')}
+
+    misses = compute_prayer_times.cache_info().misses
+    client.get('/api/prayer-times?city=jeddah&date=2026-10-18')
+    assert compute_prayer_times.cache_info().misses == misses
+    assert client.get('/api/prayer-times?city=atlantis').status_code == 400
@@ -0,0 +1,43 @@
+from datetime import datetime
+import time
+
+import pytest
+
+from src.models.task import Task
+from src.utils.recurrence import expand_task, validate_rule
+
+
+@pytest.mark.parametrize('rule', ['FREQ=SECONDLY', 'FREQ=MINUTELY;INTERVAL=5', 'RRULE:FREQ=HOURLY'])
+def test_sub_daily_frequencies_are_rejected(rule):
+    with pytest.raises(ValueError):
+        validate_rule(rule)
+
+
+def test_create_task_rejects_sub_daily_rule(client, auth_headers):
+    response = client.post('/api/tasks', json={'title': 'every second', 'due_at': '2020-01-01T00:00:00',
+                                               'recurrence_rule': 'FREQ=SECONDLY'}, headers=auth_headers())
+    assert response.status_code == 400
+
+
+def test_stored_sub_daily_rule_is_not_expanded():
+    # قاعدة محفوظة قبل التحقق: تُعامل كمهمة عادية بدل المشي من 2000 ثانية بثانية
+    task = Task(id='legacy', title='legacy', owner_id='u', created_by='u', due_at=datetime(2000, 1, 1),
+                recurrence_rule='FREQ=SECONDLY', updated_at=datetime(2020, 1, 1))
+    started = time.perf_counter()
+    occurrences = expand_task(task, datetime(2026, 1, 1), datetime(2026, 2, 1))
+    assert occurrences == []
+    assert time.perf_counter() - started < 0.5
+
+
+def test_daily_rule_still_expands():
+    task = Task(id='daily', title='daily', due_at=datetime(2026, 1, 1, 9), recurrence_rule='FREQ=DAILY',
+                updated_at=datetime(2026, 1, 1))
+    assert len(expand_task(task, datetime(2026, 1, 1), datetime(2026, 1, 7, 23))) == 7
+
+
+def test_update_task_rejects_sub_daily_rule(client, auth_headers):
+    headers = auth_headers()
+    task_id = client.post('/api/tasks', json={'title': 'daily', 'recurrence_rule': 'FREQ=DAILY',
+                                              'due_at': '2026-01-01T09:00:00'}, headers=headers).get_json()['task']['id']
+    response = client.patch(f'/api/tasks/{task_id}', json={'recurrence_rule': 'FREQ=MINUTELY'}, headers=headers)
+    assert response.status_code == 400
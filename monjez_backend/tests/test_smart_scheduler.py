@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils.prayer_calc import resolve_location
+from src.utils.smart_scheduler import SlotTree, build_schedule
+
+# الأحد 18 أكتوبر 2026، السادسة صباحاً UTC (التاسعة بتوقيت الرياض)
+NOW = datetime(2026, 10, 18, 6, 0)
+
+
+def make_task(index, priority='med', due_at=None):
+    return SimpleNamespace(id=str(index), priority=priority, due_at=due_at, start_at=None,
+                           created_at=NOW + timedelta(seconds=index))
+
+
+def first_fit(free, length):
+    """المرجع الخطي لـ SlotTree.find"""
+    run = 0
+    for index, value in enumerate(free):
+        run = run + 1 if value else 0
+        if run == length:
+            return index - length + 1
+    return -1
+
+
+def test_slot_tree_matches_linear_scan():
+    rng = random.Random(3)
+    free = bytearray(rng.random() < 0.7 for _ in range(500))
+    tree = SlotTree(free)
+    for _ in range(300):
+        length = rng.randint(1, 8)
+        start = tree.find(length)
+        assert start == first_fit(free, length)
+        if start >= 0:
+            tree.occupy(start, start + length)
+            free[start:start + length] = bytes(length)
+
+
+def test_schedule_respects_priority_and_busy_blocks():
+    location = resolve_location('riyadh')
+    busy = [(NOW, NOW + timedelta(hours=2))]
+    tasks = [make_task(0, 'low'), make_task(1, 'urgent'), make_task(2, 'high')]
+    placements = {item['task'].id: item for item in build_schedule(tasks, busy, location, NOW)}
+
+    assert placements['1']['start'] < placements['2']['start'] < placements['0']['start']
+    starts = sorted((item['start'], item['end']) for item in placements.values())
+    assert starts[0][0] >= busy[0][1]
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(starts, starts[1:]))
+
+
+@pytest.mark.benchmark
+def test_schedule_thousands_of_tasks():
+    """جدولة BENCH_SCHEDULE_TASKS مهمة (افتراضياً 5000) على سنة مع آلاف الفترات المحجوزة"""
+    task_count = int(os.getenv('BENCH_SCHEDULE_TASKS', 5000))
+    rng = random.Random(11)
+    location = resolve_location('riyadh')
+    tasks = [make_task(index, rng.choice(('low', 'med', 'high', 'urgent')),
+                       NOW + timedelta(days=rng.randrange(365))) for index in range(task_count)]
+    durations = {task.id: rng.choice((15, 30, 45, 60, 90, 120)) for task in tasks}
+    busy = []
+    for _ in range(task_count):
+        start = NOW + timedelta(minutes=15 * rng.randrange(365 * 96))
+        busy.append((start, start + timedelta(minutes=15 * rng.randint(1, 8))))
+
+    started = time.perf_counter()
+    placements = build_schedule(tasks, busy, location, NOW, horizon_days=365, durations=durations,
+                                include_weekend=True, work_end='22:00')
+    elapsed = time.perf_counter() - started
+
+    scheduled = [item for item in placements if item['start'] is not None]
+    print(f'\nscheduled {len(scheduled):,}/{task_count:,} tasks around {len(busy):,} busy blocks in {elapsed:.2f}s')
+    assert len(placements) == task_count
+    assert elapsed < 5
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+import base64
+import json
+
+from src.models import db
+from src.models.task import Task
+from src.models.user import User
+from src.routes.sync import encode_sync_token
+
+
+def current_user_id():
+    return User.query.filter_by(email='user@example.com').one().id
+
+
+def test_full_sync_pages_through_tasks_older_than_retention(client, auth_headers):
+    headers = auth_headers()
+    user_id = current_user_id()
+    old = datetime.utcnow() - timedelta(days=200)
+    for index in range(5):
+        db.session.add(Task(title=f'old {index}', owner_id=user_id, created_by=user_id,
+                            created_at=old, updated_at=old + timedelta(minutes=index)))
+    db.session.commit()
+
+    seen = []
+    token = None
+    for _ in range(5):
+        response = client.get('/api/sync', query_string={'limit': 2, **({'since': token} if token else {})},
+                              headers=headers)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        seen.extend(task['title'] for task in body['changed'])
+        token = body['next_token']
+        if not body['has_more']:
+            break
+    assert seen == [f'old {index}' for index in range(5)]
+
+    # الرمز الأخير متزامن: لا تغييرات جديدة
+    body = client.get('/api/sync', query_string={'since': token}, headers=headers).get_json()
+    assert body['changed'] == [] and body['deleted'] == []
+
+
+def test_incremental_sync_delivers_changes_and_tombstones(client, auth_headers):
+    headers = auth_headers()
+    kept = client.post('/api/tasks', json={'title': 'kept'}, headers=headers).get_json()['task']['id']
+    removed = client.post('/api/tasks', json={'title': 'removed'}, headers=headers).get_json()['task']['id']
+    token = client.get('/api/sync', headers=headers).get_json()['next_token']
+
+    client.patch(f'/api/tasks/{kept}', json={'status': 'done'}, headers=headers)
+    client.delete(f'/api/tasks/{removed}', headers=headers)
+    body = client.get('/api/sync', query_string={'since': token}, headers=headers).get_json()
+
+    assert [task['id'] for task in body['changed']] == [kept]
+    assert body['changed'][0]['status'] == 'done'
+    assert body['deleted'] == [removed]
+
+
+def test_session_older_than_retention_requires_full_resync(client, auth_headers):
+    headers = auth_headers()
+    old = datetime.utcnow() - timedelta(days=100)
+    legacy = base64.urlsafe_b64encode(json.dumps([old.isoformat(), '']).encode()).decode()
+    for token in (encode_sync_token(old, issued_at=old), legacy):
+        response = client.get('/api/sync', query_string={'since': token}, headers=headers)
+        assert response.status_code == 410
+        assert response.get_json()['full_resync'] is True
+
+    assert client.get('/api/sync', query_string={'since': 'not-a-token'}, headers=headers).status_code == 400
@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta
+import os
+import random
+import time
+import uuid
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+
+from src.models import db
+from src.models.task import Label, Project, Task, Team
+from src.models.user import User
+
+STATUSES = ('todo', 'in_progress', 'done', 'archived')
+PRIORITIES = ('low', 'med', 'high', 'urgent')
+
+# تركيبات الفلاتر الشائعة في قائمة المهام: (المعاملات، الفهرس المتوقع)
+FILTER_COMBINATIONS = [
+    ({}, 'ix_tasks_owner_due'),
+    ({'status': 'todo'}, 'ix_tasks_owner_status_due'),
+    ({'priority': 'high'}, 'ix_tasks_owner_priority_due'),
+    ({'project_id': 'PROJECT'}, 'ix_tasks_owner_project_due'),
+    ({'from': '2026-01-01T00:00:00', 'to': '2026-01-31T00:00:00'}, 'ix_tasks_owner_due'),
+]
+
+
+def seed_tasks(user_count, task_count, batch_size=50000):
+    """بذر مستخدمين ومشاريع ومهام بإدراج جماعي؛ يعيد [(معرف المستخدم، معرف مشروعه)]"""
+    rng = random.Random(42)
+    now = datetime(2026, 1, 1)
+    owners = [(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(user_count)]
+    db.session.execute(insert(User), [
+        {'id': user_id, 'name': 'u', 'email': f'{user_id}@example.com', 'password_hash': 'x',
+         'created_at': now, 'updated_at': now} for user_id, _ in owners])
+    db.session.execute(insert(Project), [
+        {'id': project_id, 'name': 'p', 'owner_id': user_id, 'created_at': now, 'updated_at': now}
+        for user_id, project_id in owners])
+    for offset in range(0, task_count, batch_size):
+        rows = []
+        for _ in range(min(batch_size, task_count - offset)):
+            user_id, project_id = owners[rng.randrange(user_count)]
+            rows.append({
+                'id': str(uuid.uuid4()), 'title': 'task', 'owner_id': user_id, 'created_by': user_id,
+                'status': rng.choice(STATUSES), 'priority': rng.choice(PRIORITIES),
+                'project_id': project_id if rng.random() < 0.5 else None,
+                'due_at': now + timedelta(minutes=rng.randrange(365 * 24 * 60)) if rng.random() < 0.9 else None,
+                'created_at': now, 'updated_at': now,
+            })
+        db.session.execute(insert(Task), rows)
+    db.session.commit()
+    return owners
+
+
+def list_params(params, project_id):
+    return {key: project_id if value == 'PROJECT' else value for key, value in params.items()}
+
+
+@pytest.mark.parametrize('params,index_name', FILTER_COMBINATIONS)
+def test_listing_filters_use_composite_indexes(client, query_log, params, index_name):
+    (user_id, project_id), = seed_tasks(user_count=1, task_count=50)
+    db.session.execute(db.text('ANALYZE'))
+    headers = {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+    query_log.clear()
+    assert client.get('/api/tasks', query_string=list_params(params, project_id), headers=headers).status_code == 200
+
+    statement, parameters = next((statement, parameters) for statement, parameters in query_log
+                                 if statement.lstrip().startswith('SELECT') and 'FROM tasks' in statement)
+    plan = ' | '.join(row[-1] for row in db.session.connection().exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {statement}', parameters))
+    assert index_name in plan, plan
+    assert 'SCAN tasks' not in plan.replace(f'SCAN tasks USING INDEX {index_name}', ''), plan
+
+
+def test_cursor_pages_cover_every_task_once_in_order(client, auth_headers):
+    headers = auth_headers()
+    dues = ['2026-11-03T09:00:00', '2026-11-01T09:00:00', None, '2026-11-01T09:00:00',
+            '2026-11-02T09:00:00', None, '2026-11-01T09:00:00']
+    created = [client.post('/api/tasks', json={'title': f'task {index}', 'due_at': due}, headers=headers)
+               .get_json()['task'] for index, due in enumerate(dues)]
+    # الترتيب: due_at تصاعدياً والفارغ أخيراً، ثم المعرّف لكسر التعادل
+    expected = [task['id'] for task in sorted(created, key=lambda task: (task['due_at'] is None,
+                                                                        task['due_at'] or '', task['id']))]
+
+    seen = []
+    cursor = None
+    while True:
+        body = client.get('/api/tasks', query_string={'limit': 3, **({'cursor': cursor} if cursor else {})},
+                          headers=headers).get_json()
+        assert len(body['tasks']) <= 3
+        seen.extend(task['id'] for task in body['tasks'])
+        if not body['has_more']:
+            assert body['next_cursor'] is None
+            break
+        cursor = body['next_cursor']
+    assert seen == expected
+
+
+def test_fields_projection_loads_only_requested_columns(client, auth_headers, query_log):
+    headers = auth_headers()
+    client.post('/api/tasks', json={'title': 'projected', 'description': 'long text'}, headers=headers)
+    query_log.clear()
+    body = client.get('/api/tasks?fields=title,status', headers=headers).get_json()
+
+    # id و due_at يُضافان دائماً لأن المؤشر يعتمد عليهما
+    assert body['tasks'] == [{'id': body['tasks'][0]['id'], 'due_at': None, 'title': 'projected', 'status': 'todo'}]
+    select = next(statement for statement, _ in query_log if 'FROM tasks' in statement)
+    assert 'tasks.description' not in select and 'tasks.title' in select
+
+
+def test_invalid_listing_parameters_are_rejected(client, auth_headers):
+    headers = auth_headers()
+    assert client.get('/api/tasks?fields=title,password', headers=headers).status_code == 400
+    assert client.get('/api/tasks?cursor=garbage', headers=headers).status_code == 400
+    assert client.get('/api/tasks?limit=abc', headers=headers).status_code == 400
+
+def listing_query_count(client, query_log, task_count, path):
+    """عدد جمل SQL لطلب قائمة بعد بذر task_count مهمة مع كل علاقاتها"""
+    db.drop_all()
+    db.create_all()
+    user = User(name='u', email='u@example.com', password_hash='x')
+    members = [User(name='m', email=f'm{i}@example.com', password_hash='x') for i in range(3)]
+    team = Team(name='team', owner=user, members=[user, *members])
+    project = Project(name='project', owner=user, team=team)
+    labels = [Label(name=f'label {i}', owner=user) for i in range(3)]
+    for index in range(task_count):
+        task = Task(title=f'task {index}', owner=user, creator=user, project=project, team=team, labels=labels)
+        task.subtasks = [Task(title='subtask', owner=user, creator=user)]
+        db.session.add(task)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    db.session.expunge_all()
+
+    query_log.clear()
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    response.get_data()  # التصدير يُبث فتُنفذ استعلاماته أثناء قراءة الجسم
+    return len(query_log), response
+
+
+@pytest.mark.parametrize('path', [
+    '/api/tasks?include=labels,subtasks,project,team&limit=200',
+    '/api/tasks/export?include=labels,subtasks,project,team',
+])
+def test_includes_use_constant_number_of_queries(client, query_log, path):
+    few, _ = listing_query_count(client, query_log, 3, path)
+    many, response = listing_query_count(client, query_log, 60, path)
+    assert many == few, query_log
+    if path.startswith('/api/tasks?'):
+        task = next(task for task in response.get_json()['tasks'] if task['project'])
+        assert task['team']['member_count'] == 4
+        assert len(task['labels']) == 3 and len(task['subtasks']) == 1
+
+
+@pytest.mark.benchmark
+def test_listing_p95_latency(client):
+    """p95 لتركيبات الفلاتر الشائعة فوق BENCH_TASKS مهمة لـ BENCH_USERS مستخدم (افتراضياً مليون / 10 آلاف)"""
+    task_count = int(os.getenv('BENCH_TASKS', 1000000))
+    user_count = int(os.getenv('BENCH_USERS', 10000))
+    requests_per_combination = int(os.getenv('BENCH_REQUESTS', 200))
+    p95_limit_ms = float(os.getenv('BENCH_P95_MS', 50))
+
+    started = time.perf_counter()
+    owners = seed_tasks(user_count, task_count)
+    db.session.execute(db.text('ANALYZE'))
+    print(f'\nseeded {task_count:,} tasks / {user_count:,} users in {time.perf_counter() - started:.1f}s')
+
+    rng = random.Random(7)
+    tokens = {}
+    failures = []
+    for params, _ in FILTER_COMBINATIONS:
+        latencies = []
+        for _ in range(requests_per_combination):
+            user_id, project_id = owners[rng.randrange(user_count)]
+            if user_id not in tokens:
+                tokens[user_id] = create_access_token(identity=user_id)
+            request_started = time.perf_counter()
+            response = client.get('/api/tasks', query_string=list_params(params, project_id),
+                                  headers={'Authorization': f'Bearer {tokens[user_id]}'})
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            assert response.status_code == 200
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'{params or "all"}: p50={latencies[len(latencies) // 2]:.1f}ms p95={p95:.1f}ms')
+        if p95 > p95_limit_ms:
+            failures.append((params, p95))
+    assert not failures, failures
+
+
+def make_tree(headers, client):
+    """root ← (a ← (a1 منجزة، a2)، b منجزة)"""
+    def create(title, parent=None, status='todo'):
+        response = client.post('/api/tasks', json={'title': title, 'parent_task_id': parent, 'status': status},
+                               headers=headers)
+        return response.get_json()['task']['id']
+    root = create('root')
+    a = create('a', root)
+    create('a1', a, 'done')
+    create('a2', a)
+    create('b', root, 'done')
+    return root, a
+
+
+def test_task_tree_nests_subtasks_with_rollups(client, auth_headers):
+    headers = auth_headers()
+    root, _ = make_tree(headers, client)
+    body = client.get(f'/api/tasks/{root}/tree', headers=headers).get_json()
+
+    tree = body['tree']
+    assert (body['node_count'], body['truncated']) == (5, False)
+    assert [child['title'] for child in tree['children']] == ['a', 'b']
+    assert [child['title'] for child in tree['children'][0]['children']] == ['a1', 'a2']
+    # الإحصاءات تعد الأحفاد دون العقدة نفسها
+    assert (tree['total_count'], tree['done_count'], tree['progress']) == (4, 2, 0.5)
+    a, b = tree['children']
+    assert (a['total_count'], a['done_count']) == (2, 1)
+    assert (b['total_count'], b['done_count'], b['children']) == (0, 0, [])
+
+
+def test_task_tree_depth_limit_is_flagged(client, auth_headers):
+    headers = auth_headers()
+    root, _ = make_tree(headers, client)
+    body = client.get(f'/api/tasks/{root}/tree?depth=1', headers=headers).get_json()
+
+    a, b = body['tree']['children']
+    assert (body['node_count'], body['truncated']) == (3, True)
+    assert (a['truncated'], a['children'], b['truncated']) == (True, [], False)
+    assert body['tree']['total_count'] == 2
+
+
+def test_task_tree_stops_at_cycles(client, auth_headers):
+    headers = auth_headers()
+    root, a = make_tree(headers, client)
+    # دورة مخزنة مباشرة: الجذر ابن لأحد أحفاده
+    Task.query.get(root).parent_task_id = a
+    db.session.commit()
+    body = client.get(f'/api/tasks/{root}/tree', headers=headers).get_json()
+    assert (body['node_count'], body['tree']['total_count']) == (5, 4)
+
+
+def test_task_tree_of_another_user_is_not_found(client, auth_headers):
+    root, _ = make_tree(auth_headers(), client)
+    assert client.get(f'/api/tasks/{root}/tree', headers=auth_headers('other@example.com')).status_code == 404
@@ -0,0 +1,86 @@
+from datetime import datetime
+import time
+
+import pytest
+
+from src.utils.text_parser import extract_tasks, parse_datetime, should_escalate
+
+# الأحد 18 أكتوبر 2026، العاشرة صباحاً
+NOW = datetime(2026, 10, 18, 10, 0)
+
+# مدوّنة موسومة: (السطر، العنوان المتوقع، الموعد المتوقع أو None)
+CORPUS = [
+    ('مهمة: شراء خبز بكرة الساعة ٣', 'شراء خبز', datetime(2026, 10, 19, 15, 0)),
+    ('مهمة: مراجعة الاحداث', 'مراجعة الاحداث', None),
+    ('مهمة: التقرير بعد يومين', 'التقرير', datetime(2026, 10, 20)),
+    ('مهمة: تسليم العرض يوم الخميس', 'تسليم العرض', datetime(2026, 10, 22)),
+    ('مهمة: زيارة الوالدة الأسبوع القادم', 'زيارة الوالدة', datetime(2026, 10, 25)),
+    ('لازم أراجع الميزانية اليوم الساعة 4 مساءً', 'أراجع الميزانية', datetime(2026, 10, 18, 16, 0)),
+    ('اجتماع مع الفريق بعد بكرة الساعة 10 صباحاً', 'اجتماع مع الفريق', datetime(2026, 10, 20, 10, 0)),
+    ('مهمة: تجديد الإقامة خلال 3 أسابيع', 'تجديد الإقامة', datetime(2026, 11, 8)),
+    ('مهمة: دفع الفاتورة 25/10', 'دفع الفاتورة', datetime(2026, 10, 25)),
+    ('todo: call at 3', 'call', datetime(2026, 10, 18, 15, 0)),
+    ('todo: release in 2025', 'release in 2025', None),
+    ('task: ship the build in 3 days', 'ship the build', datetime(2026, 10, 21)),
+    ('task: review PR tomorrow at 9am', 'review PR', datetime(2026, 10, 19, 9, 0)),
+    ('need to renew passport next Tuesday', 'renew passport', datetime(2026, 10, 20)),
+    ('meeting with Sara on 2026-11-02 at 14:30', 'meeting with Sara', datetime(2026, 11, 2, 14, 30)),
+    ('remember to water plants tonight', 'water plants', datetime(2026, 10, 18)),
+    ('- update the report on sunday', 'update the report', datetime(2026, 10, 25)),
+    ('todo: plan offsite in 900 days', 'plan offsite in 900 days', None),
+    ('1. prepare slides in 2 hours', 'prepare slides', datetime(2026, 10, 18, 12, 0)),
+    ('call the bank day after tomorrow', 'call the bank', datetime(2026, 10, 20)),
+]
+
+
+def test_time_without_marker_after_at():
+    # نمط "at N" كان بمجموعتين فقط فيرفع IndexError
+    due, spans, boost = parse_datetime('call at 3', NOW)
+    assert due == datetime(2026, 10, 18, 15, 0)
+    assert spans and boost > 0
+
+
+def test_arabic_weekday_requires_word_boundary():
+    tasks, _ = extract_tasks('مهمة: مراجعة الاحداث', NOW)
+    assert tasks[0]['title'] == 'مراجعة الاحداث'
+    assert tasks[0]['due_date'] is None
+
+
+def test_relative_date_requires_unit_and_bounded_amount():
+    assert parse_datetime('release in 2025', NOW)[0] is None
+    assert parse_datetime('plan in 900 days', NOW)[0] is None
+    assert parse_datetime('within 2 weeks', NOW)[0] == datetime(2026, 11, 1)
+
+
+def test_escalation_policy():
+    tasks, confidence = extract_tasks('مهمة: شراء خبز بكرة الساعة ٣', NOW)
+    assert not should_escalate(tasks, confidence)
+    assert should_escalate([], 0.0)
+    assert should_escalate(tasks, confidence, mode='always')
+
+
+def test_labelled_corpus_accuracy():
+    correct = 0
+    failures = []
+    for line, title, due in CORPUS:
+        tasks, _ = extract_tasks(line, NOW)
+        got = (tasks[0]['title'], tasks[0]['due_date']) if tasks else (None, None)
+        expected = (title, due.isoformat() if due else None)
+        if got == expected:
+            correct += 1
+        else:
+            failures.append((line, got, expected))
+    assert correct / len(CORPUS) >= 0.95, failures
+
+
+@pytest.mark.benchmark
+def test_local_parser_throughput():
+    text = '\n'.join(line for line, _, _ in CORPUS)
+    rounds = 500
+    started = time.perf_counter()
+    for _ in range(rounds):
+        extract_tasks(text, NOW)
+    elapsed = time.perf_counter() - started
+    lines_per_second = rounds * len(CORPUS) / elapsed
+    print(f'\nlocal parser: {lines_per_second:,.0f} lines/s')
+    assert lines_per_second > 5000